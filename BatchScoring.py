@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import func, select, update, or_
+from LeadScoring import (HALF_LIFE_SECONDS, HIGH_DOMINANCE_THRESHOLD, INTEREST_SCORE,
+                         LOW_DOMINANCE_THRESHOLD)
+from database import AsyncSessionLocal, Session as SessionModel, Message as MessageModel
+
+# Full rescoring of the stored lead scores (e.g. after changing HALF_LIFE_SECONDS or the
+# dominance thresholds in LeadScoring). Produces the same columns as the per-message
+# LeadScoring.apply_message_score, but with grouped NumPy reductions per batch of sessions.
+SESSION_BATCH_SIZE = 5000
+
+_INTEREST_LABELS = ["low", "medium", "high"]  # code == INTEREST_SCORE value
+_LN2 = np.log(2.0)
+_EPOCH = datetime(1970, 1, 1)
+
+
+def score_arrays(group: np.ndarray, n_groups: int, is_bot: np.ndarray, interest: np.ndarray,
+                 mood: np.ndarray, n_moods: int, ts: np.ndarray,
+                 half_life_seconds: float = HALF_LIFE_SECONDS,
+                 low_threshold: float = LOW_DOMINANCE_THRESHOLD,
+                 high_threshold: float = HIGH_DOMINANCE_THRESHOLD) -> Dict[str, np.ndarray]:
+    """Grouped decay scores.
+
+    ``group`` is the session index per message, ``interest`` / ``mood`` are codes (-1 for
+    none) and ``ts`` is seconds. Only messages that are bot messages or carry an interest
+    should be passed. Every output is indexed by group.
+    """
+    order = np.lexsort((np.arange(len(group)), ts, group))
+    g, is_bot, interest, mood, ts = group[order], is_bot[order], interest[order], mood[order], ts[order]
+
+    anchor = np.full(n_groups, -np.inf)
+    np.maximum.at(anchor, g, ts)
+    w = np.exp(-_LN2 * (anchor[g] - ts) / half_life_seconds)
+
+    has_interest = interest >= 0
+    weighted_sum = np.bincount(g, weights=np.where(has_interest, interest * w, 0.0), minlength=n_groups)
+    weight_total = np.bincount(g, weights=np.where(has_interest, w, 0.0), minlength=n_groups)
+
+    bot_count = np.bincount(g[is_bot], minlength=n_groups)
+    low_count = np.bincount(g[is_bot & (interest == 0)], minlength=n_groups)
+    high_count = np.bincount(g[is_bot & (interest == 2)], minlength=n_groups)
+
+    # last bot message: newest timestamp, earliest row on ties (same as the incremental path)
+    bot_rows = np.flatnonzero(is_bot)
+    last_bot_at = np.full(n_groups, np.nan)
+    bot_max = np.full(n_groups, -np.inf)
+    np.maximum.at(bot_max, g[bot_rows], ts[bot_rows])
+    at_max = bot_rows[ts[bot_rows] == bot_max[g[bot_rows]]]
+    first_groups, first_idx = np.unique(g[at_max], return_index=True)
+    last_bot_interest = np.full(n_groups, -1)
+    last_bot_interest[first_groups] = interest[at_max[first_idx]]
+    last_bot_at[first_groups] = ts[at_max[first_idx]]
+
+    mood_rows = is_bot & (mood >= 0)
+    mood_weights = np.bincount(
+        g[mood_rows] * n_moods + mood[mood_rows], weights=w[mood_rows], minlength=n_groups * n_moods
+    ).reshape(n_groups, n_moods)
+    has_mood = np.bincount(g[mood_rows], minlength=n_groups) > 0
+    lead_mood = np.where(has_mood, mood_weights.argmax(axis=1) if n_moods else -1, -1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = weighted_sum / weight_total
+        low_prop = low_count / bot_count
+        high_prop = high_count / bot_count
+    lead_interest = np.where(weight_total > 0, np.where(avg < 0.5, 0, np.where(avg < 1.5, 1, 2)), -1)
+    has_bot = bot_count > 0
+    forced_low = has_bot & ((last_bot_interest == 0) | (low_prop >= low_threshold))
+    forced_high = has_bot & ~forced_low & (high_prop >= high_threshold)
+    lead_interest = np.where(forced_low, 0, np.where(forced_high, 2, lead_interest))
+
+    return {
+        "anchor": anchor,
+        "weighted_sum": weighted_sum,
+        "weight_total": weight_total,
+        "bot_count": bot_count,
+        "low_count": low_count,
+        "high_count": high_count,
+        "last_bot_interest": last_bot_interest,
+        "last_bot_at": last_bot_at,
+        "mood_weights": mood_weights,
+        "lead_interest": lead_interest,
+        "lead_mood": lead_mood,
+    }
+
+
+def _seconds(ts: Optional[datetime]) -> float:
+    ts = ts or datetime.utcnow()
+    if ts.tzinfo:
+        ts = ts.replace(tzinfo=None)
+    return (ts - _EPOCH).total_seconds()
+
+
+def _to_datetime(seconds: float) -> Optional[datetime]:
+    return None if not np.isfinite(seconds) else _EPOCH + timedelta(seconds=float(seconds))
+
+
+def _update_rows(session_ids: List[str], interest_labels: List[str], mood_labels: List[str],
+                 scores: Dict[str, np.ndarray]) -> List[Dict]:
+    rows = []
+    for i, session_id in enumerate(session_ids):
+        moods = {mood_labels[m]: float(v) for m, v in enumerate(scores["mood_weights"][i]) if v > 0}
+        last_code = int(scores["last_bot_interest"][i])
+        rows.append({
+            "id": session_id,
+            "interest_weighted_sum": float(scores["weighted_sum"][i]),
+            "interest_weight_total": float(scores["weight_total"][i]),
+            "score_anchor_at": _to_datetime(scores["anchor"][i]),
+            "mood_weights": json.dumps(moods) if moods else None,
+            "bot_message_count": int(scores["bot_count"][i]),
+            "bot_low_count": int(scores["low_count"][i]),
+            "bot_high_count": int(scores["high_count"][i]),
+            "last_bot_interest": interest_labels[last_code] if last_code >= 0 else None,
+            "last_bot_at": _to_datetime(scores["last_bot_at"][i]),
+            "lead_interest": interest_labels[scores["lead_interest"][i]] if scores["lead_interest"][i] >= 0 else None,
+            "lead_mood": mood_labels[scores["lead_mood"][i]] if scores["lead_mood"][i] >= 0 else None,
+        })
+    return rows
+
+
+async def rescore_all(batch_size: int = SESSION_BATCH_SIZE) -> int:
+    """Recompute and bulk-write the stored scores of every session.
+
+    Sessions without scored messages are reset to the unscored state.
+    """
+    relevant = or_(MessageModel.interest.isnot(None), func.lower(MessageModel.role) == "bot")
+    updated = 0
+    last_id = ""
+    async with AsyncSessionLocal() as db:
+        while True:
+            session_ids = (await db.execute(
+                select(SessionModel.id).where(SessionModel.id > last_id).order_by(SessionModel.id).limit(batch_size)
+            )).scalars().all()
+            if not session_ids:
+                break
+            last_id = session_ids[-1]
+
+            rows = (await db.execute(
+                select(MessageModel.session_id, MessageModel.role, MessageModel.interest,
+                       MessageModel.mood, MessageModel.timestamp)
+                .where(MessageModel.session_id.in_(session_ids), relevant)
+            )).all()
+
+            index = {sid: i for i, sid in enumerate(session_ids)}
+            mood_codes: Dict[str, int] = {}
+            group = np.fromiter((index[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+            is_bot = np.fromiter(((r[1] or "").lower() == "bot" for r in rows), dtype=bool, count=len(rows))
+            interest = np.fromiter(
+                (INTEREST_SCORE.get((r[2] or "").lower(), -1) for r in rows), dtype=np.int64, count=len(rows)
+            )
+            mood = np.fromiter(
+                (mood_codes.setdefault(m, len(mood_codes)) if m else -1 for m in ((r[3] or "").lower() for r in rows)),
+                dtype=np.int64, count=len(rows),
+            )
+            ts = np.fromiter((_seconds(r[4]) for r in rows), dtype=np.float64, count=len(rows))
+            # as apply_message_score: non-bot rows count only with a known interest
+            keep = is_bot | (interest >= 0)
+            group, is_bot, interest, mood, ts = group[keep], is_bot[keep], interest[keep], mood[keep], ts[keep]
+
+            scores = score_arrays(group, len(session_ids), is_bot, interest, mood, len(mood_codes), ts)
+            mood_labels = list(mood_codes)
+
+            payload = _update_rows(session_ids, _INTEREST_LABELS, mood_labels, scores)
+            await db.execute(update(SessionModel), payload)
+            await db.commit()
+            updated += len(payload)
+    print(f"Rescored {updated} sessions")
+    return updated
+
+
+def _benchmark(messages: int = 1_000_000, per_session: int = 20) -> None:
+    """Compare the per-message Python path with the grouped NumPy path on synthetic data."""
+    from types import SimpleNamespace
+    from LeadScoring import apply_message_score, reset_scores
+
+    rnd = np.random.default_rng(7)
+    n_sessions = max(1, messages // per_session)
+    group = rnd.integers(0, n_sessions, messages)
+    is_bot = rnd.random(messages) < 0.5
+    interest = np.where(is_bot, rnd.integers(0, 3, messages), -1)
+    mood = np.where(is_bot, rnd.integers(0, 4, messages), -1)
+    ts = 1.7e9 + rnd.random(messages) * 30 * 24 * 3600
+    # user messages carry no interest and are filtered out by the SQL in rescore_all
+    keep = is_bot | (interest >= 0)
+    group, is_bot, interest, mood, ts = group[keep], is_bot[keep], interest[keep], mood[keep], ts[keep]
+    mood_labels = ["happy", "neutral", "frustrated", "excited"]
+
+    t0 = time.perf_counter()
+    scores = score_arrays(group, n_sessions, is_bot, interest, mood, len(mood_labels), ts)
+    numpy_s = time.perf_counter() - t0
+    print(f"numpy: {messages} messages ({len(group)} scored) / {n_sessions} sessions in {numpy_s:.2f}s")
+
+    order = np.lexsort((ts, group))
+    sessions = []
+    for _ in range(n_sessions):
+        s = SimpleNamespace()
+        reset_scores(s)
+        sessions.append(s)
+    t0 = time.perf_counter()
+    for i in order:
+        apply_message_score(
+            sessions[group[i]], "bot" if is_bot[i] else "user",
+            _INTEREST_LABELS[interest[i]] if interest[i] >= 0 else None,
+            mood_labels[mood[i]] if mood[i] >= 0 else None,
+            _to_datetime(ts[i]),
+        )
+    python_s = time.perf_counter() - t0
+    print(f"python loop: {python_s:.2f}s ({python_s / numpy_s:.0f}x slower)")
+
+    mismatches = sum(
+        1 for i, s in enumerate(sessions)
+        if s.lead_interest != (_INTEREST_LABELS[scores["lead_interest"][i]] if scores["lead_interest"][i] >= 0 else None)
+        or s.lead_mood != (mood_labels[scores["lead_mood"][i]] if scores["lead_mood"][i] >= 0 else None)
+    )
+    print(f"label mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute stored lead interest/mood scores.")
+    parser.add_argument("--batch-size", type=int, default=SESSION_BATCH_SIZE)
+    parser.add_argument("--benchmark", type=int, metavar="MESSAGES", help="run the synthetic benchmark instead")
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.benchmark)
+    else:
+        asyncio.run(rescore_all(args.batch_size))
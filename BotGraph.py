@@ -13,6 +13,8 @@ from langgraph.checkpoint.memory import MemorySaver
 from tenacity import retry, stop_after_attempt, wait_exponential
 from ClientModel import OPENAI_API_KEY,MODEL_NAME
 from KnowledgeBase import cfg
+from RateLimit import limiter
+from HttpClients import http_clients
 
 checkpointer = MemorySaver()
 
@@ -24,7 +26,8 @@ llm = ChatOpenAI(
     top_p=1.0,
     max_tokens=500,
     streaming=False, 
-    model_kwargs={"response_format": {"type": "json_object"}}
+    model_kwargs={"response_format": {"type": "json_object"}},
+    http_async_client=http_clients.get("openai"),
 )
 
 
@@ -96,7 +99,8 @@ async def call_model(state: State) -> dict:
         "lead_data": json.dumps(lead_data)
     }
 
-    result = await chain.ainvoke(chain_input)
+    async with limiter("openai"):
+        result = await chain.ainvoke(chain_input)
     full_content = result.content if isinstance(result, AIMessage) else ""
 
     try:
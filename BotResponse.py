@@ -1,18 +1,24 @@
 import json
 import asyncio
 import re
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List,Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import selectinload
 from BotGraph import invoke_chat_async
-from ConManager import ConnectionManager
+from ConManager import ConnectionManager, dashboard_manager
 from Config import _BUDGET_OPTIONS, _MAIN_CATEGORIES, _SUB_SERVICES
 from SessionUtils import get_field, set_field
 from database import AsyncSessionLocal, CompanyDetails, Session as SessionModel, Message as MessageModel, SessionPhase, VerificationDetails
-from CompanyFinder import FindTheComp
+from CompanyEntities import email_domain
+from EnrichmentJobs import company_query, enrichment_pool, interest_priority
+from SessionServices import sync_session_services
+from LeadSearch import refresh_lead_index
+from LeadScoring import apply_message_score
+from LeadCache import TAG_NEW_SESSION, TAG_SEARCH, TAG_STATUS, interest_tag, invalidate_session
 from FindUser import find_existing_customer
 from ClientModel import client
+from RateLimit import limiter
 
 
 
@@ -26,6 +32,7 @@ async def insert_user_message_async(session_id: str, content: str) -> Tuple[str,
             result = await db.execute(select(SessionModel).filter(SessionModel.id == session_id))
             session_obj = result.scalar_one_or_none()
 
+            created = session_obj is None
             if not session_obj:
                 session_obj = SessionModel(id=session_id, status="active")
                 db.add(session_obj)
@@ -41,11 +48,19 @@ async def insert_user_message_async(session_id: str, content: str) -> Tuple[str,
             )
             db.add(message)
 
+            previous_status = session_obj.status
             if session_obj.status != "admin":
                 session_obj.status = "active"
             session_obj.updated_at = datetime.utcnow()
             await db.commit()
 
+            await invalidate_session(
+                session_id,
+                TAG_NEW_SESSION if created else None,
+                TAG_STATUS if previous_status != session_obj.status else None,
+            )
+            if created:
+                await dashboard_manager.publish("new_lead", session_id=session_id)
             return ts.isoformat(), session_obj.status
 
         except Exception as e:
@@ -88,13 +103,8 @@ async def get_bot_response_async(question: str, session_obj, session_id: str = "
     company_det_used = False
     company_det = get_field(session_obj, "c_info")
     if company_det is None and phase in ("snip_q3"):
-        DetName= get_field(session_obj, "username")
-        Detcompany= get_field(session_obj, "q1_company")
-        DetEmail= get_field(session_obj, "q1_email")
-        DetRole= get_field(session_obj, "q2_role")
-        company_query=f"Using latest data (2025), give a comprehensive business intelligence report on  Company: {Detcompany} Key person: {DetName} - current title: {DetRole}, email: {DetEmail}"
-        print("\n\nnew triggered :",company_query)
-        asyncio.create_task(FindTheComp(company_query, get_field(session_obj, "id") or getattr(session_obj, "id", None)))
+        # normally prefetched since q1_company was captured (prefetch_company); this is the fallback
+        prefetch_company(session_obj, get_field(session_obj, "interest"))
 
     lead_data = json.dumps({
         "name": get_field(session_obj, "username"),
@@ -195,7 +205,43 @@ async def get_bot_response_async(question: str, session_obj, session_id: str = "
         print(f"[LangChain invoke failed — falling back to direct client] {lc_err}")
 
 
-async def handle_bot_response_async(session_id: str, question: str) -> Dict[str, Any]:
+def _in_dashboard_window(created_at) -> bool:
+    if created_at is None:
+        return True
+    return created_at.replace(tzinfo=None) >= datetime.utcnow() - timedelta(days=7)
+
+
+_prefetch_tasks: set = set()
+
+
+def prefetch_company(session_obj, interest: str | None) -> None:
+    """Queue company research for the lead as soon as a company or email is known.
+
+    The job row is written by a background task so the chat reply does not wait on it; the
+    worker reuses research already done for the same company before researching again.
+    """
+    if get_field(session_obj, "c_info"):
+        return
+    company = get_field(session_obj, "q1_company")
+    email = get_field(session_obj, "q1_email")
+    domain = email_domain(email)
+    if not company and not domain:
+        return
+    session_id = get_field(session_obj, "id")
+    query = company_query(company or domain, get_field(session_obj, "username"), get_field(session_obj, "q2_role"), email)
+    task = asyncio.create_task(_enqueue_prefetch(session_id, query, interest_priority(interest)))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+
+
+async def _enqueue_prefetch(session_id: str, query: str, priority: int) -> None:
+    try:
+        await enrichment_pool.enqueue(session_id, query, priority)
+    except Exception as e:
+        print(f"Enrichment prefetch failed for {session_id}: {e}")
+
+
+async def handle_bot_response_async(session_id: str, question: str, user_ts: datetime | None = None) -> Dict[str, Any]:
     async with AsyncSessionLocal() as db:  # Context manager
         try:
             # Eager-load ALL relationships to block lazy loads
@@ -206,6 +252,7 @@ async def handle_bot_response_async(session_id: str, question: str) -> Dict[str,
                     selectinload(SessionModel.phase_info),
                     selectinload(SessionModel.company_details),
                     selectinload(SessionModel.verification_details),
+                    selectinload(SessionModel.services),
                 ]
             )
             if not session_obj:
@@ -271,15 +318,38 @@ async def handle_bot_response_async(session_id: str, question: str) -> Dict[str,
                     except Exception:
                         pass
 
+            sync_session_services(session_obj)
+
+            previous_interest = session_obj.interest
             session_obj.interest = interest
             session_obj.mood = mood
+            apply_message_score(session_obj, "bot", interest, mood, bot_message.timestamp)
             set_field(session_obj, "phase", next_phase)
             if routing is not None:
                 set_field(session_obj, "routing", routing)
+            previous_status = session_obj.status
             session_obj.updated_at = datetime.utcnow()
             session_obj.status = "active"
             db.add(session_obj)
+            await refresh_lead_index(db, session_id)
             await db.commit()
+            prefetch_company(session_obj, interest)
+
+            await invalidate_session(
+                session_id, TAG_SEARCH,
+                TAG_STATUS if previous_status != "active" else None,
+                *((interest_tag(previous_interest), interest_tag(interest)) if previous_interest != interest else ()),
+            )
+
+            in_window = _in_dashboard_window(session_obj.created_at)
+            if previous_interest != interest:
+                await dashboard_manager.publish(
+                    "interest_change", session_id=session_id,
+                    old=previous_interest, new=interest, in_window=in_window,
+                )
+            if user_ts is not None and in_window:
+                response_seconds = (bot_message.timestamp - user_ts.replace(tzinfo=None)).total_seconds()
+                await dashboard_manager.publish("message", session_id=session_id, response_seconds=response_seconds)
             # Response payload
             bot_ts = bot_message.timestamp.isoformat() if getattr(bot_message, "timestamp", None) else datetime.utcnow().isoformat()
             return {
@@ -331,7 +401,7 @@ def init(app):
                     
                     if current_status == "active":
                         try:
-                            bot_data = await handle_bot_response_async(session_id, content)
+                            bot_data = await handle_bot_response_async(session_id, content, datetime.fromisoformat(ts))
                             answer = bot_data.get("answer", "")
                             options = bot_data.get("options", [])
                             analysis = bot_data.get("analysis") or {}
@@ -383,6 +453,7 @@ def init(app):
                         sess.status = "admin"
                         sess.updated_at = datetime.now(timezone.utc)
                         await db.commit()
+                        await invalidate_session(session_id, TAG_STATUS)
                 except Exception:
                     await db.rollback()
                     raise
@@ -395,6 +466,7 @@ def init(app):
                         sess.status = "active"
                         sess.updated_at = datetime.now(timezone.utc)
                         await db.commit()
+                        await invalidate_session(session_id, TAG_STATUS)
                 except Exception:
                     await db.rollback()
                     raise
@@ -417,6 +489,7 @@ def init(app):
                         sess.updated_at = datetime.now(timezone.utc)
 
                     await db.commit()
+                    await invalidate_session(session_id)
                     # refresh to ensure id populated if needed
                     await db.refresh(msg)
                     return ts.isoformat()
@@ -432,6 +505,7 @@ def init(app):
                         sess.status = "active"
                         sess.updated_at = datetime.now(timezone.utc)
                         await db.commit()
+                        await invalidate_session(session_id, TAG_STATUS)
                 except Exception:
                     await db.rollback()
         try:
@@ -523,12 +597,13 @@ def init(app):
 
                 try:
                     # Call OpenAI — non-streaming
-                    response = await client.chat.completions.create(
-                        model="gpt-4o-mini",          
-                        messages=active_sessions[session_id],
-                        temperature=0.7,
-                        max_tokens=800
-                    )
+                    async with limiter("openai"):
+                        response = await client.chat.completions.create(
+                            model="gpt-4o-mini",          
+                            messages=active_sessions[session_id],
+                            temperature=0.7,
+                            max_tokens=800
+                        )
 
                     bot_reply = response.choices[0].message.content.strip()
 
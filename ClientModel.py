@@ -3,15 +3,15 @@ import sys
 import asyncio
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from HttpClients import http_clients
 
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SEARCH_API_KEY = os.getenv("SEARCH_API_KEY")
-VERIFICATION_CACHE_FILE = "verification_cache.json"
 
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
 PERPLEXITY_BASE_URL = "https://api.perplexity.ai"
 
-client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_clients.get("openai"))
 MODEL_NAME = "gpt-4o-mini"
\ No newline at end of file
@@ -0,0 +1,177 @@
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import or_, select, true, update
+from sqlalchemy.exc import IntegrityError
+from Config import COMPANY_ENTITY_MAX_AGE_DAYS
+from database import AsyncSessionLocal, CompanyEntity
+
+# Company research shared between leads. Many leads come from the same business email
+# domain or name the same company, so one Perplexity report is kept per company and a new
+# lead reuses it instead of researching again.
+#
+# lookup() tries the email domain, then the exact normalized company name (never across two
+# different known domains). Names that merely look alike ('acme trading 1' / 'acme trading
+# 2') are different companies. A domain entry only counts when the lead names no company,
+# the same one, or a word prefix of it ('acme' / 'acme trading' at acme.com); someone
+# writing from acme.com about Beta Corp does not get Acme's report, and store() never
+# replaces a domain entry with research for a different company; that research is kept
+# under its name instead.
+# Entities older than max_age (default COMPANY_ENTITY_MAX_AGE_DAYS) are a miss, so callers
+# research again and store() refreshes them.
+# lookup(source=...) only returns research of that kind: deep research reuses its own
+# reports, not the shorter enrichment ones.
+FREE_EMAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "ymail.com", "hotmail.com", "outlook.com", "live.com",
+    "msn.com", "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "mail.com",
+    "yandex.com", "zoho.com",
+}
+COMPANY_SUFFIXES = {
+    "inc", "incorporated", "llc", "ltd", "limited", "co", "corp", "corporation", "company", "plc",
+    "gmbh", "sa", "ag", "bv", "pvt", "private", "group", "holding", "holdings", "est", "wll", "fze", "fzco",
+}
+
+def normalize_company(name: Optional[str]) -> Optional[str]:
+    """'The ACME Trading Co., Ltd.' -> 'acme trading'."""
+    words = re.sub(r"[^\w\s]", " ", (name or "").lower()).split()
+    if words and words[0] == "the":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return " ".join(words) or None
+
+
+def email_domain(email: Optional[str]) -> Optional[str]:
+    """Business domain of an email address; None for free-mail providers."""
+    if not email or "@" not in email:
+        return None
+    domain = email.rsplit("@", 1)[1].strip().lower().rstrip(".")
+    if domain.startswith("www."):
+        domain = domain[4:]
+    if "." not in domain or domain in FREE_EMAIL_DOMAINS:
+        return None
+    return domain
+
+
+def same_company(name_key: Optional[str], other_key: Optional[str]) -> bool:
+    """Whether two normalized names seen under one email domain are the same company;
+    unknown names never conflict."""
+    if not name_key or not other_key or name_key == other_key:
+        return True
+    words, other_words = name_key.split(), other_key.split()
+    shorter = min(len(words), len(other_words))
+    return words[:shorter] == other_words[:shorter]  # 'acme' and 'acme trading'
+
+
+def entity_result(entity: CompanyEntity) -> Dict[str, Any]:
+    """The entity in enrich_company's result shape."""
+    return {
+        "summary": entity.c_info,
+        "details": json.loads(entity.c_data) if entity.c_data else {},
+        "sources": json.loads(entity.c_sources) if entity.c_sources else [],
+    }
+
+
+class CompanyEntityCache:
+    def __init__(self, max_age_days: int = COMPANY_ENTITY_MAX_AGE_DAYS):
+        self.max_age = timedelta(days=max_age_days)
+        self.metrics = {"domain_hits": 0, "name_hits": 0, "stale": 0, "misses": 0, "stored": 0}
+
+    async def lookup(self, domain: Optional[str], company: Optional[str], max_age: Optional[timedelta] = None,
+                     source: Optional[str] = None) -> Optional[CompanyEntity]:
+        """Freshest research for the company; None when unknown, older than ``max_age`` or
+        (given ``source``) produced by another kind of research."""
+        name_key = normalize_company(company)
+        if not domain and not name_key:
+            return None
+        entity, kind = await self._match(domain, name_key, source)
+        if entity is None:
+            self.metrics["misses"] += 1
+            return None
+        if entity.refreshed_at < datetime.utcnow() - (self.max_age if max_age is None else max_age):
+            self.metrics["stale"] += 1
+            return None
+        self.metrics[f"{kind}_hits"] += 1
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(CompanyEntity).where(CompanyEntity.id == entity.id)
+                             .values(hits=CompanyEntity.hits + 1))
+            await db.commit()
+        return entity
+
+    async def _match(self, domain: Optional[str], name_key: Optional[str],
+                     source: Optional[str]) -> Tuple[Optional[CompanyEntity], str]:
+        of_source = CompanyEntity.source == source if source else true()
+        async with AsyncSessionLocal() as db:
+            if domain:
+                entity = (await db.execute(
+                    select(CompanyEntity).where(CompanyEntity.domain == domain, of_source)
+                )).scalar_one_or_none()
+                if entity is not None and same_company(name_key, entity.name_key):
+                    return entity, "domain"
+            if not name_key:
+                return None, ""
+            # same name at another known domain is a different company
+            other_domain = or_(CompanyEntity.domain.is_(None), CompanyEntity.domain == domain) if domain else true()
+            entity = (await db.execute(
+                select(CompanyEntity)
+                .where(CompanyEntity.name_key == name_key, other_domain, of_source)
+                .order_by(CompanyEntity.refreshed_at.desc())
+                .limit(1)
+            )).scalar_one_or_none()
+        return (entity, "name") if entity is not None else (None, "")
+
+    async def store(self, domain: Optional[str], company: Optional[str], result: Dict[str, Any],
+                    source: str = "enrichment") -> None:
+        """Save research for the company, replacing what was known for its domain (or name)."""
+        name_key = normalize_company(company)
+        if domain and name_key:
+            async with AsyncSessionLocal() as db:
+                domain_key = (await db.execute(
+                    select(CompanyEntity.name_key).where(CompanyEntity.domain == domain)
+                )).scalar_one_or_none()
+            if not same_company(name_key, domain_key):
+                domain = None  # the domain belongs to another company
+        if not domain and not name_key:
+            return
+        values = {
+            "name": company or None,
+            "name_key": name_key,
+            "c_info": result["summary"],
+            "c_data": json.dumps(result.get("details") or {}, ensure_ascii=False),
+            "c_sources": json.dumps(result.get("sources") or [], ensure_ascii=False),
+            "source": source,
+            "refreshed_at": datetime.utcnow(),
+        }
+        where = CompanyEntity.domain == domain if domain else (
+            (CompanyEntity.name_key == name_key) & CompanyEntity.domain.is_(None))
+        async with AsyncSessionLocal() as db:
+            updated = await db.execute(update(CompanyEntity).where(where).values(**values))
+            if not updated.rowcount:
+                db.add(CompanyEntity(domain=domain, **values))
+            try:
+                await db.commit()
+            except IntegrityError:
+                # the same domain was stored concurrently; the newer research wins
+                await db.rollback()
+                await db.execute(update(CompanyEntity).where(where).values(**values))
+                await db.commit()
+        self.metrics["stored"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.metrics["domain_hits"] + self.metrics["name_hits"]
+        lookups = hits + self.metrics["stale"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "max_age_days": self.max_age.days,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+
+
+company_entities = CompanyEntityCache()
+
+
+def init(app):
+    @app.get("/api/company-entities/stats")
+    async def company_entity_stats() -> Dict[str, Any]:
+        return company_entities.stats()
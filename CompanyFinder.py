@@ -1,9 +1,14 @@
+import hashlib
 import os
 import json
-import time
-import asyncio
 from openai import AsyncOpenAI
 from database import AsyncSessionLocal, CompanyDetails, Session as SessionModel
+from LeadSearch import refresh_lead_index
+from LeadCache import TAG_SEARCH, invalidate_session
+from RateLimit import limiter
+from HttpClients import http_clients
+from SingleFlight import flight
+from EnrichmentCache import NS_COMPANY, enrichment_cache
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from dotenv import load_dotenv
@@ -12,39 +17,25 @@ load_dotenv()
 
 perplexity_client = AsyncOpenAI(
     api_key=os.getenv("PERPLEXITY_API_KEY"),
-    base_url="https://api.perplexity.ai"
+    base_url="https://api.perplexity.ai",
+    http_client=http_clients.get("perplexity"),
 )
 
-class SimpleRateLimiter:
-    def __init__(self, max_concurrent=5, rpm=60):
-        self.sem = asyncio.Semaphore(max_concurrent)
-        self.rpm = rpm
-        self.tokens = rpm
-        self.last = time.time()
-        self.lock = asyncio.Lock()
-
-    async def wait(self):
-        async with self.sem:
-            async with self.lock:
-                now = time.time()
-                elapsed = now - self.last
-                self.tokens = min(self.rpm, self.tokens + elapsed * (self.rpm / 60))
-                self.last = now
-                if self.tokens < 1:
-                    await asyncio.sleep((1 - self.tokens) * (60 / self.rpm))
-                    self.tokens = 1
-                self.tokens -= 1
-
-limiter = SimpleRateLimiter(
-    max_concurrent=int(os.getenv("MAX_CONCURRENT", "5")),
-    rpm=int(os.getenv("RPM_LIMIT", "60"))
-)
+enrich_flight = flight("enrich_company")
+
 
 async def enrich_company(question: str) -> dict:
     ques = question.strip()
     if not ques:
         return {"summary": "", "details": {}, "sources": []}
+    key = hashlib.md5(" ".join(ques.lower().split()).encode()).hexdigest()
+    cached = await enrichment_cache.get(NS_COMPANY, key)
+    if cached is not None:
+        return cached
+    return await enrich_flight.do(key, lambda: _enrich_uncached(ques, key))
+
 
+async def _enrich_uncached(ques: str, key: str) -> dict:
     if not os.getenv("PERPLEXITY_API_KEY"):
         return {
             "summary": "Perplexity API key missing.",
@@ -52,8 +43,6 @@ async def enrich_company(question: str) -> dict:
             "sources": []
         }
 
-    await limiter.wait()
-
     system_prompt = (
         "Return ONLY valid JSON with this exact structure. No explanations.\n"
         "{\n"
@@ -72,44 +61,45 @@ async def enrich_company(question: str) -> dict:
     )
 
     try:
-        response = await perplexity_client.chat.completions.create(
-            model="sonar",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"{ques}"}
-            ],
-            temperature=0.1,
-            max_tokens=800,
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "company_enrichment",
-                    "strict": True,
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "summary": {"type": "string"},
-                            "details": {
-                                "type": "object",
-                                "properties": {
-                                    "founded": {"type": ["string", "null"]},
-                                    "employees": {"type": ["string", "null"]},
-                                    "founders": {"type": ["string", "null"]},
-                                    "location": {"type": ["string", "null"]},
-                                    "revenue": {"type": ["string", "null"]},
-                                    "industry": {"type": ["string", "null"]},
-                                    "confidence": {"type": "number", "minimum": 0, "maximum": 100}
-                                },
-                                "required": [],
-                                "additionalProperties": False
-                            }
-                        },
-                        "required": ["summary", "details"],
-                        "additionalProperties": False
+        async with limiter("perplexity"):
+            response = await perplexity_client.chat.completions.create(
+                model="sonar",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"{ques}"}
+                ],
+                temperature=0.1,
+                max_tokens=800,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "company_enrichment",
+                        "strict": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "summary": {"type": "string"},
+                                "details": {
+                                    "type": "object",
+                                    "properties": {
+                                        "founded": {"type": ["string", "null"]},
+                                        "employees": {"type": ["string", "null"]},
+                                        "founders": {"type": ["string", "null"]},
+                                        "location": {"type": ["string", "null"]},
+                                        "revenue": {"type": ["string", "null"]},
+                                        "industry": {"type": ["string", "null"]},
+                                        "confidence": {"type": "number", "minimum": 0, "maximum": 100}
+                                    },
+                                    "required": [],
+                                    "additionalProperties": False
+                                }
+                            },
+                            "required": ["summary", "details"],
+                            "additionalProperties": False
+                        }
                     }
                 }
-            }
-        )
+            )
 
         content = response.choices[0].message.content.strip()
         data = json.loads(content)
@@ -124,7 +114,8 @@ async def enrich_company(question: str) -> dict:
             "details": data.get("details", {}),
             "sources": sources
         }
-
+        if data.get("summary", "").strip():
+            await enrichment_cache.set(NS_COMPANY, key, result)
         return result
 
     except Exception as e:
@@ -134,15 +125,13 @@ async def enrich_company(question: str) -> dict:
             "sources": []
         }
 
-async def FindTheComp(
-    question: str,
-    session_id: str
-) -> dict:
-    result = await enrich_company(question)
+def enrichment_failed(result: dict) -> bool:
+    summary = (result.get("summary") or "").lower()
+    return not summary or "failed" in summary or "error" in summary
 
-    if not result["summary"] or "failed" in result["summary"].lower() or "error" in result["summary"].lower():
-        return result
 
+async def save_company_details(session_id: str, result: dict) -> None:
+    """Store an enrichment result on the session unless it already has company data; raises on DB errors."""
     c_data = json.dumps(result["details"], ensure_ascii=False)
     c_sources = json.dumps(result["sources"], ensure_ascii=False)
 
@@ -152,7 +141,7 @@ async def FindTheComp(
             session_obj = (await db.execute(stmt)).scalar_one_or_none()
 
             if not session_obj:
-                return result
+                return
 
             # Update or create CompanyDetails
             if hasattr(session_obj, "company_details") and session_obj.company_details:
@@ -161,7 +150,9 @@ async def FindTheComp(
                     cd.c_info = result["summary"]
                     cd.c_data = c_data
                     cd.c_sources = c_sources
+                    await refresh_lead_index(db, session_obj.id)
                     await db.commit()
+                    await invalidate_session(session_obj.id, TAG_SEARCH)
             else:
                 new_cd = CompanyDetails(
                     session_id=session_obj.id,
@@ -172,8 +163,10 @@ async def FindTheComp(
                 )
                 session_obj.company_details = new_cd
                 db.add(new_cd)
+                await refresh_lead_index(db, session_obj.id)
                 await db.commit()
+                await invalidate_session(session_obj.id, TAG_SEARCH)
 
-        except Exception as e:
+        except Exception:
             await db.rollback()
-            print(f"DB save failed: {e}")
\ No newline at end of file
+            raise
\ No newline at end of file
@@ -1,6 +1,9 @@
 import json
-from typing import Dict, Set
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
 from fastapi import  WebSocket
+from Config import DASHBOARD_OUTBOX_SIZE, DASHBOARD_SEND_TIMEOUT, DASHBOARD_SNAPSHOT_ATTEMPTS
 from database import AsyncSessionLocal, Message as MessageModel
 
 
@@ -57,4 +60,101 @@ class ConnectionManager:
 
         # run in threadpool if needed, but since it's async, just await
         history_json = await fetch_history()
-        await websocket.send_text(history_json)
\ No newline at end of file
+        await websocket.send_text(history_json)
+
+class DashboardManager:
+    """Admin dashboard subscribers: one shared snapshot, then small delta events.
+
+    Each socket has its own outbox drained by a sender task, so publish() never waits on
+    a client; a socket whose outbox fills up or whose send stalls is dropped.
+
+    Every publish() bumps a sequence number. A snapshot only counts when no publish landed
+    while it was loading (else it may or may not contain that write), and a new tab gets
+    deltas only from the snapshot it was sent on, so no delta is applied twice.
+    """
+
+    def __init__(self):
+        self.active_connections: Dict[WebSocket, asyncio.Queue] = {}
+        self._senders: Dict[WebSocket, asyncio.Task] = {}
+        self._pending: Set[WebSocket] = set()  # connected, snapshot not sent yet
+        self._seq = 0
+        self._snapshot: Optional[dict] = None
+        self._snapshot_ts = 0.0
+        self._snapshot_lock = asyncio.Lock()
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        outbox: asyncio.Queue = asyncio.Queue(maxsize=DASHBOARD_OUTBOX_SIZE)
+        self.active_connections[websocket] = outbox
+        self._pending.add(websocket)
+        self._senders[websocket] = asyncio.create_task(self._sender(websocket, outbox))
+
+    def start(self, websocket: WebSocket, snapshot: dict, seq: int):
+        """Send the tab its snapshot; deltas published after ``seq`` follow it."""
+        self._pending.discard(websocket)
+        self.send(websocket, json.dumps({"type": "snapshot", "seq": seq, "data": snapshot}, default=str))
+
+    def disconnect(self, websocket: WebSocket):
+        self._pending.discard(websocket)
+        self.active_connections.pop(websocket, None)
+        sender = self._senders.pop(websocket, None)
+        if sender is not None and sender is not asyncio.current_task():
+            sender.cancel()
+
+    async def _sender(self, websocket: WebSocket, outbox: asyncio.Queue):
+        while True:
+            message = await outbox.get()
+            try:
+                await asyncio.wait_for(websocket.send_text(message), DASHBOARD_SEND_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                break
+        self.disconnect(websocket)
+        await self._close(websocket)
+
+    def send(self, websocket: WebSocket, message: str):
+        outbox = self.active_connections.get(websocket)
+        if outbox is None:
+            return
+        try:
+            outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            # the tab stopped reading; it reconnects and gets a fresh snapshot
+            self.disconnect(websocket)
+            asyncio.create_task(self._close(websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(), DASHBOARD_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def get_snapshot(self, loader: Callable[[], Awaitable[dict]], ttl: float) -> Tuple[dict, int]:
+        """The shared snapshot and the sequence number of the last publish it contains."""
+        # concurrent tab opens share a single recompute
+        async with self._snapshot_lock:
+            if self._snapshot is not None and time.monotonic() - self._snapshot_ts <= ttl:
+                return self._snapshot, self._seq
+            for _ in range(DASHBOARD_SNAPSHOT_ATTEMPTS):
+                seq = self._seq
+                snapshot = await loader()
+                if self._seq == seq:
+                    self._snapshot, self._snapshot_ts = snapshot, time.monotonic()
+                    return snapshot, seq
+            # writes kept landing mid-load: serve the last load, but never cache it
+            return snapshot, self._seq
+
+    async def publish(self, event_type: str, **payload):
+        # any write makes the cached snapshot stale for tabs that connect later
+        self._seq += 1
+        self._snapshot = None
+        if not self.active_connections:
+            return
+        message = json.dumps({"type": event_type, "seq": self._seq, **payload}, default=str)
+        for connection in list(self.active_connections):
+            if connection not in self._pending:
+                self.send(connection, message)
+
+
+dashboard_manager = DashboardManager()
@@ -1,7 +1,6 @@
 from datetime import timedelta
 import os
 from KnowledgeBase import cfg
-from cachetools import TTLCache  
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,12 +17,53 @@ EMAIL_PASS = os.getenv("EMAIL_PASS")
 MODEL_NAME = "gpt-4o-mini"
 SITE_NAME = "Business Chatbot"
 INACTIVITY_THRESHOLD = timedelta(minutes=5)  
-SESSION_CACHE = TTLCache(maxsize=1000, ttl=300)
+INACTIVITY_SWEEP_INTERVAL = int(os.getenv("INACTIVITY_SWEEP_INTERVAL", "60"))  # seconds between background sweeps
+LEAD_CACHE_TTL = 300  # seconds; entries are also invalidated by the write paths (LeadCache)
+LEAD_CACHE_MAXSIZE = 1000
+LEAD_CACHE_REDIS_URL = os.getenv("LEAD_CACHE_REDIS_URL")  # share the lead cache between workers
+DASHBOARD_SNAPSHOT_TTL = 30  # seconds a /ws/dashboard snapshot is shared between tabs
+DASHBOARD_OUTBOX_SIZE = 100  # queued events per dashboard tab before it is dropped as stalled
+DASHBOARD_SEND_TIMEOUT = 5.0  # seconds one dashboard send may take before the tab is dropped
+DASHBOARD_SNAPSHOT_ATTEMPTS = 3  # snapshot loads retried while writes are published mid-load
 UPLOAD_DIR = "uploads"
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))  # concurrent background lead exports
+ENRICHMENT_WORKERS = int(os.getenv("ENRICHMENT_WORKERS", "4"))  # concurrent company enrichment jobs
+ENRICHMENT_MAX_ATTEMPTS = 4
+ENRICHMENT_RETRY_BASE = 30  # seconds before the first retry; doubles per attempt
 
 MAX_OUTBOUND_CONCURRENCY = 200          
 HTTPX_MAX_CONNECTIONS = 500
+HTTP_KEEPALIVE_EXPIRY = 60.0  # seconds an idle pooled upstream connection is kept (HttpClients.py)
 UPSTREAM_TIMEOUT = 5.0                 
 CACHE_TTL = 60                         
 RATE_LIMIT_PER_SECOND = 200             
 TOKEN_BUCKET_CAPACITY = RATE_LIMIT_PER_SECOND
+
+
+# Outbound API budgets (RateLimit.py): provider -> (requests per minute, burst, max concurrent calls).
+# Every caller of a provider shares its bucket; set RATE_LIMIT_STATE_DIR to share it between
+# worker processes on the same host as well.
+RATE_LIMITS = {
+    "openai": (int(os.getenv("OPENAI_RPM", "500")), 20, int(os.getenv("OPENAI_CONCURRENCY", "20"))),
+    "perplexity": (int(os.getenv("PERPLEXITY_RPM", os.getenv("RPM_LIMIT", "60"))), 5,
+                   int(os.getenv("PERPLEXITY_CONCURRENCY", os.getenv("MAX_CONCURRENT", "5")))),
+    "searchapi": (int(os.getenv("SEARCHAPI_RPM", os.getenv("RATE_LIMIT_RPM", "60"))), 5,
+                  int(os.getenv("SEARCHAPI_CONCURRENCY", os.getenv("RATE_LIMIT_CONCURRENT", "5")))),
+    "email": (RATE_LIMIT_PER_SECOND * 60, TOKEN_BUCKET_CAPACITY, MAX_OUTBOUND_CONCURRENCY),
+}
+RATE_LIMIT_STATE_DIR = os.getenv("RATE_LIMIT_STATE_DIR")
+EMAIL_VERIFY_MAX_WAIT = 1.0  # seconds /verify/email queues for a slot before answering 429
+COMPANY_ENTITY_MAX_AGE_DAYS = int(os.getenv("COMPANY_ENTITY_MAX_AGE_DAYS", "30"))  # reuse research younger than this
+CUSTOMER_INDEX_REFRESH = int(os.getenv("CUSTOMER_INDEX_REFRESH", "60"))  # seconds between customer table change checks
+VERIFY_BATCH_MAX = 200  # session ids per POST /api/verify/batch
+VERIFY_BATCH_CONCURRENCY = 8  # verifications in flight per batch; the provider limiters still apply
+
+# Persistent enrichment cache (EnrichmentCache.py), shared by worker processes through one file
+ENRICHMENT_CACHE_PATH = os.getenv("ENRICHMENT_CACHE_PATH", "data/enrichment_cache.db")
+ENRICHMENT_CACHE_TTLS = {  # namespace -> seconds
+    "company": 30 * 86400,
+    "verification": 86400,
+    "customer": 7 * 86400,
+    "email": CACHE_TTL,
+}
+ENRICHMENT_CACHE_MAX_ENTRIES = 50000  # per namespace; least recently read entries are evicted
@@ -0,0 +1,275 @@
+import asyncio
+import re
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from CompanyEntities import normalize_company
+from Config import CUSTOMER_INDEX_REFRESH
+from CustomerSearch import fill_company_keys, trigrams
+from database import AsyncSessionLocal, CustomerBase, CustomerVersion
+
+# In-memory index of the customer table for find_existing_customer, so the usual answers
+# to "what's your company name or WhatsApp code?" resolve without asking the LLM which
+# lookup to run:
+#
+#   groupcodes  lower(groupcode) -> customer id          (exact)
+#   names       normalize_company(company) -> ids          (exact)
+#   trigrams    trigram -> name numbers                    (near matches, Jaccard similarity)
+#
+# lookup() answers locally only when it is sure: a known code anywhere in the message, the
+# whole input naming a known company (exactly or as a near match), or input that is plainly
+# not an identifier (empty, an email, a phone number). Anything else, including a sentence
+# that merely contains a customer's name and a code-shaped word the index does not know,
+# returns None and the caller falls back to the LLM classifier. Only ids are kept; matched
+# rows are read by primary key. Every CUSTOMER_INDEX_REFRESH seconds missing company keys are
+# filled in, and the index is rebuilt off the event loop when that found any (a company was
+# edited) or the table's signature (row count, newest created_at, customer_version bumped
+# by triggers on edits and deletes) changed;
+# POST /api/customer-index/refresh forces a rebuild.
+NEAR_MATCH = 0.6       # trigram similarity accepted as the same company
+MAX_MATCHES = 5        # as retrieve_by_company
+MAX_POSTING = 50000    # trigrams shared by more names than this are skipped (no signal)
+
+_CODE_TOKEN = re.compile(r"\b(?=[A-Za-z0-9_-]*\d)(?=[A-Za-z0-9_-]*[A-Za-z])[A-Za-z0-9][A-Za-z0-9_-]{2,11}\b")
+_EMAIL = re.compile(r"\S+@\S+\.\S+")
+_PHONE = re.compile(r"^\+?[\d\s().-]{7,}$")
+
+
+def customer_dict(customer: CustomerBase) -> Dict[str, Any]:
+    return {
+        "id": customer.id,
+        "created_at": customer.created_at.isoformat() if customer.created_at else None,
+        "company": customer.company,
+        "groupcode": customer.groupcode,
+        "email": customer.email,
+        "role": customer.role,
+        "categories": customer.categories,
+        "services": customer.services,
+        "activity": customer.activity,
+        "timeline": customer.timeline,
+        "budget": customer.budget,
+        "username": customer.username,
+        "mobile": customer.mobile
+    }
+
+
+class _Snapshot:
+    """Immutable lookup structures; rebuilt whole and swapped in."""
+
+    def __init__(self, rows: List[Tuple[str, Optional[str], Optional[str]]]):
+        self.groupcodes: Dict[str, str] = {}
+        ids_by_name: Dict[str, List[str]] = {}
+        for customer_id, groupcode, company in rows:
+            if groupcode and groupcode.strip():
+                self.groupcodes.setdefault(groupcode.strip().lower(), customer_id)
+            name_key = normalize_company(company)
+            if name_key:
+                ids_by_name.setdefault(name_key, []).append(customer_id)
+        self.names = ids_by_name
+        self.name_list = list(ids_by_name)
+        self.gram_counts = array("H", (min(len(trigrams(n)), 65535) for n in self.name_list))
+        postings: Dict[str, array] = {}
+        for number, name_key in enumerate(self.name_list):
+            for gram in trigrams(name_key):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(number)
+        self.trigrams = postings
+        self.rows = len(rows)
+
+    def near(self, name_key: str) -> List[Tuple[str, float]]:
+        """Names ranked by trigram Jaccard similarity to ``name_key`` (best first)."""
+        grams = trigrams(name_key)
+        overlap: Counter = Counter()
+        for gram in grams:
+            posting = self.trigrams.get(gram)
+            if posting is not None and len(posting) <= MAX_POSTING:
+                overlap.update(posting)
+        scored = [
+            (self.name_list[n], shared / (len(grams) + self.gram_counts[n] - shared))
+            for n, shared in overlap.most_common(MAX_MATCHES * 20)
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:MAX_MATCHES]
+
+
+class CustomerIndex:
+    def __init__(self, refresh_interval: float = CUSTOMER_INDEX_REFRESH):
+        self.refresh_interval = refresh_interval
+        self.snapshot: Optional[_Snapshot] = None
+        self.signature: Optional[Tuple[Any, ...]] = None
+        self.loaded_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.metrics = {"groupcode": 0, "company": 0, "near": 0, "none": 0, "ambiguous": 0, "not_loaded": 0}
+
+    async def _signature(self) -> Tuple[Any, ...]:
+        async with AsyncSessionLocal() as db:
+            return tuple((await db.execute(
+                select(
+                    func.count(),
+                    func.max(CustomerBase.created_at),
+                    select(CustomerVersion.version).where(CustomerVersion.id == 1).scalar_subquery(),
+                ).select_from(CustomerBase)
+            )).one())
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Rebuild when the customer table changed (or ``force``); returns whether it rebuilt."""
+        async with self._lock:
+            filled = 0
+            if self.signature is not None:
+                # rows added, or edited (the reset trigger clears the key), since the last tick;
+                # the migration filled the rest, so with nothing due this is two indexed reads
+                filled = await fill_company_keys()
+            signature = await self._signature()
+            if not force and not filled and signature == self.signature and self.snapshot is not None:
+                return False
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(CustomerBase.id, CustomerBase.groupcode, CustomerBase.company)
+                )).all()
+            started = time.perf_counter()
+            self.snapshot = await asyncio.to_thread(_Snapshot, rows)
+            self.build_seconds = round(time.perf_counter() - started, 3)
+            self.signature = signature
+            self.loaded_at = time.time()
+            return True
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Customer index refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def resolve(self, text: str) -> Optional[Tuple[str, List[str]]]:
+        """(classification, customer ids) for ``text``; None when only the LLM can tell."""
+        snap = self.snapshot
+        if snap is None:
+            self.metrics["not_loaded"] += 1
+            return None
+        raw = text.strip()
+        if not raw:
+            return self._count("none", [])
+        # a known code anywhere in the message ("my code is ABC123")
+        for token in [raw] + _CODE_TOKEN.findall(raw):
+            customer_id = snap.groupcodes.get(token.lower())
+            if customer_id:
+                return self._count("groupcode", [customer_id])
+        name_key = normalize_company(raw)
+        if name_key in snap.names:
+            return self._count("company", snap.names[name_key][:MAX_MATCHES])
+        if _EMAIL.search(raw) or _PHONE.match(raw) or not name_key:
+            return self._count("none", [])
+        # the whole input, misspelled ("Acme Tradng"); a name inside a longer message is
+        # left to the LLM ("we provide global solutions for shipping firms")
+        ranked = snap.near(name_key)
+        if ranked and ranked[0][1] >= NEAR_MATCH:
+            ids = [i for name, score in ranked if score >= NEAR_MATCH for i in snap.names[name]]
+            self.metrics["near"] += 1
+            return self._count("company", ids[:MAX_MATCHES])
+        self.metrics["ambiguous"] += 1
+        return None
+
+    def _count(self, classification: str, ids: List[str]) -> Tuple[str, List[str]]:
+        self.metrics[classification] += 1
+        return classification, ids
+
+    async def lookup(self, text: str) -> Optional[Tuple[Optional[Dict[str, Any]] | List[Dict[str, Any]], str]]:
+        """find_existing_customer's (result, classification) from the index; None to ask the LLM."""
+        resolved = self.resolve(text)
+        if resolved is None:
+            return None
+        classification, ids = resolved
+        if not ids:
+            return None, classification
+        async with AsyncSessionLocal() as db:
+            customers = {c.id: c for c in (await db.execute(
+                select(CustomerBase).where(CustomerBase.id.in_(ids))
+            )).scalars()}
+        rows = [customer_dict(customers[i]) for i in ids if i in customers]
+        if classification == "groupcode":
+            return (rows[0] if rows else None), classification
+        return rows, classification
+
+    def stats(self) -> Dict[str, Any]:
+        snap = self.snapshot
+        decided = sum(v for k, v in self.metrics.items() if k not in ("ambiguous", "not_loaded", "near"))
+        asked = decided + self.metrics["ambiguous"] + self.metrics["not_loaded"]
+        return {
+            "loaded": snap is not None,
+            "customers": snap.rows if snap else 0,
+            "groupcodes": len(snap.groupcodes) if snap else 0,
+            "names": len(snap.name_list) if snap else 0,
+            "build_seconds": self.build_seconds,
+            "loaded_at": self.loaded_at,
+            **self.metrics,
+            "local_rate": round(decided / asked, 4) if asked else None,
+        }
+
+
+customer_index = CustomerIndex()
+
+
+def init(app):
+    @app.get("/api/customer-index/stats")
+    async def customer_index_stats() -> Dict[str, Any]:
+        return customer_index.stats()
+
+    @app.post("/api/customer-index/refresh")
+    async def refresh_customer_index() -> Dict[str, Any]:
+        await customer_index.refresh(force=True)
+        return customer_index.stats()
+
+
+def _benchmark(rows: int, queries: int) -> None:
+    import random
+    import string
+    rng = random.Random(7)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(5000)]
+    data = [
+        (str(i), f"GRP{i:06d}", f"{' '.join(rng.sample(words, rng.randint(1, 3))).title()} {rng.choice(['LLC', 'Ltd', 'Co', ''])}")
+        for i in range(rows)
+    ]
+    started = time.perf_counter()
+    snap = _Snapshot(data)
+    print(f"built {rows} rows in {time.perf_counter() - started:.2f}s ({len(snap.name_list)} names, {len(snap.trigrams)} trigrams)")
+    index = CustomerIndex()
+    index.snapshot = snap
+    samples = {
+        "groupcode": [f"grp{rng.randrange(rows):06d}" for _ in range(queries)],
+        "exact company": [data[rng.randrange(rows)][2].upper() for _ in range(queries)],
+        "company in sentence": [f"we are {data[rng.randrange(rows)][2]} and already a client" for _ in range(queries)],
+        "unknown code": [f"ZZ{rng.randrange(10**6):06d}" for _ in range(queries)],
+        "misspelled company": [data[rng.randrange(rows)][2].lower().replace("a", "e", 1) for _ in range(queries)],
+    }
+    for label, inputs in samples.items():
+        started = time.perf_counter()
+        resolved = sum(1 for text in inputs if index.resolve(text) is not None)
+        per_query = (time.perf_counter() - started) / len(inputs) * 1e6
+        print(f"{label:20s} {per_query:9.1f} us/query, resolved locally {resolved}/{len(inputs)}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the customer index from synthetic rows and time lookups.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+    _benchmark(args.rows, args.queries)
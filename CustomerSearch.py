@@ -0,0 +1,293 @@
+import sys
+import time
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import Float, String, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Subquery
+from CompanyEntities import normalize_company
+from database import AsyncSessionLocal, CustomerBase, engine, writer_engine
+
+# Indexed fuzzy company lookup for the customer table (FindUser.retrieve_by_company).
+#
+# customer.company_key holds the normalized company name (normalize_company). A trigram
+# index over it - SQLite FTS5 with the trigram tokenizer (external content on customer,
+# kept in sync by triggers) or a Postgres pg_trgm GIN index - finds candidates in stages
+# until there are enough: the exact key (b-tree), substring matches, then on SQLite names
+# containing the first three letters of every query word (so "Zenth Logistcs" still finds
+# "Zenith Logistics"). Candidates are ranked by trigram similarity, so "Acme Trading" comes
+# before "Acme Trading Services".
+#
+# Customers are written outside this app, so keys are filled in Python: once by the online
+# migration and again whenever CustomerIndex sees the table change. A trigger clears the
+# key when a row's company is edited, which queues it for the next fill; others bump
+# customer_version on every groupcode / company edit and delete, which row count and newest
+# created_at alone do not show.
+_DIALECT = engine.dialect.name
+CANDIDATES = 100      # rows fetched from the index before ranking
+MIN_SIMILARITY = 0.3  # trigram similarity a non-substring match needs to be returned
+FILL_BATCH_SIZE = 1000
+
+_VERSION_ROW = "INSERT INTO customer_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING"
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS customer_company_search USING fts5(
+        company_key, content='customer', content_rowid='rowid', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS customer_company_search_ai AFTER INSERT ON customer BEGIN
+        INSERT INTO customer_company_search(rowid, company_key) VALUES (new.rowid, new.company_key);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customer_company_search_ad AFTER DELETE ON customer BEGIN
+        INSERT INTO customer_company_search(customer_company_search, rowid, company_key)
+        VALUES ('delete', old.rowid, old.company_key);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customer_company_search_au AFTER UPDATE OF company_key ON customer BEGIN
+        INSERT INTO customer_company_search(customer_company_search, rowid, company_key)
+        VALUES ('delete', old.rowid, old.company_key);
+        INSERT INTO customer_company_search(rowid, company_key) VALUES (new.rowid, new.company_key);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customer_company_key_reset AFTER UPDATE OF company ON customer
+    WHEN new.company IS NOT old.company BEGIN
+        UPDATE customer SET company_key = NULL WHERE rowid = new.rowid;
+    END""",
+    _VERSION_ROW,
+    """CREATE TRIGGER IF NOT EXISTS customer_version_au AFTER UPDATE OF groupcode, company ON customer
+    WHEN new.groupcode IS NOT old.groupcode OR new.company IS NOT old.company BEGIN
+        UPDATE customer_version SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS customer_version_ad AFTER DELETE ON customer BEGIN
+        UPDATE customer_version SET version = version + 1 WHERE id = 1;
+    END""",
+]
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_customer_company_key_trgm ON customer USING GIN (company_key gin_trgm_ops)",
+    _VERSION_ROW,
+    """CREATE OR REPLACE FUNCTION customer_version_bump() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE customer_version SET version = version + 1 WHERE id = 1;
+        RETURN NULL;
+    END $$""",
+    "DROP TRIGGER IF EXISTS customer_version_bump ON customer",
+    """CREATE TRIGGER customer_version_bump AFTER DELETE OR UPDATE OF groupcode, company ON customer
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_version_bump()""",
+]
+
+# substring stage: unordered, so a common name stops at the LIMIT instead of ranking every hit
+_SQLITE_SEARCH_SQL = """
+    SELECT c.id AS customer_id, c.company_key AS company_key, customer_company_search.rank AS rank
+    FROM customer_company_search JOIN customer c ON c.rowid = customer_company_search.rowid
+    WHERE customer_company_search MATCH :match
+    LIMIT :limit
+"""
+
+_SQLITE_RANKED_SEARCH_SQL = _SQLITE_SEARCH_SQL.replace("LIMIT", "ORDER BY customer_company_search.rank\n    LIMIT")
+
+_POSTGRES_SEARCH_SQL = """
+    SELECT id AS customer_id, company_key, -similarity(company_key, :raw) AS rank
+    FROM customer
+    WHERE company_key % :raw OR company_key LIKE :match
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+_enabled = False
+
+
+def search_enabled() -> bool:
+    return _enabled
+
+
+def trigrams(name_key: str) -> set:
+    padded = f"  {name_key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Trigram Jaccard similarity of two normalized names (pg_trgm's similarity())."""
+    ga, gb = trigrams(a), trigrams(b)
+    return len(ga & gb) / len(ga | gb) if ga or gb else 0.0
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def build_matches(name_key: str, dialect: str = _DIALECT) -> List[str]:
+    """Index queries to try in order: substring, then every word's first trigram (SQLite only)."""
+    if dialect == "postgresql":
+        return [f"%{name_key}%"]
+    if len(name_key) < 3:  # the trigram index cannot match shorter strings
+        return []
+    matches = [_fts_phrase(name_key)]
+    starts = list(dict.fromkeys(w[:3] for w in name_key.split() if len(w) >= 3))
+    if starts:
+        matches.append(" AND ".join(_fts_phrase(s) for s in starts))
+    return matches
+
+
+def company_search_subquery(match: str, raw: str = "", limit: int = CANDIDATES, ranked: bool = False) -> Subquery:
+    """``(customer_id, company_key, rank)`` rows from the trigram index; lower rank is better."""
+    if _DIALECT == "postgresql":
+        sql = _POSTGRES_SEARCH_SQL
+    else:
+        sql = _SQLITE_RANKED_SEARCH_SQL if ranked else _SQLITE_SEARCH_SQL
+    params = {"match": match, "limit": limit}
+    if _DIALECT == "postgresql":
+        params["raw"] = raw
+    return (
+        text(sql)
+        .bindparams(**params)
+        .columns(customer_id=String, company_key=String, rank=Float)
+        .subquery("customer_company_hits")
+    )
+
+
+async def search_customers(db: AsyncSession, company: str, limit: int = 5) -> Optional[List[CustomerBase]]:
+    """Customers whose company best matches ``company``, most similar first; None without the index."""
+    if not _enabled:
+        return None
+    name_key = normalize_company(company)
+    if not name_key:
+        return []
+    # exact key first; names too short for trigrams fall back to a key prefix
+    if len(name_key) < 3:
+        exact = (CustomerBase.company_key >= name_key, CustomerBase.company_key < name_key + "\uffff")
+    else:
+        exact = (CustomerBase.company_key == name_key,)
+    scores = {
+        customer_id: similarity(name_key, key)
+        for customer_id, key in (await db.execute(
+            select(CustomerBase.id, CustomerBase.company_key).where(*exact).limit(CANDIDATES)
+        )).all()
+    }
+    for n, match in enumerate(build_matches(name_key)):
+        if len(scores) >= limit:
+            break
+        hits = company_search_subquery(match, name_key, ranked=n > 0)
+        for customer_id, key in (await db.execute(select(hits.c.customer_id, hits.c.company_key))).all():
+            score = similarity(name_key, key or "")
+            if (n == 0 or score >= MIN_SIMILARITY) and customer_id not in scores:
+                scores[customer_id] = score
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    if not best:
+        return []
+    rows = {c.id: c for c in (await db.execute(select(CustomerBase).where(CustomerBase.id.in_(best)))).scalars()}
+    return [rows[i] for i in best if i in rows]
+
+
+async def fill_company_keys(batch_size: int = FILL_BATCH_SIZE,
+                            progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> int:
+    """Set company_key on customers that do not have one yet; commits per batch."""
+    pending = (CustomerBase.company_key.is_(None), CustomerBase.company.isnot(None))
+    done = 0
+    async with AsyncSessionLocal() as db:
+        total = (await db.execute(select(func.count()).select_from(CustomerBase).where(*pending))).scalar() or 0
+        while True:
+            rows = (await db.execute(
+                select(CustomerBase.id, CustomerBase.company).where(*pending).limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            # "" for names with nothing to index (punctuation only), so they are not picked up again
+            await db.execute(update(CustomerBase), [
+                {"id": customer_id, "company_key": normalize_company(company) or ""} for customer_id, company in rows
+            ])
+            await db.commit()
+            done += len(rows)
+            if progress is not None:
+                await progress(done, max(total, done))
+    return done
+
+
+async def ensure_customer_search() -> None:
+    """Create the trigram index for this dialect; a new SQLite index is built from the keys so far."""
+    global _enabled
+    ddl = {"sqlite": _SQLITE_DDL, "postgresql": _POSTGRES_DDL}.get(_DIALECT)
+    if ddl is None:
+        print(f"Customer company index not available for {_DIALECT}; falling back to ILIKE")
+        return
+    try:
+        async with writer_engine.begin() as conn:
+            created = False
+            if _DIALECT == "sqlite":
+                created = (await conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'customer_company_search'"
+                ))).first() is None
+            for stmt in ddl:
+                await conn.execute(text(stmt))
+            if created:
+                await conn.execute(text("INSERT INTO customer_company_search(customer_company_search) VALUES ('rebuild')"))
+        _enabled = True
+    except Exception as e:
+        print(f"Customer company index unavailable, falling back to ILIKE: {e}")
+
+
+def _benchmark(rows: int = 500_000) -> None:
+    """Compare the old ILIKE / lower(groupcode) scans with the indexed lookups on synthetic SQLite data."""
+    import random
+    import sqlite3
+    import tempfile
+    import os
+
+    path = os.path.join(tempfile.mkdtemp(), "customer_search_bench.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE customer (id VARCHAR PRIMARY KEY, company TEXT, company_key TEXT, groupcode TEXT)")
+    con.execute("CREATE TABLE customer_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)")
+    words = ["alpha", "nexus", "global", "tech", "trading", "saudi", "gulf", "prime", "vision", "solutions",
+             "logistics", "capital", "energy", "systems", "digital", "partners", "medical", "noor", "zenith"]
+    suffixes = ["LLC", "Ltd", "Co.", "Holding", ""]
+    rnd = random.Random(7)
+    batch = []
+    for i in range(rows):
+        company = f"{' '.join(rnd.sample(words, 2)).title()} {i % 4999} {rnd.choice(suffixes)}".strip()
+        batch.append((f"c{i:07d}", company, normalize_company(company), f"GRP{i:06d}"))
+    con.executemany("INSERT INTO customer VALUES (?, ?, ?, ?)", batch)
+    con.commit()
+
+    def timed(sql: str, params, repeat: int = 5):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            found = con.execute(sql, params).fetchall()
+        return (time.perf_counter() - t0) / repeat * 1000, found
+
+    code = f"grp{rows // 2:06d}"
+    scan_ms, _ = timed("SELECT id FROM customer WHERE lower(groupcode) = ?", (code,))
+    t0 = time.perf_counter()
+    con.execute("CREATE INDEX ix_customer_groupcode_lower ON customer (lower(groupcode))")
+    con.execute("CREATE INDEX ix_customer_company_key ON customer (company_key)")
+    for stmt in _SQLITE_DDL:
+        con.execute(stmt)
+    con.execute("INSERT INTO customer_company_search(customer_company_search) VALUES ('rebuild')")
+    con.commit()
+    print(f"indexed {rows} customers in {time.perf_counter() - t0:.2f}s")
+    index_ms, _ = timed("SELECT id FROM customer WHERE lower(groupcode) = ?", (code,))
+    print(f"groupcode {code!r}: scan {scan_ms:.2f} ms, lower(groupcode) index {index_ms:.3f} ms")
+
+    for q in ["Nexus Vision 42", "gulf energy", "Zenth Logistcs 1234", "noor"]:
+        scan_ms, scan = timed("SELECT id, company FROM customer WHERE company LIKE ? LIMIT 5", (f"%{q.lower()}%",))
+        name_key = normalize_company(q)
+        t0 = time.perf_counter()
+        for _ in range(5):
+            scores = {
+                customer_id: 1.0
+                for (customer_id,) in con.execute("SELECT id FROM customer WHERE company_key = ? LIMIT ?", (name_key, CANDIDATES))
+            }
+            for n, match in enumerate(build_matches(name_key, "sqlite")):
+                if len(scores) >= 5:
+                    break
+                sql = _SQLITE_RANKED_SEARCH_SQL if n else _SQLITE_SEARCH_SQL
+                for customer_id, key, _rank in con.execute(sql, {"match": match, "limit": CANDIDATES}):
+                    score = similarity(name_key, key or "")
+                    if (n == 0 or score >= MIN_SIMILARITY) and customer_id not in scores:
+                        scores[customer_id] = score
+            best = sorted(scores, key=scores.get, reverse=True)[:5]
+        fts_ms = (time.perf_counter() - t0) / 5 * 1000
+        top = con.execute("SELECT company FROM customer WHERE id = ?", (best[0],)).fetchone()[0] if best else None
+        print(f"{q!r}: ILIKE {scan_ms:.1f} ms ({len(scan)} rows), trigram index + ranking {fts_ms:.1f} ms "
+              f"({len(best)} rows, best {top!r})")
+    con.close()
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
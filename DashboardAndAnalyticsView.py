@@ -1,10 +1,14 @@
+import json
 from datetime import datetime, timedelta
 from typing import Any, Dict
-from fastapi import Depends, Query
+from fastapi import Depends, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import selectinload
 from sqlalchemy import func, or_, select,case,and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import CompanyDetails, Session as SessionModel, Message as MessageModel, SessionPhase, get_db
+from database import AsyncSessionLocal, CompanyDetails, Session as SessionModel, Message as MessageModel, SessionPhase, SessionService, get_db
+from ConManager import dashboard_manager
+from Config import DASHBOARD_SNAPSHOT_TTL
+from SessionUtils import active_session_clause
 from collections import defaultdict
 from dateutil.relativedelta import relativedelta
 
@@ -18,268 +22,284 @@ def calculate_growth(current: int, previous: int) -> str:
     sign = "+" if change > 0 else ""
     return f"{sign}{int(change)}%"
 
-def init(app):
-    @app.get("/api/dashboard", response_model=dict)
-    async def get_dashboard(db: AsyncSession = Depends(get_db)):
-        now = datetime.utcnow()
-        week_start = now - timedelta(days=7)
-        last_week_start = week_start - timedelta(days=7)
-        last_week_end = week_start
-
-        stmt_total = select(func.count(SessionModel.id)).where(SessionModel.created_at >= week_start)
-        total_leads = (await db.execute(stmt_total)).scalar() or 0
-
-        stmt_high = select(func.count(SessionModel.id)).where(
-            and_(SessionModel.created_at >= week_start, SessionModel.interest == "high")
-        )
-        high_engagement = (await db.execute(stmt_high)).scalar() or 0
-
-
-        stmt_active = select(func.count(SessionModel.id)).where(SessionModel.status == "active")
-        active_chats = (await db.execute(stmt_active)).scalar() or 0
-
-
-        stmt_req = (
-            select(func.count(SessionModel.id))
-            .join(SessionPhase, SessionPhase.session_id == SessionModel.id)
-            .where(and_(SessionModel.created_at >= week_start, SessionPhase.q4_services.isnot(None)))
-        )
-        requested_services = (await db.execute(stmt_req)).scalar() or 0
-
-        # Last Week
-        stmt_last_req = (
-            select(func.count(SessionModel.id))
-            .join(SessionPhase, SessionPhase.session_id == SessionModel.id)
-            .where(
-                and_(
-                    SessionModel.created_at >= last_week_start,
-                    SessionModel.created_at < last_week_end,
-                    SessionPhase.q4_services.isnot(None),
-                )
+def format_response_time(seconds: float) -> str:
+    if seconds < 60:
+        return f"{int(seconds)}s"
+    mins = int(seconds // 60)
+    secs = int(seconds % 60)
+    return f"{mins}m {secs}s"
+
+def hot_lead_entry(ses: SessionModel, now: datetime) -> Dict[str, Any]:
+    """Row of the hot-leads radar; ``ses`` needs phase_info and services loaded."""
+    interest = getattr(ses, 'interest', 'low')
+    updated_at = getattr(ses, 'updated_at', None)
+    phase_info = getattr(ses, 'phase_info', None)
+
+    priority = "High" if interest == "high" else "Medium"
+
+    delta = now - updated_at if updated_at else timedelta(0)
+    if delta.days >= 2:
+        time_ago = f"{delta.days} days ago"
+    elif delta.days == 1:
+        time_ago = "Yesterday"
+    elif delta.seconds >= 3600:
+        time_ago = f"{delta.seconds // 3600}h ago"
+    else:
+        mins = delta.seconds // 60
+        time_ago = f"{mins}m ago" if mins > 0 else "Just now"
+
+    service = next((sv.service for sv in ses.services if sv.service), "N/A")
+
+    # Safe name retrieval
+    q1_email = phase_info.q1_email if phase_info else None
+    name = ses.username or q1_email or "Unknown"
+
+    # Safe company retrieval
+    comp_name = phase_info.q1_company if phase_info else "N/A"
+
+    return {
+        "id": ses.id,
+        "name": name,
+        "priority": priority,
+        "time": time_ago,
+        "company": comp_name,
+        "service": service,
+    }
+
+async def compute_dashboard(db: AsyncSession) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    week_start = now - timedelta(days=7)
+    last_week_start = week_start - timedelta(days=7)
+    last_week_end = week_start
+
+    stmt_total = select(func.count(SessionModel.id)).where(SessionModel.created_at >= week_start)
+    total_leads = (await db.execute(stmt_total)).scalar() or 0
+
+    stmt_high = select(func.count(SessionModel.id)).where(
+        and_(SessionModel.created_at >= week_start, SessionModel.interest == "high")
+    )
+    high_engagement = (await db.execute(stmt_high)).scalar() or 0
+
+
+    stmt_active = select(func.count(SessionModel.id)).where(active_session_clause())
+    active_chats = (await db.execute(stmt_active)).scalar() or 0
+
+
+    stmt_req = (
+        select(func.count(SessionModel.id))
+        .join(SessionPhase, SessionPhase.session_id == SessionModel.id)
+        .where(and_(SessionModel.created_at >= week_start, SessionPhase.q4_services.isnot(None)))
+    )
+    requested_services = (await db.execute(stmt_req)).scalar() or 0
+
+    # Last Week
+    stmt_last_req = (
+        select(func.count(SessionModel.id))
+        .join(SessionPhase, SessionPhase.session_id == SessionModel.id)
+        .where(
+            and_(
+                SessionModel.created_at >= last_week_start,
+                SessionModel.created_at < last_week_end,
+                SessionPhase.q4_services.isnot(None),
             )
         )
-        last_requested = (await db.execute(stmt_last_req)).scalar() or 0
-
-        requested_change = calculate_growth(requested_services, last_requested)
-
-        stmt_msgs = (
-            select(MessageModel.session_id, MessageModel.role, MessageModel.timestamp)
-            .join(SessionModel, SessionModel.id == MessageModel.session_id)
-            .where(SessionModel.created_at >= week_start)
-            .order_by(MessageModel.session_id, MessageModel.timestamp)
-        )
-        result_msgs = await db.execute(stmt_msgs)
-        # result_msgs.all() returns tuples: (session_id, role, timestamp)
-        all_msg_rows = result_msgs.all()
-
-        session_messages = defaultdict(list)
-        for sid, role, ts in all_msg_rows:
-            session_messages[sid].append((role, ts))
-
-        response_times = []
-        for messages in session_messages.values():
-            if len(messages) < 2:
-                continue
-            for i in range(1, len(messages)):
-                prev_role, prev_ts = messages[i - 1]
-                curr_role, curr_ts = messages[i]
-                
-                # Calculate time only between user -> bot
-                if prev_role == "user" and curr_role == "bot":
-                    diff_seconds = (curr_ts - prev_ts).total_seconds()
-                    response_times.append(diff_seconds)
-
-        avg_response_seconds = sum(response_times) / len(response_times) if response_times else 0
-        if avg_response_seconds < 60:
-            avg_response = f"{int(avg_response_seconds)}s"
-        else:
-            mins = int(avg_response_seconds // 60)
-            secs = int(avg_response_seconds % 60)
-            avg_response = f"{mins}m {secs}s"
-
-        # Helper to count CSV services
-        def count_services_from_rows(rows):
-            counts = defaultdict(int)
-            for row in rows:
-                # row is a tuple (q4_services,)
-                serv_str = row[0] or ""
-                # Split by comma, strip whitespace, ignore empty strings
-                services = [s.strip() for s in serv_str.split(",") if s.strip()]
-                for s in services:
-                    counts[s] += 1
-            return counts
-
-        # Current Week Services
-        stmt_services = (
-            select(SessionPhase.q4_services)
-            .join(SessionModel, SessionModel.id == SessionPhase.session_id)
-            .where(and_(SessionModel.created_at >= week_start, SessionPhase.q4_services.isnot(None)))
-        )
-        this_week_counts = count_services_from_rows((await db.execute(stmt_services)).fetchall())
-        
-        # Sort top 6
-        sorted_services = sorted(this_week_counts.items(), key=lambda x: x[1], reverse=True)[:6]
-
-        # Last Week Services (for comparison)
+    )
+    last_requested = (await db.execute(stmt_last_req)).scalar() or 0
+
+    requested_change = calculate_growth(requested_services, last_requested)
+
+    stmt_msgs = (
+        select(MessageModel.session_id, MessageModel.role, MessageModel.timestamp)
+        .where(MessageModel.session_id.in_(select(SessionModel.id).where(SessionModel.created_at >= week_start)))
+        .order_by(MessageModel.session_id, MessageModel.timestamp)
+    )
+    result_msgs = await db.execute(stmt_msgs)
+    # result_msgs.all() returns tuples: (session_id, role, timestamp)
+    all_msg_rows = result_msgs.all()
+
+    session_messages = defaultdict(list)
+    for sid, role, ts in all_msg_rows:
+        session_messages[sid].append((role, ts))
+
+    response_times = []
+    for messages in session_messages.values():
+        if len(messages) < 2:
+            continue
+        for i in range(1, len(messages)):
+            prev_role, prev_ts = messages[i - 1]
+            curr_role, curr_ts = messages[i]
+            
+            # Calculate time only between user -> bot
+            if prev_role == "user" and curr_role == "bot":
+                diff_seconds = (curr_ts - prev_ts).total_seconds()
+                response_times.append(diff_seconds)
+
+    avg_response_seconds = sum(response_times) / len(response_times) if response_times else 0
+    avg_response = format_response_time(avg_response_seconds)
+
+    # Current Week Services (indexed GROUP BY over the normalized session_services table)
+    service_count = func.count(func.distinct(SessionService.session_id)).label("cnt")
+    stmt_services = (
+        select(SessionService.service, service_count)
+        .join(SessionModel, SessionModel.id == SessionService.session_id)
+        .where(and_(SessionModel.created_at >= week_start, SessionService.service.isnot(None)))
+        .group_by(SessionService.service)
+        .order_by(service_count.desc())
+        .limit(6)
+    )
+    sorted_services = [(name, cnt) for name, cnt in (await db.execute(stmt_services)).all()]
+
+    # Last Week Services (for comparison), only for the services shown
+    last_week_counts = {}
+    if sorted_services:
         stmt_last_services = (
-            select(SessionPhase.q4_services)
-            .join(SessionModel, SessionModel.id == SessionPhase.session_id)
+            select(SessionService.service, func.count(func.distinct(SessionService.session_id)))
+            .join(SessionModel, SessionModel.id == SessionService.session_id)
             .where(
                 and_(
                     SessionModel.created_at >= last_week_start,
                     SessionModel.created_at < last_week_end,
-                    SessionPhase.q4_services.isnot(None),
+                    SessionService.service.in_([name for name, _ in sorted_services]),
                 )
             )
+            .group_by(SessionService.service)
         )
-        last_week_counts = count_services_from_rows((await db.execute(stmt_last_services)).fetchall())
+        last_week_counts = dict((await db.execute(stmt_last_services)).all())
 
-        service_demand = []
-        for name, count in sorted_services:
-            last_count = last_week_counts.get(name, 0)
-            # FIX: Use robust helper here too
-            change_str = calculate_growth(count, last_count)
-            service_demand.append({"name": name, "count": count, "change": change_str})
+    service_demand = []
+    for name, count in sorted_services:
+        last_count = last_week_counts.get(name, 0)
+        # FIX: Use robust helper here too
+        change_str = calculate_growth(count, last_count)
+        service_demand.append({"name": name, "count": count, "change": change_str})
 
-        top_service = service_demand[0] if service_demand else {"name": "N/A", "count": 0, "change": "0%"}
+    top_service = service_demand[0] if service_demand else {"name": "N/A", "count": 0, "change": "0%"}
 
 
-        subq_sessions = select(SessionModel.id).where(SessionModel.created_at >= week_start)
-        
-        stmt_durations = (
-            select(
-                MessageModel.session_id,
-                SessionModel.username,
-                SessionPhase.q1_company,
-                func.max(MessageModel.timestamp).label("max_ts"),
-                func.min(MessageModel.timestamp).label("min_ts"),
-            )
-            .join(SessionModel, SessionModel.id == MessageModel.session_id)
-            .join(SessionPhase, SessionPhase.session_id == SessionModel.id, isouter=True)
-            .where(MessageModel.session_id.in_(subq_sessions))
-            .group_by(MessageModel.session_id, SessionModel.username, SessionPhase.q1_company)
-            .having(func.count(MessageModel.id) > 0)
+    subq_sessions = select(SessionModel.id).where(SessionModel.created_at >= week_start)
+    
+    stmt_durations = (
+        select(
+            MessageModel.session_id,
+            SessionModel.username,
+            SessionPhase.q1_company,
+            func.max(MessageModel.timestamp).label("max_ts"),
+            func.min(MessageModel.timestamp).label("min_ts"),
         )
-        duration_rows = (await db.execute(stmt_durations)).fetchall()
-
-        duration_data = []
-        total_duration_secs = 0
-        valid_durations_count = 0
-
-        for row in duration_rows:
-            sid, username, company, max_ts, min_ts = row
-            if max_ts and min_ts:
-                duration_td = max_ts - min_ts
-                secs = duration_td.total_seconds()
-                duration_data.append((username, company, secs))
-                total_duration_secs += secs
-                valid_durations_count += 1
-                
-        avg_this_week_seconds = total_duration_secs / valid_durations_count if valid_durations_count else 0
-        
-        avg_mins = int(avg_this_week_seconds // 60)
-        avg_secs = int(avg_this_week_seconds % 60)
-        avg_conversation_time = f"{avg_mins:02d}m {avg_secs:02d}s"
-
-        top_durations = sorted(duration_data, key=lambda x: x[2], reverse=True)[:7]
-
-        deepest_conversations = []
-        for username, company, total_seconds in top_durations:
-            mins = int(total_seconds // 60)
-            secs = int(total_seconds % 60)
-            duration_str = f"{mins}m {secs:02d}s"
-
-            change_seconds = total_seconds - avg_this_week_seconds
-            abs_change = abs(change_seconds)
-            c_mins = int(abs_change // 60)
-            c_secs = int(abs_change % 60)
+        .join(SessionModel, SessionModel.id == MessageModel.session_id)
+        .join(SessionPhase, SessionPhase.session_id == SessionModel.id, isouter=True)
+        .where(MessageModel.session_id.in_(subq_sessions))
+        .group_by(MessageModel.session_id, SessionModel.username, SessionPhase.q1_company)
+        .having(func.count(MessageModel.id) > 0)
+    )
+    duration_rows = (await db.execute(stmt_durations)).fetchall()
+
+    duration_data = []
+    total_duration_secs = 0
+    valid_durations_count = 0
+
+    for row in duration_rows:
+        sid, username, company, max_ts, min_ts = row
+        if max_ts and min_ts:
+            duration_td = max_ts - min_ts
+            secs = duration_td.total_seconds()
+            duration_data.append((username, company, secs))
+            total_duration_secs += secs
+            valid_durations_count += 1
             
-            change_str = f"{c_mins}m {c_secs:02d}s"
-            
-            if change_seconds < 0:
-                change_icon = "arrow_downward"
-                change_color = "text-red-600"
-            else:
-                change_icon = "arrow_upward"
-                change_color = "text-green-600"
-
-            deepest_conversations.append({
-                "name": username or "Anonymous",
-                "company": company or "N/A",
-                "duration": duration_str,
-                "change": change_str,
-                "change_icon": change_icon,
-                "change_color": change_color,
-            })
-
-        stmt_hot = (
-            select(SessionModel)
-            .where(SessionModel.approved == True)
-            .options(
-                selectinload(SessionModel.phase_info),
-
-                selectinload(SessionModel.company_details), 
-            )
-            .order_by(SessionModel.updated_at.desc())
-            .limit(7)
-        )
-        hot_sessions = (await db.execute(stmt_hot)).scalars().all()
+    avg_this_week_seconds = total_duration_secs / valid_durations_count if valid_durations_count else 0
+    
+    avg_mins = int(avg_this_week_seconds // 60)
+    avg_secs = int(avg_this_week_seconds % 60)
+    avg_conversation_time = f"{avg_mins:02d}m {avg_secs:02d}s"
+
+    top_durations = sorted(duration_data, key=lambda x: x[2], reverse=True)[:7]
+
+    deepest_conversations = []
+    for username, company, total_seconds in top_durations:
+        mins = int(total_seconds // 60)
+        secs = int(total_seconds % 60)
+        duration_str = f"{mins}m {secs:02d}s"
+
+        change_seconds = total_seconds - avg_this_week_seconds
+        abs_change = abs(change_seconds)
+        c_mins = int(abs_change // 60)
+        c_secs = int(abs_change % 60)
         
-        hot_leads = []
-        for ses in hot_sessions:
-            # safely get attributes
-            interest = getattr(ses, 'interest', 'low')
-            updated_at = getattr(ses, 'updated_at', None)
-            phase_info = getattr(ses, 'phase_info', None)
-            company_details = getattr(ses, 'company_details', None)
-
-            priority = "High" if interest == "high" else "Medium"
-            
-            delta = now - updated_at if updated_at else timedelta(0)
-            if delta.days >= 2:
-                time_ago = f"{delta.days} days ago"
-            elif delta.days == 1:
-                time_ago = "Yesterday"
-            elif delta.seconds >= 3600:
-                time_ago = f"{delta.seconds // 3600}h ago"
-            else:
-                mins = delta.seconds // 60
-                time_ago = f"{mins}m ago" if mins > 0 else "Just now"
-
-            q4 = phase_info.q4_services if phase_info else None
-            service = q4.split(",")[0].strip() if q4 else "N/A"
-            
-            # Safe name retrieval
-            q1_email = phase_info.q1_email if phase_info else None
-            name = ses.username or q1_email or "Unknown"
-            
-            # Safe company retrieval
-            comp_name = phase_info.q1_company if phase_info else "N/A"
-
-            hot_leads.append({
-                "name": name,
-                "priority": priority,
-                "time": time_ago,
-                "company": comp_name,
-                "service": service,
-            })
-
-        return {
-            "total_leads": total_leads,
-            "high_engagement": high_engagement,
-            "active_chats": active_chats,
-            "avg_response": avg_response,
-            "requested_services": requested_services,
-            "requested_change": requested_change,
-            "service_demand": service_demand,
-            "top_service": top_service,
-            "deepest_conversations": deepest_conversations,
-            "avg_conversation_time": avg_conversation_time,
-            "hot_leads": hot_leads,
-            "hot_leads_count": len(hot_leads),
-        }
+        change_str = f"{c_mins}m {c_secs:02d}s"
+        
+        if change_seconds < 0:
+            change_icon = "arrow_downward"
+            change_color = "text-red-600"
+        else:
+            change_icon = "arrow_upward"
+            change_color = "text-green-600"
+
+        deepest_conversations.append({
+            "name": username or "Anonymous",
+            "company": company or "N/A",
+            "duration": duration_str,
+            "change": change_str,
+            "change_icon": change_icon,
+            "change_color": change_color,
+        })
+
+    stmt_hot = (
+        select(SessionModel)
+        .where(SessionModel.approved == True)
+        .options(
+            selectinload(SessionModel.phase_info),
+
+            selectinload(SessionModel.services),
+        )
+        .order_by(SessionModel.updated_at.desc())
+        .limit(7)
+    )
+    hot_sessions = (await db.execute(stmt_hot)).scalars().all()
+    
+    hot_leads = [hot_lead_entry(ses, now) for ses in hot_sessions]
+
+    return {
+        "total_leads": total_leads,
+        "high_engagement": high_engagement,
+        "active_chats": active_chats,
+        "avg_response": avg_response,
+        "avg_response_seconds": avg_response_seconds,
+        "response_samples": len(response_times),
+        "requested_services": requested_services,
+        "requested_change": requested_change,
+        "service_demand": service_demand,
+        "top_service": top_service,
+        "deepest_conversations": deepest_conversations,
+        "avg_conversation_time": avg_conversation_time,
+        "hot_leads": hot_leads,
+        "hot_leads_count": len(hot_leads),
+    }
 
 
+def init(app):
+    @app.get("/api/dashboard", response_model=dict)
+    async def get_dashboard(db: AsyncSession = Depends(get_db)):
+        return await compute_dashboard(db)
+
+    @app.websocket("/ws/dashboard")
+    async def websocket_dashboard(websocket: WebSocket):
+        async def load_snapshot():
+            async with AsyncSessionLocal() as db:
+                return await compute_dashboard(db)
+
+        await dashboard_manager.connect(websocket)
+        try:
+            # no await between getting the snapshot and starting the tab, so no delta slips in
+            snapshot, seq = await dashboard_manager.get_snapshot(load_snapshot, DASHBOARD_SNAPSHOT_TTL)
+            dashboard_manager.start(websocket, snapshot, seq)
+            while True:
+                # clients only send keepalives; deltas are pushed by the write paths
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            dashboard_manager.disconnect(websocket)
 
     @app.get("/analytics", response_model=Dict[str, Any])
     async def get_analytics_optimized(
@@ -1,13 +1,19 @@
 
 import json
 import asyncio
+from datetime import timedelta
+from typing import Optional
 from fastapi import Depends, HTTPException
 import httpx
 from sqlalchemy.future import select
 from loguru import logger
-from ClientModel import PERPLEXITY_API_KEY, PERPLEXITY_BASE_URL
 from Schemas import ResearchPayload
 from database import CompanyDetails, Session as SessionModel, get_db
+from LeadSearch import refresh_lead_index
+from LeadCache import TAG_SEARCH, invalidate_session
+from RateLimit import limiter
+from HttpClients import http_clients
+from CompanyEntities import company_entities, email_domain, entity_result
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 import logging
@@ -15,17 +21,6 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-http_client = httpx.AsyncClient(
-    base_url=PERPLEXITY_BASE_URL,
-    headers={
-        "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
-        "Content-Type": "application/json",
-    },
-    timeout=httpx.Timeout(30.0, connect=10.0),  
-    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
-)
-
-
 import json
 import asyncio
 import logging
@@ -95,7 +90,8 @@ async def _call_research_async(prompt: str, max_tokens: int = 800, temperature:
 
     for attempt in range(3):
         try:
-            response = await http_client.post("/chat/completions", json=payload)
+            async with limiter("perplexity"):
+                response = await http_clients.get("perplexity").post("/chat/completions", json=payload)
             response.raise_for_status()
             data = response.json()
 
@@ -138,15 +134,31 @@ def init(app):
     @app.post("/api/deep-research")
     async def deep_research(
         payload: ResearchPayload,
+        refresh_if_older_than: Optional[int] = None,
         db: AsyncSession = Depends(get_db)
     ):
+        """Research the lead's company; reuses research for the same company younger than
+        ``refresh_if_older_than`` days (default COMPANY_ENTITY_MAX_AGE_DAYS, 0 always refreshes)."""
+        sessionID = payload.id
         try:
-            # Step 1: Call external research provider
-            prompt = _build_research_prompt(payload)
-            sessionID = payload.id
-            logger.info(f"Starting deep research for session {sessionID}")
-
-            message_content, citations = await _call_research_async(prompt)
+            # Step 1: Reuse research on this company, or call the external research provider
+            domain = email_domain(payload.email)
+            entity = None
+            if not payload.additional_info and refresh_if_older_than != 0:
+                max_age = timedelta(days=refresh_if_older_than) if refresh_if_older_than else None
+                # enrichment reports are shorter; only reuse what this endpoint produced
+                entity = await company_entities.lookup(domain, payload.company, max_age, source="deep_research")
+            if entity is not None:
+                reused = entity_result(entity)
+                message_content, citations = {"summary": reused["summary"], "details": reused["details"]}, reused["sources"]
+                logger.info(f"Reusing company research for session {sessionID}")
+            else:
+                prompt = _build_research_prompt(payload)
+                logger.info(f"Starting deep research for session {sessionID}")
+                message_content, citations = await _call_research_async(prompt)
+                if not payload.additional_info:
+                    await company_entities.store(domain, payload.company,
+                                                 {**message_content, "sources": citations}, source="deep_research")
 
             stmt = (
                 select(SessionModel)
@@ -188,7 +200,9 @@ def init(app):
                 # Or keep existing images: leave as-is
 
             # Step 5: Commit
+            await refresh_lead_index(db, session.id)
             await db.commit()
+            await invalidate_session(session.id, TAG_SEARCH)
             await db.refresh(session)
 
             logger.info(f"Deep research completed and OVERWRITTEN for session {sessionID}")
@@ -201,7 +215,8 @@ def init(app):
                 "result": summary,
                 "citations": citations,
                 "session_id": session.id,
-                "details":details
+                "details":details,
+                "reused": entity is not None,
             }
 
         except HTTPException:
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+import aiosqlite
+from fastapi import HTTPException
+from Config import ENRICHMENT_CACHE_MAX_ENTRIES, ENRICHMENT_CACHE_PATH, ENRICHMENT_CACHE_TTLS
+
+# Persistent cache for upstream enrichment results, shared by every worker process through
+# one SQLite file (WAL, so readers never wait for a writer). Each namespace has its own TTL
+# and entry limit; the least recently read entries beyond the limit are evicted.
+#
+# The connection is in autocommit mode and every write is a single statement (INSERT OR
+# REPLACE for sets), so a reader sees either the old or the new value and a crash cannot
+# leave a half-written cache, unlike the JSON files this replaces (customer_cache.json and
+# enrichment_cache.json are imported once when the cache file is created).
+NS_COMPANY = "company"            # CompanyFinder.enrich_company
+NS_VERIFICATION = "verification"  # VerifyUser.verify_user
+NS_CUSTOMER = "customer"          # FindUser.find_existing_customer
+NS_EMAIL = "email"                # VerifyEmail /verify/email
+
+TOUCH_INTERVAL = 300  # seconds; a hit refreshes accessed_at at most this often (LRU order)
+PURGE_EVERY = 200     # sets between eviction passes
+LEGACY_FILES = {NS_CUSTOMER: "customer_cache.json", NS_COMPANY: "enrichment_cache.json"}
+
+_DDL = (
+    """CREATE TABLE IF NOT EXISTS cache_entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)",
+    "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (namespace, accessed_at)",
+)
+
+
+class EnrichmentCache:
+    def __init__(self, path: str = ENRICHMENT_CACHE_PATH, ttls: Dict[str, int] = ENRICHMENT_CACHE_TTLS,
+                 max_entries: int = ENRICHMENT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.db: Optional[aiosqlite.Connection] = None
+        self._open_lock = asyncio.Lock()
+        self._sets_since_purge = 0
+        self.metrics = {ns: {"hits": 0, "misses": 0, "sets": 0, "evicted": 0} for ns in ttls}
+        self.errors = 0
+
+    async def _conn(self) -> aiosqlite.Connection:
+        if self.db is None:
+            async with self._open_lock:
+                if self.db is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    fresh = not os.path.exists(self.path)
+                    db = await aiosqlite.connect(self.path, timeout=15, isolation_level=None)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    for ddl in _DDL:
+                        await db.execute(ddl)
+                    self.db = db
+                    if fresh:
+                        await self._import_legacy()
+        return self.db
+
+    async def _import_legacy(self) -> None:
+        now = time.time()
+        for namespace, filename in LEGACY_FILES.items():
+            if not os.path.exists(filename):
+                continue
+            try:
+                with open(filename, "r") as f:
+                    entries = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"Enrichment cache: skipped {filename}: {e}")
+                continue
+            rows = [
+                (namespace, key, json.dumps(_legacy_value(namespace, entry), default=str),
+                 entry.get("timestamp", now), now + self.ttls[namespace], now)
+                for key, entry in entries.items() if isinstance(entry, dict)
+            ]
+            await self.db.executemany("INSERT OR IGNORE INTO cache_entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+            print(f"Enrichment cache: imported {len(rows)} entries from {filename}")
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            db = await self._conn()
+            now = time.time()
+            async with db.execute(
+                "SELECT value, accessed_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now),
+            ) as cur:
+                row = await cur.fetchone()
+            if row is None:
+                self.metrics[namespace]["misses"] += 1
+                return None
+            if now - row[1] > TOUCH_INTERVAL:
+                await db.execute("UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                                 (now, namespace, key))
+            self.metrics[namespace]["hits"] += 1
+            return json.loads(row[0])
+        except Exception as e:
+            self.errors += 1
+            print(f"Enrichment cache get failed: {e}")
+            return None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        try:
+            db = await self._conn()
+            now = time.time()
+            await db.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, default=str), now, now + (ttl or self.ttls[namespace]), now),
+            )
+            self.metrics[namespace]["sets"] += 1
+            self._sets_since_purge += 1
+            if self._sets_since_purge >= PURGE_EVERY:
+                await self.purge()
+        except Exception as e:
+            self.errors += 1
+            print(f"Enrichment cache set failed: {e}")
+
+    async def delete(self, namespace: str, key: str) -> None:
+        db = await self._conn()
+        await db.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    async def clear(self, namespace: str) -> int:
+        db = await self._conn()
+        cur = await db.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+        return cur.rowcount
+
+    async def purge(self) -> int:
+        """Drop expired entries, then the least recently read ones above the per-namespace limit."""
+        self._sets_since_purge = 0
+        db = await self._conn()
+        cur = await db.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        removed = cur.rowcount
+        for namespace in self.ttls:
+            cur = await db.execute(
+                """DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                       SELECT key FROM cache_entries WHERE namespace = ?
+                       ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)""",
+                (namespace, namespace, self.max_entries),
+            )
+            self.metrics[namespace]["evicted"] += cur.rowcount
+            removed += cur.rowcount
+        return removed
+
+    async def stats(self) -> Dict[str, Any]:
+        db = await self._conn()
+        async with db.execute("SELECT namespace, count(*) FROM cache_entries GROUP BY namespace") as cur:
+            counts = dict(await cur.fetchall())
+        namespaces = {}
+        for ns, m in self.metrics.items():
+            lookups = m["hits"] + m["misses"]
+            namespaces[ns] = {
+                "entries": counts.get(ns, 0),
+                "ttl_seconds": self.ttls[ns],
+                **m,
+                "hit_rate": round(m["hits"] / lookups, 4) if lookups else None,
+            }
+        return {"path": self.path, "max_entries": self.max_entries, "errors": self.errors, "namespaces": namespaces}
+
+    async def close(self) -> None:
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+
+def _legacy_value(namespace: str, entry: Dict[str, Any]) -> Any:
+    if namespace == NS_CUSTOMER:
+        return {"result": entry.get("result"), "classification": entry.get("classification", "none")}
+    return entry.get("result")
+
+
+enrichment_cache = EnrichmentCache()
+
+
+def init(app):
+    @app.get("/api/cache/enrichment/stats")
+    async def enrichment_cache_stats() -> Dict[str, Any]:
+        return await enrichment_cache.stats()
+
+    @app.delete("/api/cache/enrichment/{namespace}")
+    async def clear_enrichment_cache(namespace: str) -> Dict[str, Any]:
+        if namespace not in enrichment_cache.ttls:
+            raise HTTPException(status_code=404, detail=f"Unknown cache namespace: {namespace}")
+        return {"namespace": namespace, "removed": await enrichment_cache.clear(namespace)}
@@ -0,0 +1,287 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from CompanyEntities import company_entities, email_domain, entity_result
+from CompanyFinder import enrich_company, enrichment_failed, save_company_details
+from Config import ENRICHMENT_MAX_ATTEMPTS, ENRICHMENT_RETRY_BASE, ENRICHMENT_WORKERS
+from database import AsyncSessionLocal, EnrichmentJob, Session as SessionModel, SessionPhase
+
+# Company enrichment for chat sessions, run from a table instead of fire-and-forget tasks.
+# enqueue() is idempotent per session (unique session_id), so repeated chat turns do not
+# start more research. A fixed number of workers claim due jobs with a conditional UPDATE
+# (safe across worker processes); a failed attempt is queued again with exponential
+# backoff until ENRICHMENT_MAX_ATTEMPTS. start() re-queues jobs left running by the last
+# shutdown; one left by a crashed process elsewhere is claimed again by the next poll once
+# STALE_AFTER has passed since its claim.
+#
+# Jobs are prefetched: the chat queues one as soon as the lead's company (or business email
+# domain) is known, so the report is ready by snip_q4 when c_info goes into the prompt.
+# Workers take the most interested leads first, and a queued job is cancelled when its
+# session goes inactive (queueing it again later revives it). A lead whose company was
+# already researched for another lead (CompanyEntities) reuses that report instead.
+STALE_AFTER = timedelta(minutes=5)
+POLL_INTERVAL = 5.0  # seconds an idle worker waits before looking for due retries
+RECENT_JOBS_LIMIT = 50
+INTEREST_PRIORITY = {"high": 2, "medium": 1, "low": 0}
+
+
+def interest_priority(interest: Optional[str]) -> int:
+    return INTEREST_PRIORITY.get((interest or "").lower(), 0)
+
+
+def company_query(company: str, name: Optional[str] = None, role: Optional[str] = None,
+                  email: Optional[str] = None) -> str:
+    """Research prompt for a lead, with whatever details the chat has collected so far."""
+    query = f"Using latest data (2025), give a comprehensive business intelligence report on  Company: {company}"
+    if name:
+        query += f" Key person: {name}"
+    if role:
+        query += f" - current title: {role}"
+    if email:
+        query += f", email: {email}"
+    return query
+
+
+def _job_dict(job: EnrichmentJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "session_id": job.session_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "priority": job.priority,
+        "max_attempts": ENRICHMENT_MAX_ATTEMPTS,
+        "next_run_at": job.next_run_at if job.status == "queued" else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+    }
+
+
+async def lead_company(session_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """(company, business email domain) captured so far for the session."""
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(SessionPhase.q1_company, SessionPhase.q1_email).where(SessionPhase.session_id == session_id)
+        )).first()
+    return (row[0], email_domain(row[1])) if row else (None, None)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=ENRICHMENT_RETRY_BASE * 2 ** (attempts - 1))
+
+
+class EnrichmentWorkerPool:
+    def __init__(self, workers: int = ENRICHMENT_WORKERS):
+        self.workers = workers
+        self.tasks: List[asyncio.Task] = []
+        self.running: set = set()
+        self.wakeup = asyncio.Event()
+
+    async def start(self) -> None:
+        # jobs left running by the previous shutdown or crash go back in the queue now rather
+        # than after STALE_AFTER; with several processes on one table a job another process
+        # is still on may run twice, which only repeats its research (results are per session)
+        async with AsyncSessionLocal() as db:
+            requeued = await db.execute(
+                update(EnrichmentJob)
+                .where(EnrichmentJob.status == "running")
+                .values(status="queued", next_run_at=datetime.utcnow())
+            )
+            await db.commit()
+        if requeued.rowcount:
+            print(f"Resuming {requeued.rowcount} enrichment jobs")
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.running:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(EnrichmentJob)
+                    .where(EnrichmentJob.id.in_(self.running), EnrichmentJob.status == "running")
+                    .values(status="queued", next_run_at=datetime.utcnow())
+                )
+                await db.commit()
+            self.running.clear()
+
+    async def enqueue(self, session_id: str, query: str, priority: int = 0) -> Optional[EnrichmentJob]:
+        """Queue research for ``session_id`` unless it already has a job; returns the session's job.
+
+        A job that has not started yet takes the newer query and any higher priority; a
+        cancelled one is queued again.
+        """
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(
+                select(EnrichmentJob).where(EnrichmentJob.session_id == session_id)
+            )).scalar_one_or_none()
+            if job is not None:
+                if job.status == "cancelled":
+                    job.status, job.attempts, job.error, job.next_run_at = "queued", 0, None, datetime.utcnow()
+                elif job.status != "queued" or (job.query == query and job.priority >= priority):
+                    return job
+                job.query, job.priority = query, max(job.priority, priority)
+                await db.commit()
+                self.wakeup.set()
+                return job
+            job = EnrichmentJob(session_id=session_id, query=query, priority=priority, next_run_at=datetime.utcnow())
+            db.add(job)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # queued concurrently by another turn / worker process, or the session is gone
+                await db.rollback()
+                return None
+        self.wakeup.set()
+        return job
+
+    async def retry(self, job_id: str) -> EnrichmentJob:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(EnrichmentJob, job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="Enrichment job not found")
+            # a running job is only taken over once its worker is gone
+            reset = await db.execute(
+                update(EnrichmentJob)
+                .where(EnrichmentJob.id == job_id,
+                       or_(EnrichmentJob.status != "running", self._stale(datetime.utcnow())))
+                .values(status="queued", attempts=0, error=None, next_run_at=datetime.utcnow())
+            )
+            await db.commit()
+            if not reset.rowcount:
+                raise HTTPException(status_code=409, detail="Enrichment job is running")
+            await db.refresh(job)
+        self.wakeup.set()
+        return job
+
+    def _stale(self, now: datetime):
+        """Running jobs claimed STALE_AFTER ago by a worker that is gone (not one of ours)."""
+        stale = and_(EnrichmentJob.status == "running", EnrichmentJob.updated_at < now - STALE_AFTER)
+        return and_(stale, EnrichmentJob.id.not_in(self.running)) if self.running else stale
+
+    def _claimable(self, now: datetime):
+        return or_(and_(EnrichmentJob.status == "queued", EnrichmentJob.next_run_at <= now), self._stale(now))
+
+    async def _claim(self) -> Optional[EnrichmentJob]:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            candidates = (await db.execute(
+                select(EnrichmentJob.id)
+                .where(self._claimable(now))
+                .order_by(EnrichmentJob.priority.desc(), EnrichmentJob.next_run_at)
+                .limit(self.workers)
+            )).scalars().all()
+            for job_id in candidates:
+                claimed = await db.execute(
+                    update(EnrichmentJob)
+                    .where(EnrichmentJob.id == job_id, self._claimable(now))
+                    .values(status="running", attempts=EnrichmentJob.attempts + 1, updated_at=func.now())
+                )
+                await db.commit()
+                if claimed.rowcount:
+                    return await db.get(EnrichmentJob, job_id)
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            self.wakeup.clear()
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Enrichment queue poll failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.running.add(job.id)
+            try:
+                await self.run(job)
+                self.running.discard(job.id)
+            except asyncio.CancelledError:
+                raise  # stop() puts it back in the queue
+            except Exception as e:
+                self.running.discard(job.id)
+                print(f"Enrichment job {job.id} attempt {job.attempts} failed: {e}")
+                await self._finish(job, error=str(e))
+
+    async def run(self, job: EnrichmentJob) -> None:
+        company, domain = await lead_company(job.session_id)
+        entity = await company_entities.lookup(domain, company)
+        if entity is not None:
+            await save_company_details(job.session_id, entity_result(entity))
+            await self._finish(job)
+            return
+        result = await enrich_company(job.query)
+        if enrichment_failed(result):
+            raise RuntimeError(result.get("summary") or "empty enrichment result")
+        await save_company_details(job.session_id, result)
+        await company_entities.store(domain, company, result)
+        await self._finish(job)
+
+    async def _finish(self, job: EnrichmentJob, error: Optional[str] = None) -> None:
+        if error is None:
+            values = {"status": "completed", "error": None, "completed_at": datetime.utcnow()}
+        elif job.attempts >= ENRICHMENT_MAX_ATTEMPTS:
+            values = {"status": "failed", "error": error[:500]}
+        else:
+            values = {"status": "queued", "error": error[:500],
+                      "next_run_at": datetime.utcnow() + _retry_delay(job.attempts)}
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(EnrichmentJob).where(EnrichmentJob.id == job.id, EnrichmentJob.status == "running").values(**values)
+            )
+            await db.commit()
+
+    async def cancel_inactive(self, db) -> int:
+        """Cancel queued jobs of inactive sessions, in the caller's transaction (the inactivity sweep)."""
+        result = await db.execute(
+            update(EnrichmentJob)
+            .where(EnrichmentJob.status == "queued",
+                   EnrichmentJob.session_id.in_(select(SessionModel.id).where(SessionModel.status == "inactive")))
+            .values(status="cancelled", error="session inactive")
+        )
+        return result.rowcount or 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "running": len(self.running)}
+
+
+enrichment_pool = EnrichmentWorkerPool()
+
+
+def init(app):
+    @app.get("/api/enrichment-jobs")
+    async def list_enrichment_jobs(status: Optional[str] = None, limit: int = RECENT_JOBS_LIMIT):
+        async with AsyncSessionLocal() as db:
+            stmt = select(EnrichmentJob).order_by(EnrichmentJob.created_at.desc()).limit(min(limit, 200))
+            if status:
+                stmt = stmt.where(EnrichmentJob.status == status)
+            jobs = (await db.execute(stmt)).scalars().all()
+            counts = dict((await db.execute(
+                select(EnrichmentJob.status, func.count()).group_by(EnrichmentJob.status)
+            )).all())
+        return {"jobs": [_job_dict(j) for j in jobs], "counts": counts, **enrichment_pool.stats()}
+
+    @app.get("/api/enrichment-jobs/session/{session_id}")
+    async def get_session_enrichment_job(session_id: str):
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(
+                select(EnrichmentJob).where(EnrichmentJob.session_id == session_id)
+            )).scalar_one_or_none()
+        if job is None:
+            raise HTTPException(status_code=404, detail="No enrichment job for this session")
+        return _job_dict(job)
+
+    @app.post("/api/enrichment-jobs/{job_id}/retry")
+    async def retry_enrichment_job(job_id: str):
+        return _job_dict(await enrichment_pool.retry(job_id))
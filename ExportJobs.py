@@ -0,0 +1,277 @@
+import asyncio
+import gzip as gzip_lib
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy import func, select, update
+from Config import EXPORT_WORKERS, UPLOAD_DIR
+from LeadCache import lead_cache
+from LeadExport import FORMATS, export_select, filename, iter_batches, make_encoder, media_type, parquet_available
+from LeadProjection import apply_lead_filters
+from Schemas import ExportJobRequest
+from database import AsyncSessionLocal, ExportJob
+
+# Background lead exports. A job scans the filtered lead list in primary-key batches and
+# appends to a file under uploads/exports; after every batch the file is fsynced and the
+# job row records the keyset cursor and the byte offset, so a restarted job truncates to
+# the last checkpoint and carries on. Gzip output is written as one gzip member per batch
+# (a valid multi-member .gz) to keep every checkpoint on a member boundary. Parquet has a
+# single footer, so an interrupted parquet job starts over.
+#
+# Completed artifacts are reused for the same filters + format while the lead cache data
+# version (bumped by every lead write) is unchanged.
+EXPORT_DIR = os.path.join(UPLOAD_DIR, "exports")
+STALE_AFTER = timedelta(minutes=5)  # a running job without a checkpoint this long is taken over
+RECENT_JOBS_LIMIT = 20
+
+
+def _filters(req: ExportJobRequest) -> Dict[str, Any]:
+    interest = req.interest if req.interest not in (None, "", "all", "neutral") else None
+    return {"q": req.q or None, "interest": interest, "approved": req.approved, "active": req.active}
+
+
+def _params_key(filters: Dict[str, Any], fmt: str, gzip: bool) -> str:
+    raw = json.dumps({"filters": filters, "format": fmt, "gzip": gzip}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _job_dict(job: ExportJob) -> Dict[str, Any]:
+    progress = None
+    if job.total_rows:
+        progress = round(min(job.rows_written / job.total_rows, 1.0), 4)
+    elif job.status == "completed":
+        progress = 1.0
+    return {
+        "id": job.id,
+        "status": job.status,
+        "format": job.format,
+        "gzip": job.gzip,
+        "filters": json.loads(job.filters),
+        "rows_written": job.rows_written,
+        "total_rows": job.total_rows,
+        "progress": progress,
+        "error": job.error,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+        "download_url": f"/api/exports/{job.id}/download" if job.status == "completed" else None,
+    }
+
+
+def _append(path: str, offset: int, chunk: bytes) -> int:
+    """Write ``chunk`` at ``offset`` (dropping anything after it) and fsync; returns the new size."""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def _remove(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+class ExportWorkerPool:
+    def __init__(self, workers: int = EXPORT_WORKERS):
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.tasks: List[asyncio.Task] = []
+        self.running: set = set()
+
+    async def start(self) -> None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        # the queue lives in this process, so anything still queued or running was cut off
+        # by the previous shutdown or crash and carries on from its checkpoint
+        async with AsyncSessionLocal() as db:
+            pending = (await db.execute(
+                select(ExportJob.id)
+                .where(ExportJob.status.in_(("queued", "running")))
+                .order_by(ExportJob.created_at)
+            )).scalars().all()
+        for job_id in pending:
+            self.queue.put_nowait(job_id)
+        if pending:
+            print(f"Resuming {len(pending)} export jobs")
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        # interrupted jobs keep their checkpoint and are resumed by the next start()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.running:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(ExportJob)
+                    .where(ExportJob.id.in_(self.running), ExportJob.status == "running")
+                    .values(status="queued")
+                )
+                await db.commit()
+            self.running.clear()
+
+    def submit(self, job_id: str) -> None:
+        self.queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self.queue.get()
+            self.running.add(job_id)
+            try:
+                await self.run(job_id)
+                self.running.discard(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.running.discard(job_id)
+                print(f"Export job {job_id} failed: {e}")
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(ExportJob).where(ExportJob.id == job_id).values(status="failed", error=str(e)[:500])
+                    )
+                    await db.commit()
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job_id: str) -> None:
+        async with AsyncSessionLocal() as db:
+            # claim it: a job is only ever run by one worker
+            claimed = await db.execute(
+                update(ExportJob)
+                .where(ExportJob.id == job_id, ExportJob.status.in_(("queued", "running")))
+                .values(status="running", updated_at=func.now())
+            )
+            await db.commit()
+            if not claimed.rowcount:
+                return
+            job = await db.get(ExportJob, job_id)
+
+            filters = json.loads(job.filters)
+            stmt, _ = apply_lead_filters(
+                export_select(), filters["q"], filters["interest"], filters["approved"], filters["active"]
+            )
+            if job.file_path is None:
+                job.file_path = os.path.join(EXPORT_DIR, f"{job.id}.{FORMATS[job.format][1]}" + (".gz" if job.gzip else ""))
+            resumable = job.format != "parquet" and job.cursor is not None and os.path.exists(job.file_path)
+            if not resumable:
+                job.cursor, job.rows_written, job.bytes_written = None, 0, 0
+                job.data_version = await lead_cache.version_token()
+                count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+                job.total_rows = int((await db.execute(count_stmt)).scalar() or 0)
+            await db.commit()
+
+            encoder = make_encoder(job.format, header=job.cursor is None)
+            offset = job.bytes_written
+
+            async def write(chunk: bytes) -> int:
+                if job.gzip and chunk:
+                    chunk = gzip_lib.compress(chunk, compresslevel=6)
+                return await asyncio.to_thread(_append, job.file_path, offset, chunk)
+
+            async for rows, last_id in iter_batches(stmt, after_id=job.cursor):
+                offset = await write(encoder.encode(rows))
+                job.cursor = last_id
+                job.rows_written += len(rows)
+                job.bytes_written = offset
+                await db.commit()
+            offset = await write(encoder.close())
+
+            job.bytes_written = offset
+            job.status = "completed"
+            job.completed_at = datetime.utcnow()
+            await db.commit()
+
+            # the newest artifact replaces older ones for the same parameters
+            older = (await db.execute(
+                select(ExportJob).where(
+                    ExportJob.params_key == job.params_key, ExportJob.status == "completed", ExportJob.id != job.id
+                )
+            )).scalars().all()
+            for old in older:
+                await asyncio.to_thread(_remove, old.file_path)
+                old.status = "expired"
+            await db.commit()
+            print(f"Export job {job.id}: {job.rows_written} rows, {offset} bytes")
+
+
+export_pool = ExportWorkerPool()
+
+
+def init(app):
+    @app.post("/api/exports")
+    async def submit_export(req: ExportJobRequest):
+        fmt = req.format
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported export format: {fmt}")
+        if fmt == "parquet" and not parquet_available():
+            raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+
+        filters = _filters(req)
+        key = _params_key(filters, fmt, req.gzip)
+        version = await lead_cache.version_token()
+        async with AsyncSessionLocal() as db:
+            existing = (await db.execute(
+                select(ExportJob)
+                .where(ExportJob.params_key == key, ExportJob.status.in_(("queued", "running", "completed")))
+                .order_by(ExportJob.created_at.desc())
+            )).scalars().all()
+            for job in existing:
+                if job.status == "running" and job.id not in export_pool.running:
+                    # no checkpoint for STALE_AFTER means its worker is gone: take it over
+                    taken = await db.execute(
+                        update(ExportJob)
+                        .where(ExportJob.id == job.id, ExportJob.status == "running",
+                               ExportJob.updated_at < datetime.utcnow() - STALE_AFTER)
+                        .values(updated_at=func.now())
+                    )
+                    await db.commit()
+                    if taken.rowcount:
+                        export_pool.submit(job.id)
+                if job.status != "completed":
+                    return {**_job_dict(job), "reused": True}
+                if version is not None and job.data_version == version and os.path.exists(job.file_path or ""):
+                    return {**_job_dict(job), "reused": True}
+
+            job = ExportJob(format=fmt, gzip=req.gzip, filters=json.dumps(filters), params_key=key)
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+        export_pool.submit(job.id)
+        return {**_job_dict(job), "reused": False}
+
+    @app.get("/api/exports")
+    async def list_exports(limit: int = RECENT_JOBS_LIMIT):
+        async with AsyncSessionLocal() as db:
+            jobs = (await db.execute(
+                select(ExportJob).order_by(ExportJob.created_at.desc()).limit(min(limit, 100))
+            )).scalars().all()
+        return {"jobs": [_job_dict(j) for j in jobs], "queued": export_pool.queue.qsize()}
+
+    @app.get("/api/exports/{job_id}")
+    async def get_export(job_id: str):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ExportJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Export job not found")
+        return _job_dict(job)
+
+    @app.get("/api/exports/{job_id}/download")
+    async def download_export(job_id: str):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ExportJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Export job not found")
+        if job.status != "completed" or not os.path.exists(job.file_path or ""):
+            raise HTTPException(status_code=409, detail=f"Export is {job.status}")
+        stamp = (job.completed_at or datetime.utcnow()).strftime("%Y%m%d_%H%M%S")
+        return FileResponse(
+            job.file_path,
+            media_type=media_type(job.format, job.gzip),
+            filename=filename(job.format, job.gzip, stem=f"leads_{stamp}"),
+        )
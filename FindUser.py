@@ -12,57 +12,16 @@ from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import AsyncSessionLocal, CustomerBase
 from ClientModel import client, MODEL_NAME
+from RateLimit import limiter
+from SingleFlight import flight
+from EnrichmentCache import NS_CUSTOMER, enrichment_cache
+from CustomerIndex import customer_dict, customer_index
+from CustomerSearch import search_customers
 
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-CUSTOMER_CACHE_FILE = "customer_cache.json"
-
-class TTLCache:
-    def __init__(self, ttl_seconds: int = 3600):  # 1 hour TTL
-        self.cache: Dict[str, tuple[Optional[Dict[str, Any]] | List[Dict[str, Any]], float]] = {}
-        self.ttl = ttl_seconds
-        self._lock = asyncio.Lock()  # Thread-safe for concurrent access
-
-    async def get(self, key: str) -> Optional[Dict[str, Any]] | List[Dict[str, Any]]:
-        async with self._lock:
-            if key in self.cache:
-                value, timestamp = self.cache[key]
-                if time.time() - timestamp < self.ttl:
-                    return value
-                else:
-                    del self.cache[key]
-            return None
-
-    async def set(self, key: str, value: Optional[Dict[str, Any]] | List[Dict[str, Any]]):
-        async with self._lock:
-            self.cache[key] = (value, time.time())
-
-# Load persistent cache for customer lookups
-def load_persistent_cache() -> Dict[str, Dict[str, Any]]:
-    if os.path.exists(CUSTOMER_CACHE_FILE):
-        try:
-            with open(CUSTOMER_CACHE_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Warning: Failed to load cache: {e}")
-            return {}
-    return {}
-
-async def save_persistent_cache(cache: Dict[str, Dict[str, Any]]):
-    # Use a lock to prevent race conditions during concurrent writes
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, _sync_save_cache, cache)
-
-def _sync_save_cache(cache: Dict[str, Dict[str, Any]]):
-    try:
-        with open(CUSTOMER_CACHE_FILE, 'w') as f:
-            json.dump(cache, f, indent=2)
-    except IOError as e:
-        print(f"Warning: Failed to save cache: {e}")
-
-persistent_cache = load_persistent_cache()
-ttl_cache = TTLCache()
+customer_flight = flight("find_existing_customer")
 
 def get_cache_key(inputs: Dict[str, str]) -> str:
     key_str = ''.join([f"{k}:{v}" for k, v in sorted(inputs.items())])
@@ -80,27 +39,16 @@ async def retrieve_by_groupcode(groupcode: str) -> Optional[Dict[str, Any]]:
         customer = result.scalar_one_or_none()
         
         if customer:
-            customer_dict = {
-                "id": customer.id,
-                "created_at": customer.created_at.isoformat() if customer.created_at else None,
-                "company": customer.company,
-                "groupcode": customer.groupcode,
-                "email": customer.email,
-                "role": customer.role,
-                "categories": customer.categories,
-                "services": customer.services,
-                "activity": customer.activity,
-                "timeline": customer.timeline,
-                "budget": customer.budget,
-                "username": customer.username,
-                "mobile": customer.mobile
-            }
-            return customer_dict
+            return customer_dict(customer)
         return None
 
 async def retrieve_by_company(company: str) -> List[Dict[str, Any]]:
     """Retrieve customer details by company name. Returns list as company may not be unique."""
     async with AsyncSessionLocal() as db:
+        # trigram index, best matches first; ILIKE scan only where the index is unavailable
+        customers = await search_customers(db, company)
+        if customers is not None:
+            return [customer_dict(customer) for customer in customers]
         normalized_company = company.lower().strip()
         # Optimized: Add limit to prevent fetching too many results in high-scale scenarios
         # (e.g., broad searches); adjust limit as needed based on use case
@@ -110,26 +58,7 @@ async def retrieve_by_company(company: str) -> List[Dict[str, Any]]:
         result = await db.execute(stmt)
         customers = result.scalars().all()
         
-        customer_list = []
-        for customer in customers:
-            customer_dict = {
-                "id": customer.id,
-                "created_at": customer.created_at.isoformat() if customer.created_at else None,
-                "company": customer.company,
-                "groupcode": customer.groupcode,
-                "email": customer.email,
-                "role": customer.role,
-                "categories": customer.categories,
-                "services": customer.services,
-                "activity": customer.activity,
-                "timeline": customer.timeline,
-                "budget": customer.budget,
-                "username": customer.username,
-                "mobile": customer.mobile
-            }
-            customer_list.append(customer_dict)
-        
-        return customer_list
+        return [customer_dict(customer) for customer in customers]
 
 # Tool definitions for OpenAI function calling
 TOOLS = [
@@ -185,22 +114,23 @@ async def execute_tool_call(tool_call):
     return None
 
 async def find_existing_customer(input_identifier: str) -> Tuple[Optional[Dict[str, Any]] | List[Dict[str, Any]], str]:
+    # exact / near matches and obvious non-matches are answered by the in-memory index;
+    # only input it cannot classify goes to the LLM
+    local = await customer_index.lookup(input_identifier)
+    if local is not None:
+        return local
+
     inputs = {"input": input_identifier.lower().strip()}
     cache_key = get_cache_key(inputs)
 
-    ttl_result = await ttl_cache.get(cache_key)
-    if ttl_result is not None:
-        return ttl_result, "cached"
+    # "no such customer" is cached too, so the entry wraps the result
+    cached = await enrichment_cache.get(NS_CUSTOMER, cache_key)
+    if cached is not None:
+        return cached["result"], "cached"
+    return await customer_flight.do(cache_key, lambda: _classify_and_lookup(input_identifier, cache_key))
 
-    # Check persistent cache (sync read is fine as it's loaded once, but for scale, we could use a shared dict with lock)
-    persistent_lock = asyncio.Lock()
-    async with persistent_lock:
-        persistent_data = persistent_cache.get(cache_key, {})
-    if persistent_data:
-        result = persistent_data['result']
-        await ttl_cache.set(cache_key, result)
-        return result, "cached"
 
+async def _classify_and_lookup(input_identifier: str, cache_key: str) -> Tuple[Optional[Dict[str, Any]] | List[Dict[str, Any]], str]:
     prompt = f"""You are a customer lookup assistant. Analyze the user input and decide how to retrieve the customer details.
 
 - If the input looks like a GROUP CODE (short alphanumeric code like 'ABC123', 'GRP-456', typically 3-10 characters, no spaces or common words), call the 'lookup_by_groupcode' tool with the groupcode as the parameter.
@@ -213,13 +143,14 @@ Remember: Call exactly one tool if it matches, or none if it doesn't."""
 
     try:
         # Parallelize if needed in future, but single call here; async OpenAI handles concurrency
-        response = await client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            tools=TOOLS,
-            tool_choice="auto",
-            temperature=0.0,
-        )
+        async with limiter("openai"):
+            response = await client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                tools=TOOLS,
+                tool_choice="auto",
+                temperature=0.0,
+            )
         
         result = None
         classification = "none"
@@ -236,16 +167,7 @@ Remember: Call exactly one tool if it matches, or none if it doesn't."""
             result = None
             classification = "none"
         
-        await ttl_cache.set(cache_key, result)
-        
-        # Update persistent cache with lock for concurrent writes
-        async with persistent_lock:
-            persistent_cache[cache_key] = {
-                'result': result,
-                'classification': classification,
-                'timestamp': time.time()
-            }
-        await save_persistent_cache(persistent_cache)
+        await enrichment_cache.set(NS_CUSTOMER, cache_key, {"result": result, "classification": classification})
 
         return result, classification
         
@@ -0,0 +1,107 @@
+import importlib.util
+import os
+from typing import Any, Dict
+import httpx
+from dotenv import load_dotenv
+from Config import HTTP_KEEPALIVE_EXPIRY, HTTPX_MAX_CONNECTIONS, UPSTREAM_TIMEOUT
+
+load_dotenv()
+
+# One pooled httpx client per upstream, shared by every caller (including the OpenAI /
+# Perplexity SDK clients, which take it as http_client). Connections are kept alive for
+# HTTP_KEEPALIVE_EXPIRY, so repeat calls skip the TCP + TLS handshake and the DNS lookup;
+# HTTP/2 is used where the h2 package is installed.
+#
+# Clients are created on first use (SDK clients are built at import time) or by start(),
+# and closed by close() on shutdown. Per-upstream request / new-connection counts come
+# from httpcore trace events, which only report a connect when the pool had nothing to reuse.
+UPSTREAMS: Dict[str, Dict[str, Any]] = {
+    # name -> client settings
+    "openai": {"timeout": 60.0, "max_connections": 100, "max_keepalive": 20},
+    "perplexity": {
+        "base_url": "https://api.perplexity.ai",
+        "headers": {"Authorization": f"Bearer {os.getenv('PERPLEXITY_API_KEY')}", "Content-Type": "application/json"},
+        "timeout": 30.0, "max_connections": 100, "max_keepalive": 20,
+    },
+    "searchapi": {"base_url": "https://www.searchapi.io", "timeout": 30.0, "max_connections": 20, "max_keepalive": 10},
+    "email": {"timeout": UPSTREAM_TIMEOUT, "max_connections": HTTPX_MAX_CONNECTIONS,
+              "max_keepalive": HTTPX_MAX_CONNECTIONS},
+}
+CONNECT_TIMEOUT = 10.0
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpClientRegistry:
+    def __init__(self, upstreams: Dict[str, Dict[str, Any]] = UPSTREAMS):
+        self.upstreams = upstreams
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.metrics: Dict[str, Dict[str, int]] = {
+            name: {"requests": 0, "connections": 0, "errors": 0} for name in upstreams
+        }
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        conf = self.upstreams[name]
+        counts = self.metrics[name]
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            if event == "connection.connect_tcp.complete":
+                counts["connections"] += 1
+            elif event.endswith("send_request_headers.started"):
+                counts["requests"] += 1
+            elif event in ("connection.connect_tcp.failed", "http11.receive_response_headers.failed",
+                           "http2.receive_response_headers.failed"):
+                counts["errors"] += 1
+
+        async def on_request(request: httpx.Request) -> None:
+            request.extensions["trace"] = trace
+
+        return httpx.AsyncClient(
+            base_url=conf.get("base_url", ""),
+            headers=conf.get("headers"),
+            http2=http2_available(),
+            timeout=httpx.Timeout(conf["timeout"], connect=min(CONNECT_TIMEOUT, conf["timeout"])),
+            limits=httpx.Limits(
+                max_connections=conf["max_connections"],
+                max_keepalive_connections=conf["max_keepalive"],
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [on_request]},
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self.clients.get(name)
+        if client is None or client.is_closed:
+            client = self.clients[name] = self._build(name)
+        return client
+
+    def start(self) -> None:
+        for name in self.upstreams:
+            self.get(name)
+
+    async def close(self) -> None:
+        for client in self.clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"http2": http2_available()}
+        for name, m in self.metrics.items():
+            reused = max(m["requests"] - m["connections"], 0)
+            result[name] = {
+                **m,
+                "reused": reused,
+                "reuse_rate": round(reused / m["requests"], 4) if m["requests"] else None,
+                "open": name in self.clients and not self.clients[name].is_closed,
+            }
+        return result
+
+
+http_clients = HttpClientRegistry()
+
+
+def init(app):
+    @app.get("/api/http/stats")
+    async def http_client_stats() -> Dict[str, Any]:
+        return http_clients.stats()
@@ -0,0 +1,236 @@
+import json
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from cachetools import TTLCache
+from fastapi.encoders import jsonable_encoder
+from Config import LEAD_CACHE_MAXSIZE, LEAD_CACHE_REDIS_URL, LEAD_CACHE_TTL
+
+# Tag-versioned cache for the lead / session list pages.
+#
+# Every entry records the version of each tag it depends on when it was stored; writers
+# bump tag versions instead of deleting keys, so a read is a hit only if none of its tags
+# moved. The same scheme works in-process and in Redis (HINCRBY on one hash), which lets
+# several workers share entries and invalidations.
+#
+# Tags:
+#   session:<id>   - a displayed row changed (messages, lead fields, enrichment, approval)
+#   new_session    - a session was created (joins unapproved lists)
+#   approved       - approval flags changed (membership of approved lists)
+#   status         - a session changed status (active filter, status column)
+#   search         - searchable fields changed (lists filtered by q)
+#   interest:<v>   - a session moved into / out of interest v
+TAG_NEW_SESSION = "new_session"
+TAG_APPROVED = "approved"
+TAG_STATUS = "status"
+TAG_SEARCH = "search"
+_DATA_TAG = "__data__"  # bumped by every invalidation
+
+
+def session_tag(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def interest_tag(interest: Optional[str]) -> str:
+    return f"interest:{(interest or '').lower()}"
+
+
+def list_tags(q: Optional[str] = None, interest: Optional[str] = None, approved: bool = False) -> List[str]:
+    """Tags whose changes can alter which sessions a filtered list contains.
+
+    TAG_STATUS is always included: rows show the status and it drives the active filter.
+    """
+    tags = [TAG_STATUS, TAG_APPROVED if approved else TAG_NEW_SESSION]
+    if q:
+        tags.append(TAG_SEARCH)
+    if interest:
+        tags.append(interest_tag(interest))
+    return tags
+
+
+class _LocalBackend:
+    name = "local"
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.versions: Dict[str, int] = {}
+
+    async def get_entry(self, key: str) -> Optional[Tuple[Any, Dict[str, int]]]:
+        return self.entries.get(key)
+
+    async def set_entry(self, key: str, value: Any, versions: Dict[str, int]) -> None:
+        self.entries[key] = (value, versions)
+
+    async def delete_entry(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+    async def get_versions(self, tags: List[str]) -> List[int]:
+        return [self.versions.get(t, 0) for t in tags]
+
+    async def bump(self, tags: List[str]) -> None:
+        for t in tags:
+            self.versions[t] = self.versions.get(t, 0) + 1
+
+    async def clear(self) -> None:
+        self.entries.clear()
+        await self.bump([_DATA_TAG])
+
+    def size(self) -> int:
+        return len(self.entries)
+
+    async def close(self) -> None:
+        pass
+
+
+class _RedisBackend:
+    name = "redis"
+
+    def __init__(self, url: str, ttl: int, namespace: str):
+        import redis.asyncio as aioredis
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.entry_prefix = f"{namespace}:entry:"
+        self.tags_key = f"{namespace}:tags"
+
+    async def get_entry(self, key: str) -> Optional[Tuple[Any, Dict[str, int]]]:
+        raw = await self.redis.get(self.entry_prefix + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return data["value"], data["versions"]
+
+    async def set_entry(self, key: str, value: Any, versions: Dict[str, int]) -> None:
+        payload = json.dumps({"value": value, "versions": versions})
+        await self.redis.set(self.entry_prefix + key, payload, ex=self.ttl)
+
+    async def delete_entry(self, key: str) -> None:
+        await self.redis.delete(self.entry_prefix + key)
+
+    async def get_versions(self, tags: List[str]) -> List[int]:
+        if not tags:
+            return []
+        values = await self.redis.hmget(self.tags_key, tags)
+        return [int(v or 0) for v in values]
+
+    async def bump(self, tags: List[str]) -> None:
+        pipe = self.redis.pipeline()
+        for t in tags:
+            pipe.hincrby(self.tags_key, t, 1)
+        await pipe.execute()
+
+    async def clear(self) -> None:
+        # every list / count entry carries TAG_STATUS, so bumping it retires them all
+        await self.bump([_DATA_TAG, TAG_STATUS])
+
+    def size(self) -> int:
+        return -1
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+class TaggedCache:
+    def __init__(self, maxsize: int = LEAD_CACHE_MAXSIZE, ttl: int = LEAD_CACHE_TTL,
+                 redis_url: Optional[str] = LEAD_CACHE_REDIS_URL, namespace: str = "leadcache"):
+        self.backend = _LocalBackend(maxsize, ttl)
+        if redis_url:
+            try:
+                self.backend = _RedisBackend(redis_url, ttl, namespace)
+            except Exception as e:
+                print(f"Lead cache: Redis unavailable ({e}); using in-process cache")
+        self.metrics = {"hits": 0, "misses": 0, "stale": 0, "sets": 0, "skipped_sets": 0,
+                        "invalidations": 0, "errors": 0}
+        self.invalidations_by_tag: Dict[str, int] = {}
+        self.started_at = time.time()
+        self.boot_id = uuid.uuid4().hex[:12]
+
+    async def data_version(self) -> int:
+        """Changes whenever anything cached might have; take it before computing a value."""
+        try:
+            return (await self.backend.get_versions([_DATA_TAG]))[0]
+        except Exception:
+            self.metrics["errors"] += 1
+            return -1
+
+    async def version_token(self) -> Optional[str]:
+        """``data_version`` that is also safe to persist: in-process versions restart at 0."""
+        version = await self.data_version()
+        if version < 0:
+            return None
+        if self.backend.name == "local":
+            return f"local:{self.boot_id}:{version}"
+        return f"{self.backend.name}:{version}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            entry = await self.backend.get_entry(key)
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            value, versions = entry
+            tags = list(versions)
+            if await self.backend.get_versions(tags) != [versions[t] for t in tags]:
+                self.metrics["stale"] += 1
+                self.metrics["misses"] += 1
+                await self.backend.delete_entry(key)
+                return None
+            self.metrics["hits"] += 1
+            return value
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"Lead cache get failed: {e}")
+            return None
+
+    async def set(self, key: str, value: Any, tags: Iterable[str], data_version: int) -> None:
+        """Store ``value`` unless something was invalidated since ``data_version`` was read."""
+        try:
+            tags = list(dict.fromkeys(tags))
+            current = await self.backend.get_versions([_DATA_TAG] + tags)
+            if data_version < 0 or current[0] != data_version:
+                self.metrics["skipped_sets"] += 1
+                return
+            await self.backend.set_entry(key, jsonable_encoder(value), dict(zip(tags, current[1:])))
+            self.metrics["sets"] += 1
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"Lead cache set failed: {e}")
+
+    async def invalidate(self, *tags: str) -> None:
+        tags = [t for t in dict.fromkeys(tags) if t]
+        if not tags:
+            return
+        try:
+            await self.backend.bump(tags + [_DATA_TAG])
+            self.metrics["invalidations"] += 1
+            for t in tags:
+                prefix = t.split(":", 1)[0]
+                self.invalidations_by_tag[prefix] = self.invalidations_by_tag.get(prefix, 0) + 1
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"Lead cache invalidate failed: {e}")
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+        self.invalidations_by_tag["clear"] = self.invalidations_by_tag.get("clear", 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.size(),
+            **self.metrics,
+            "hit_rate": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+            "invalidations_by_tag": dict(self.invalidations_by_tag),
+            "uptime_seconds": int(time.time() - self.started_at),
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+lead_cache = TaggedCache()
+
+
+async def invalidate_session(session_id: str, *tags: str) -> None:
+    """Shortcut for writers: the session's rows plus any membership tags they touched."""
+    await lead_cache.invalidate(session_tag(session_id), *tags)
@@ -0,0 +1,217 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.sql import Select
+from database import AsyncSessionLocal, CompanyDetails, Session as SessionModel, SessionPhase, VerificationDetails
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet export is optional
+    pa = None
+    pq = None
+
+EXPORT_BATCH_SIZE = 5000
+
+# header -> column; one joined row per session including enrichment and verification
+EXPORT_COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ("id", SessionModel.id),
+    ("created_at", SessionModel.created_at),
+    ("name", SessionModel.username),
+    ("phone", SessionModel.mobile),
+    ("email", SessionPhase.q1_email),
+    ("email_domain", SessionPhase.q1_email_domain),
+    ("company", SessionPhase.q1_company),
+    ("role", SessionPhase.q2_role),
+    ("categories", SessionPhase.q3_categories),
+    ("services", SessionPhase.q4_services),
+    ("activity", SessionPhase.q5_activity),
+    ("timeline", SessionPhase.q6_timeline),
+    ("budget", SessionPhase.q7_budget),
+    ("phase", SessionPhase.phase),
+    ("interest", SessionModel.interest),
+    ("lead_interest", SessionModel.lead_interest),
+    ("mood", func.coalesce(SessionModel.lead_mood, SessionModel.mood)),
+    ("status", SessionModel.status),
+    ("approved", SessionModel.approved),
+    ("verified", VerificationDetails.verified),
+    ("confidence", VerificationDetails.confidence),
+    ("evidence", VerificationDetails.evidence),
+    ("verification_sources", VerificationDetails.v_sources),
+    ("company_info", CompanyDetails.c_info),
+    ("company_data", CompanyDetails.c_data),
+    ("company_sources", CompanyDetails.c_sources),
+    ("company_images", CompanyDetails.c_images),
+)
+EXPORT_HEADERS: List[str] = [h for h, _ in EXPORT_COLUMNS]
+
+FORMATS = {
+    # format -> (media type, file extension)
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+def export_select() -> Select:
+    """All export columns, outer-joined; callers add the list filters."""
+    return (
+        select(*(col.label(h) for h, col in EXPORT_COLUMNS))
+        .select_from(SessionModel)
+        .outerjoin(SessionPhase, SessionPhase.session_id == SessionModel.id)
+        .outerjoin(CompanyDetails, CompanyDetails.session_id == SessionModel.id)
+        .outerjoin(VerificationDetails, VerificationDetails.session_id == SessionModel.id)
+    )
+
+
+def media_type(fmt: str, gzip: bool) -> str:
+    return "application/gzip" if gzip else FORMATS[fmt][0]
+
+
+def filename(fmt: str, gzip: bool, stem: str = "leads") -> str:
+    return f"{stem}.{FORMATS[fmt][1]}" + (".gz" if gzip else "")
+
+
+async def iter_batches(stmt: Select, batch_size: int = EXPORT_BATCH_SIZE,
+                       after_id: Optional[str] = None) -> AsyncIterator[Tuple[Sequence[Any], str]]:
+    """Keyset scan over ``stmt`` in primary-key order: yields ``(rows, last_id)`` per batch.
+
+    Each batch runs in its own short session, so no connection or cursor is held while
+    the consumer writes; ``last_id`` can be used to resume the scan later.
+    """
+    while True:
+        page = stmt.order_by(SessionModel.id).limit(batch_size)
+        if after_id is not None:
+            page = page.where(SessionModel.id > after_id)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(page)).all()
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        yield rows, after_id
+        if len(rows) < batch_size:
+            return
+
+
+def _text(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class _CsvEncoder:
+    def __init__(self, header: bool = True):
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf)
+        self.header = header
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        if self.header:
+            self.writer.writerow(EXPORT_HEADERS)
+            self.header = False
+        self.writer.writerows([[_text(v) for v in row] for row in rows])
+        data = self.buf.getvalue().encode("utf-8")
+        self.buf.seek(0)
+        self.buf.truncate(0)
+        return data
+
+    def close(self) -> bytes:
+        return b""
+
+
+class _NdjsonEncoder:
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        lines = [json.dumps(dict(zip(EXPORT_HEADERS, row)), default=_text, ensure_ascii=False) for row in rows]
+        return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+    def close(self) -> bytes:
+        return b""
+
+
+class _ParquetEncoder:
+    """One row group per batch; the footer is emitted by ``close``."""
+
+    def __init__(self):
+        self.sink = io.BytesIO()
+        self.writer = None
+        self.schema = None
+
+    def _drain(self) -> bytes:
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate(0)
+        return data
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        columns = {h: [row[i] for row in rows] for i, h in enumerate(EXPORT_HEADERS)}
+        if self.writer is None:
+            table = pa.table(columns)
+            # null-only columns in the first batch would otherwise be typed as null
+            self.schema = pa.schema([
+                pa.field(f.name, pa.string() if pa.types.is_null(f.type) else f.type) for f in table.schema
+            ])
+            self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+        table = pa.table(columns, schema=self.schema)
+        self.writer.write_table(table)
+        return self._drain()
+
+    def close(self) -> bytes:
+        if self.writer is not None:
+            self.writer.close()
+        return self._drain()
+
+
+def make_encoder(fmt: str, header: bool = True):
+    """Batch encoder for ``fmt``: ``encode(rows) -> bytes`` per batch, ``close() -> bytes`` at the end."""
+    if fmt == "csv":
+        return _CsvEncoder(header)
+    if fmt == "ndjson":
+        return _NdjsonEncoder()
+    if fmt == "parquet":
+        if not parquet_available():
+            raise RuntimeError("parquet export requires pyarrow")
+        return _ParquetEncoder()
+    raise ValueError(f"unknown export format: {fmt}")
+
+
+class _Gzip:
+    def __init__(self):
+        self.z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 -> gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self.z.compress(data) if data else b""
+
+    def close(self) -> bytes:
+        return self.z.flush()
+
+
+async def export_stream(stmt: Select, fmt: str = "csv", gzip: bool = False,
+                        batch_size: int = EXPORT_BATCH_SIZE, after_id: Optional[str] = None,
+                        on_batch: Optional[Callable[[int, str], Any]] = None) -> AsyncIterator[bytes]:
+    """Encoded chunks (one per batch) of ``stmt`` rows; memory stays at one batch.
+
+    ``on_batch(rows_in_batch, last_id)`` is called after each batch is encoded.
+    """
+    encoder = make_encoder(fmt)
+    zipper = _Gzip() if gzip else None
+    async for rows, last_id in iter_batches(stmt, batch_size, after_id):
+        chunk = encoder.encode(rows)
+        if zipper:
+            chunk = zipper.compress(chunk)
+        if chunk:
+            yield chunk
+        if on_batch is not None:
+            result = on_batch(len(rows), last_id)
+            if hasattr(result, "__await__"):
+                await result
+    tail = encoder.close()
+    if zipper:
+        tail = zipper.compress(tail) + zipper.close()
+    if tail:
+        yield tail
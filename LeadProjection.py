@@ -0,0 +1,177 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.sql import Select
+from LeadSearch import search_enabled, search_subquery
+from SessionUtils import active_session_clause, effective_status
+from database import CompanyDetails, Session as SessionModel, SessionPhase, VerificationDetails
+
+# Output key -> column for the session / lead list rows. Resolved once at import; rows come
+# back as flat tuples from one joined SELECT, so serializing is a zip per row with no
+# per-field relationship probing.
+_OUTPUT_COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ("id", SessionModel.id),
+    ("created_at", SessionModel.created_at),
+    ("approved", SessionModel.approved),
+    ("name", SessionModel.username),
+    ("usr_phone", SessionModel.mobile),
+
+    ("verified", VerificationDetails.verified),
+    ("confidence", VerificationDetails.confidence),
+
+    ("phase", SessionPhase.phase),
+    ("routing", SessionPhase.routing),
+    ("lead_company", SessionPhase.q1_company),
+    ("lead_email", SessionPhase.q1_email),
+    ("lead_email_domain", SessionPhase.q1_email_domain),
+    ("lead_role", SessionPhase.q2_role),
+    ("lead_categories", SessionPhase.q3_categories),
+    ("lead_services", SessionPhase.q4_services),
+    ("lead_activity", SessionPhase.q5_activity),
+    ("lead_timeline", SessionPhase.q6_timeline),
+    ("lead_budget", SessionPhase.q7_budget),
+)
+
+# heavy verification / research fields (c_info alone is often several KB) are left out of
+# the list rows and served per session by GET /api/leads/{session_id}
+_DETAIL_COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ("evidence", VerificationDetails.evidence),
+    ("sources", VerificationDetails.v_sources),
+    ("c_sources", CompanyDetails.c_sources),
+    ("c_info", CompanyDetails.c_info),
+    ("c_data", CompanyDetails.c_data),
+    ("c_images", CompanyDetails.c_images),
+)
+
+# selected after the output columns and only used to derive status / interest / mood
+_INTERNAL_COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ("_status", SessionModel.status),
+    ("_updated_at", SessionModel.updated_at),
+    ("_interest", SessionModel.interest),
+    ("_lead_interest", SessionModel.lead_interest),
+    ("_mood", SessionModel.mood),
+    ("_lead_mood", SessionModel.lead_mood),
+)
+
+OUTPUT_KEYS: Tuple[str, ...] = tuple(key for key, _ in _OUTPUT_COLUMNS)
+DETAIL_KEYS: Tuple[str, ...] = tuple(key for key, _ in _DETAIL_COLUMNS)
+_SELECT_COLUMNS = tuple(col.label(key) for key, col in _OUTPUT_COLUMNS + _INTERNAL_COLUMNS)
+_DETAIL_SELECT_COLUMNS = tuple(col.label(key) for key, col in _DETAIL_COLUMNS)
+_N_OUT = len(_OUTPUT_COLUMNS)
+_N_INTERNAL = len(_INTERNAL_COLUMNS)
+
+
+def projected_select() -> Select:
+    """One lean row per session with its phase / verification columns outer-joined."""
+    return (
+        select(*_SELECT_COLUMNS)
+        .select_from(SessionModel)
+        .outerjoin(SessionPhase, SessionPhase.session_id == SessionModel.id)
+        .outerjoin(VerificationDetails, VerificationDetails.session_id == SessionModel.id)
+    )
+
+
+def detail_select(session_id: str) -> Select:
+    """``projected_select()`` for one session plus the heavy detail columns."""
+    return (
+        projected_select()
+        .add_columns(*_DETAIL_SELECT_COLUMNS)
+        .outerjoin(CompanyDetails, CompanyDetails.session_id == SessionModel.id)
+        .where(SessionModel.id == session_id)
+    )
+
+
+def apply_lead_filters(stmt: Select, q: Optional[str], interest: Optional[str], approved: bool,
+                       active: bool) -> Tuple[Select, Any]:
+    """Lead list filters on a statement that already joins session_phase; also returns the search rank."""
+    if active:
+        stmt = stmt.where(active_session_clause())
+    if approved:
+        stmt = stmt.where(SessionModel.approved.is_(True))
+
+    rank = None
+    hits = search_subquery(q) if q and search_enabled() else None
+    if hits is not None:
+        stmt = stmt.join(hits, hits.c.session_id == SessionModel.id)
+        rank = hits.c.rank
+    elif q:
+        search_term = f"%{q}%"
+        stmt = stmt.where(
+            or_(
+                SessionModel.username.ilike(search_term),
+                SessionPhase.q1_email.ilike(search_term),
+                SessionPhase.q1_company.ilike(search_term),
+            )
+        )
+
+    if interest:
+        stmt = stmt.where(SessionModel.interest == interest.lower())
+    return stmt, rank
+
+
+def paginate(stmt: Select, page: int, per_page: int, cursor: Optional[Tuple[Optional[datetime], str]],
+             rank=None) -> Select:
+    """Newest-first order on (created_at, id), rows without created_at last; keyset when a
+    cursor is given, else OFFSET.
+
+    A dated cursor seeks the dated rows only (NULL never compares); once they run out,
+    the list endpoints hand out a cursor onto the undated tail. Search results are
+    ordered by ``rank`` first, which only supports page numbers.
+    """
+    newest_first = (SessionModel.created_at.desc().nulls_last(), SessionModel.id.desc())
+    if rank is not None:
+        stmt = stmt.order_by(rank, *newest_first).limit(per_page)
+        return stmt.offset((page - 1) * per_page)
+    stmt = stmt.order_by(*newest_first).limit(per_page)
+    if cursor is not None:
+        created_at, session_id = cursor
+        if created_at is not None:
+            return stmt.where(tuple_(SessionModel.created_at, SessionModel.id) < tuple_(created_at, session_id))
+        stmt = stmt.where(SessionModel.created_at.is_(None))
+        return stmt.where(SessionModel.id < session_id) if session_id else stmt
+    return stmt.offset((page - 1) * per_page)
+
+
+def _finish_session(rec: Dict[str, Any], internal: Sequence[Any]) -> None:
+    status, updated_at, interest, lead_interest, mood, lead_mood = internal
+    rec["status"] = effective_status(status, updated_at)
+    rec["interest"] = lead_interest or interest or "low"
+    rec["mood"] = lead_mood or mood or "neutral"
+
+
+def _finish_lead(rec: Dict[str, Any], internal: Sequence[Any]) -> None:
+    status, updated_at, interest, lead_interest, mood, lead_mood = internal
+    rec["status"] = effective_status(status, updated_at)
+    # the lead filters match on sessions.interest, so show the same value; mood stays the
+    # session's own label too (the lead view weighted user-message moods, which are never set)
+    rec["interest"] = interest or "medium"
+    rec["mood"] = mood or ""
+    rec["lead_company"] = rec["lead_company"] or "-"
+    rec["lead_services"] = rec["lead_services"] or "-"
+    created_at = rec["created_at"]
+    rec["date_str"] = created_at.strftime("%b %d, %Y") if created_at else ""
+
+
+_VIEWS: Dict[str, Callable[[Dict[str, Any], Sequence[Any]], None]] = {
+    "sessions": _finish_session,
+    "leads": _finish_lead,
+}
+
+
+def serialize_rows(rows: Sequence[Any], last_messages: Dict[str, str], view: str) -> List[Dict[str, Any]]:
+    """Turn ``projected_select()`` rows into the list payload for ``view`` ("sessions" / "leads")."""
+    finish = _VIEWS[view]
+    out = []
+    for row in rows:
+        rec = dict(zip(OUTPUT_KEYS, row))
+        finish(rec, row[_N_OUT:_N_OUT + _N_INTERNAL])
+        rec["last_message"] = last_messages.get(rec["id"], "")
+        out.append(rec)
+    return out
+
+
+def serialize_detail(row: Sequence[Any], last_message: str, view: str = "leads") -> Dict[str, Any]:
+    """Full record for one ``detail_select()`` row: the list fields plus the detail fields."""
+    rec = serialize_rows([row], {row[0]: last_message}, view)[0]
+    rec.update(zip(DETAIL_KEYS, row[_N_OUT + _N_INTERNAL:]))
+    return rec
@@ -0,0 +1,162 @@
+import json
+import math
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from sqlalchemy import and_, exists, func, or_, select
+from database import AsyncSessionLocal, Session as SessionModel, Message as MessageModel
+
+# Interest / mood are exponentially decayed towards the newest message. The sums are
+# stored relative to ``score_anchor_at``; moving the anchor forward only rescales them
+# by one factor, so each new message is O(1). The labels are ratios / argmax of the
+# sums and do not depend on where the anchor sits.
+HALF_LIFE_SECONDS = 3 * 24 * 3600
+_LN2 = math.log(2)
+
+INTEREST_SCORE = {"low": 0.0, "medium": 1.0, "high": 2.0}
+LOW_DOMINANCE_THRESHOLD = 0.5
+HIGH_DOMINANCE_THRESHOLD = 0.66
+
+BACKFILL_BATCH_SIZE = 200
+
+
+def _naive(ts: Optional[datetime]) -> datetime:
+    ts = ts or datetime.utcnow()
+    return ts.replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def _decay(seconds: float) -> float:
+    return math.exp(-_LN2 * (seconds / HALF_LIFE_SECONDS))
+
+
+def score_to_interest(score: float) -> str:
+    return "low" if score < 0.5 else ("medium" if score < 1.5 else "high")
+
+
+def _derive_interest(sess: SessionModel) -> Optional[str]:
+    bot_count = sess.bot_message_count or 0
+    if bot_count:
+        if sess.last_bot_interest == "low":
+            return "low"
+        if (sess.bot_low_count or 0) / bot_count >= LOW_DOMINANCE_THRESHOLD:
+            return "low"
+        if (sess.bot_high_count or 0) / bot_count >= HIGH_DOMINANCE_THRESHOLD:
+            return "high"
+    if sess.interest_weight_total:
+        return score_to_interest(sess.interest_weighted_sum / sess.interest_weight_total)
+    return None
+
+
+def _derive_mood(mood_weights: Dict[str, float]) -> Optional[str]:
+    if not mood_weights:
+        return None
+    return max(mood_weights.items(), key=lambda kv: kv[1])[0]
+
+
+def apply_message_score(sess: SessionModel, role: Optional[str], interest: Optional[str],
+                        mood: Optional[str], ts: Optional[datetime]) -> None:
+    """Fold one message into the stored decayed scores and refresh lead_interest / lead_mood."""
+    role = (role or "").lower()
+    interest = (interest or "").lower()
+    mood = (mood or "").lower()
+    if interest not in INTEREST_SCORE and role != "bot":
+        return
+
+    ts = _naive(ts)
+    mood_weights = json.loads(sess.mood_weights) if sess.mood_weights else {}
+    anchor = _naive(sess.score_anchor_at) if sess.score_anchor_at else None
+
+    if anchor is None or ts >= anchor:
+        # move the anchor forward: older contributions decay by one factor
+        factor = _decay((ts - anchor).total_seconds()) if anchor else 1.0
+        sess.interest_weighted_sum = (sess.interest_weighted_sum or 0.0) * factor
+        sess.interest_weight_total = (sess.interest_weight_total or 0.0) * factor
+        mood_weights = {k: v * factor for k, v in mood_weights.items()}
+        sess.score_anchor_at = ts
+        weight = 1.0
+    else:
+        # late arrival: weigh it against the current anchor
+        weight = _decay((anchor - ts).total_seconds())
+
+    if interest in INTEREST_SCORE:
+        sess.interest_weighted_sum = (sess.interest_weighted_sum or 0.0) + INTEREST_SCORE[interest] * weight
+        sess.interest_weight_total = (sess.interest_weight_total or 0.0) + weight
+
+    if role == "bot":
+        sess.bot_message_count = (sess.bot_message_count or 0) + 1
+        if interest == "low":
+            sess.bot_low_count = (sess.bot_low_count or 0) + 1
+        elif interest == "high":
+            sess.bot_high_count = (sess.bot_high_count or 0) + 1
+        if sess.last_bot_at is None or ts > _naive(sess.last_bot_at):
+            sess.last_bot_at = ts
+            sess.last_bot_interest = interest or None
+        if mood:
+            mood_weights[mood] = mood_weights.get(mood, 0.0) + weight
+
+    sess.mood_weights = json.dumps(mood_weights) if mood_weights else None
+    sess.lead_interest = _derive_interest(sess)
+    sess.lead_mood = _derive_mood(mood_weights)
+
+
+def reset_scores(sess: SessionModel) -> None:
+    sess.interest_weighted_sum = 0.0
+    sess.interest_weight_total = 0.0
+    sess.score_anchor_at = None
+    sess.mood_weights = None
+    sess.bot_message_count = 0
+    sess.bot_low_count = 0
+    sess.bot_high_count = 0
+    sess.last_bot_interest = None
+    sess.last_bot_at = None
+    sess.lead_interest = None
+    sess.lead_mood = None
+
+
+async def backfill_lead_scores(batch_size: int = BACKFILL_BATCH_SIZE,
+                               progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> int:
+    """Replay stored messages for sessions scored before the columns existed.
+
+    Also picks up sessions that got new messages before the backfill reached them (their
+    stored bot count is short of the real one); those are reset and replayed in full.
+    Commits per batch; ``progress(done, total)`` is awaited after each one.
+    """
+    scored = exists().where(MessageModel.session_id == SessionModel.id, MessageModel.interest.isnot(None))
+    bot_messages = (
+        select(func.count(MessageModel.id))
+        .where(MessageModel.session_id == SessionModel.id, func.lower(MessageModel.role) == "bot")
+        .scalar_subquery()
+    )
+    pending = (or_(and_(SessionModel.score_anchor_at.is_(None), scored),
+                   SessionModel.bot_message_count < bot_messages),)
+    updated = 0
+    last_id = ""
+    async with AsyncSessionLocal() as db:
+        total = (await db.execute(select(func.count(SessionModel.id)).where(*pending))).scalar() or 0
+        while True:
+            sessions = (await db.execute(
+                select(SessionModel)
+                .where(SessionModel.id > last_id, *pending)
+                .order_by(SessionModel.id)
+                .limit(batch_size)
+            )).scalars().all()
+            if not sessions:
+                break
+            by_id = {s.id: s for s in sessions}
+            for sess in sessions:
+                reset_scores(sess)
+            msg_rows = await db.execute(
+                select(MessageModel.session_id, MessageModel.role, MessageModel.interest,
+                       MessageModel.mood, MessageModel.timestamp)
+                .where(MessageModel.session_id.in_(by_id))
+                .order_by(MessageModel.session_id, MessageModel.timestamp.asc(), MessageModel.id.asc())
+            )
+            for session_id, role, interest, mood, ts in msg_rows:
+                apply_message_score(by_id[session_id], role, interest, mood, ts)
+            updated += len(sessions)
+            last_id = sessions[-1].id
+            await db.commit()
+            if progress is not None:
+                await progress(updated, max(total, updated))
+    if updated:
+        print(f"Backfilled lead scores for {updated} sessions")
+    return updated
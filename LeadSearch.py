@@ -0,0 +1,217 @@
+import re
+import sys
+import time
+from typing import Optional
+from sqlalchemy import Float, String, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Subquery
+from database import engine, writer_engine
+
+# One document per session, kept in lead_search_docs and mirrored into the
+# full-text index (SQLite FTS5 external content / Postgres tsvector + trigram).
+_DIALECT = engine.dialect.name
+
+_SQLITE_DDL = [
+    """CREATE TABLE IF NOT EXISTS lead_search_docs (
+        docid INTEGER PRIMARY KEY,
+        session_id VARCHAR NOT NULL UNIQUE,
+        name TEXT, email TEXT, company TEXT, services TEXT, summary TEXT
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS lead_search USING fts5(
+        name, email, company, services, summary,
+        content='lead_search_docs', content_rowid='docid',
+        tokenize='unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS lead_search_ai AFTER INSERT ON lead_search_docs BEGIN
+        INSERT INTO lead_search(rowid, name, email, company, services, summary)
+        VALUES (new.docid, new.name, new.email, new.company, new.services, new.summary);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lead_search_ad AFTER DELETE ON lead_search_docs BEGIN
+        INSERT INTO lead_search(lead_search, rowid, name, email, company, services, summary)
+        VALUES ('delete', old.docid, old.name, old.email, old.company, old.services, old.summary);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lead_search_au AFTER UPDATE ON lead_search_docs BEGIN
+        INSERT INTO lead_search(lead_search, rowid, name, email, company, services, summary)
+        VALUES ('delete', old.docid, old.name, old.email, old.company, old.services, old.summary);
+        INSERT INTO lead_search(rowid, name, email, company, services, summary)
+        VALUES (new.docid, new.name, new.email, new.company, new.services, new.summary);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """CREATE TABLE IF NOT EXISTS lead_search_docs (
+        docid BIGSERIAL PRIMARY KEY,
+        session_id VARCHAR NOT NULL UNIQUE,
+        name TEXT, email TEXT, company TEXT, services TEXT, summary TEXT,
+        document tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(company, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce(services, '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(summary, '')), 'C')
+        ) STORED,
+        trgm_text TEXT GENERATED ALWAYS AS (
+            lower(coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(company, ''))
+        ) STORED
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_lead_search_docs_document ON lead_search_docs USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_lead_search_docs_trgm ON lead_search_docs USING GIN (trgm_text gin_trgm_ops)",
+]
+
+_DOC_SELECT = """
+    SELECT s.id,
+           coalesce(s.username, ''),
+           coalesce(p.q1_email, ''),
+           coalesce(p.q1_company, ''),
+           trim(coalesce(p.q3_categories, '') || ' ' || coalesce(p.q4_services, '')),
+           coalesce(c.c_info, '')
+    FROM sessions s
+    LEFT JOIN session_phase p ON p.session_id = s.id
+    LEFT JOIN company_details c ON c.session_id = s.id
+"""
+
+_UPSERT_SQL = f"""
+    INSERT INTO lead_search_docs (session_id, name, email, company, services, summary)
+    {_DOC_SELECT}
+    WHERE s.id = :sid
+    ON CONFLICT (session_id) DO UPDATE SET
+        name = excluded.name, email = excluded.email, company = excluded.company,
+        services = excluded.services, summary = excluded.summary
+"""
+
+_BACKFILL_SQL = f"""
+    INSERT INTO lead_search_docs (session_id, name, email, company, services, summary)
+    {_DOC_SELECT}
+    WHERE s.id NOT IN (SELECT session_id FROM lead_search_docs)
+"""
+
+# bm25 column weights: name, email, company, services, summary (lower rank is better)
+_SQLITE_SEARCH_SQL = """
+    SELECT d.session_id AS session_id, bm25(lead_search, 10.0, 8.0, 8.0, 3.0, 1.0) AS rank
+    FROM lead_search JOIN lead_search_docs d ON d.docid = lead_search.rowid
+    WHERE lead_search MATCH :match
+"""
+
+_POSTGRES_SEARCH_SQL = """
+    SELECT session_id, -(ts_rank(document, to_tsquery('simple', :match)) + similarity(trgm_text, :raw)) AS rank
+    FROM lead_search_docs
+    WHERE document @@ to_tsquery('simple', :match) OR trgm_text % :raw
+"""
+
+_enabled = False
+
+
+def search_enabled() -> bool:
+    return _enabled
+
+
+def _tokens(q: str) -> list[str]:
+    return re.findall(r"\w+", (q or "").lower())
+
+
+def build_match(q: str, dialect: str = _DIALECT) -> Optional[str]:
+    """Prefix query over every token, e.g. ``acme cor`` -> ``"acme"* "cor"*``."""
+    tokens = _tokens(q)
+    if not tokens:
+        return None
+    if dialect == "postgresql":
+        return " & ".join(f"{t}:*" for t in tokens)
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+async def ensure_search_index() -> None:
+    """Create the search tables for this dialect and index sessions written before them."""
+    global _enabled
+    ddl = {"sqlite": _SQLITE_DDL, "postgresql": _POSTGRES_DDL}.get(_DIALECT)
+    if ddl is None:
+        print(f"Lead search index not available for {_DIALECT}; falling back to ILIKE")
+        return
+    try:
+        async with writer_engine.begin() as conn:
+            for stmt in ddl:
+                await conn.execute(text(stmt))
+            await conn.execute(text(_BACKFILL_SQL))
+        _enabled = True
+    except Exception as e:
+        print(f"Lead search index unavailable, falling back to ILIKE: {e}")
+
+
+async def refresh_lead_index(db: AsyncSession, session_id: str) -> None:
+    """Re-index one session inside the caller's transaction (call before commit)."""
+    if not _enabled or not session_id:
+        return
+    await db.flush()
+    await db.execute(text(_UPSERT_SQL), {"sid": session_id})
+
+
+def search_subquery(q: str) -> Optional[Subquery]:
+    """``(session_id, rank)`` rows matching ``q``; ``None`` when there is nothing to match."""
+    match = build_match(q)
+    if match is None:
+        return None
+    sql = _POSTGRES_SEARCH_SQL if _DIALECT == "postgresql" else _SQLITE_SEARCH_SQL
+    params = {"match": match}
+    if _DIALECT == "postgresql":
+        params["raw"] = q.lower().strip()
+    return (
+        text(sql)
+        .bindparams(**params)
+        .columns(session_id=String, rank=Float)
+        .subquery("lead_search_hits")
+    )
+
+
+def _benchmark(rows: int = 100_000) -> None:
+    """Compare the old ILIKE scan with the FTS5 index on a synthetic SQLite database."""
+    import random
+    import sqlite3
+    import tempfile
+    import os
+
+    path = os.path.join(tempfile.mkdtemp(), "lead_search_bench.db")
+    con = sqlite3.connect(path)
+    con.executescript("""
+        CREATE TABLE sessions (id VARCHAR PRIMARY KEY, username VARCHAR(120), created_at DATETIME);
+        CREATE TABLE session_phase (id INTEGER PRIMARY KEY, session_id VARCHAR UNIQUE, q1_company TEXT,
+            q1_email VARCHAR(320), q3_categories TEXT, q4_services TEXT);
+        CREATE TABLE company_details (id INTEGER PRIMARY KEY, session_id VARCHAR UNIQUE, c_info TEXT);
+    """)
+    words = ["alpha", "nexus", "global", "tech", "trading", "saudi", "gulf", "prime", "vision", "solutions",
+             "logistics", "capital", "energy", "systems", "digital", "partners", "holding", "medical"]
+    rnd = random.Random(7)
+    for i in range(rows):
+        sid = f"s{i:07d}"
+        company = " ".join(rnd.sample(words, 2)).title() + f" {i % 997}"
+        name = f"user{i} {rnd.choice(words)}"
+        con.execute("INSERT INTO sessions VALUES (?, ?, datetime('now'))", (sid, name))
+        con.execute("INSERT INTO session_phase (session_id, q1_company, q1_email, q3_categories, q4_services) VALUES (?, ?, ?, ?, ?)",
+                    (sid, company, f"user{i}@{company.split()[0].lower()}.com", "Market Entry", "Business Setup Saudi Arabia"))
+        con.execute("INSERT INTO company_details (session_id, c_info) VALUES (?, ?)",
+                    (sid, " ".join(f"term{rnd.randrange(50_000)}" for _ in range(60))))
+    con.commit()
+    for stmt in _SQLITE_DDL:
+        con.execute(stmt)
+    t0 = time.perf_counter()
+    con.execute(_BACKFILL_SQL)
+    con.commit()
+    print(f"indexed {rows} sessions in {time.perf_counter() - t0:.2f}s")
+
+    for q in ["nexus vis", "user4242", "gulf energy 15"]:
+        like = f"%{q}%"
+        t0 = time.perf_counter()
+        for _ in range(5):
+            scan = con.execute(
+                "SELECT s.id FROM sessions s LEFT JOIN session_phase p ON p.session_id = s.id "
+                "WHERE s.username LIKE ? OR p.q1_email LIKE ? OR p.q1_company LIKE ? LIMIT 100",
+                (like, like, like),
+            ).fetchall()
+        scan_ms = (time.perf_counter() - t0) / 5 * 1000
+        t0 = time.perf_counter()
+        for _ in range(5):
+            hits = con.execute(_SQLITE_SEARCH_SQL + " ORDER BY rank LIMIT 100", {"match": build_match(q, "sqlite")}).fetchall()
+        fts_ms = (time.perf_counter() - t0) / 5 * 1000
+        print(f"{q!r}: ILIKE scan {scan_ms:.1f} ms ({len(scan)} rows), FTS5 {fts_ms:.1f} ms ({len(hits)} rows)")
+    con.close()
+
+
+if __name__ == "__main__":
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+from LeadScoring import backfill_lead_scores
+from SessionServices import backfill_session_services
+from CustomerSearch import fill_company_keys
+from database import Base, SchemaMigration, engine, init_db, writer_engine, AsyncSessionLocal
+
+# Versioned schema changes for databases created before a model change. init_db only
+# creates missing tables; everything that alters an existing table is a migration here,
+# recorded in schema_migrations once applied.
+#
+# Two kinds:
+#   schema  - DDL (add column / index), run in one transaction at startup before serving
+#   online  - data backfills, run in the background after startup in small committed
+#             chunks so writers are never blocked for long; each must be idempotent
+#             (they select only rows still missing data), so an interrupted backfill
+#             simply continues on the next start
+#
+# Add new migrations at the end with the next version; never edit an applied one.
+#
+#   python Migrations.py status
+#   python Migrations.py upgrade      # schema + backfills, in the foreground
+BACKFILL_PAUSE = 0.05  # seconds between backfill chunks, lets request writes in
+BACKFILL_ATTEMPTS = 3
+BACKFILL_RETRY_DELAY = 5.0
+
+
+@dataclass
+class Migration:
+    version: str
+    name: str
+    upgrade: Callable[..., Any]  # schema: fn(sync_conn); online: async fn(progress)
+    online: bool = False
+
+
+def _index(name: str):
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(name)
+
+
+def create_indexes(*names: str) -> Callable[[Any], None]:
+    """Schema step creating model indexes by name (IF NOT EXISTS also covers expression indexes)."""
+    def upgrade(sync_conn) -> None:
+        for name in names:
+            sync_conn.execute(CreateIndex(_index(name), if_not_exists=True))
+    return upgrade
+
+
+def add_columns(table_name: str, *names: str) -> Callable[[Any], None]:
+    """Schema step adding model columns to an existing table; defaulted columns become NOT NULL."""
+    def upgrade(sync_conn) -> None:
+        inspector = inspect(sync_conn)
+        if not inspector.has_table(table_name):
+            return
+        existing = {c["name"] for c in inspector.get_columns(table_name)}
+        table = Base.metadata.tables[table_name]
+        for name in names:
+            if name in existing:
+                continue
+            column = table.columns[name]
+            col_type = column.type.compile(dialect=sync_conn.dialect)
+            ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {col_type}"
+            default = getattr(column.server_default, "arg", None)
+            if isinstance(default, str):
+                ddl += f" NOT NULL DEFAULT {default}"
+            sync_conn.exec_driver_sql(ddl)
+    return upgrade
+
+
+MIGRATIONS: List[Migration] = [
+    Migration("0001", "session status / keyset indexes",
+              create_indexes("ix_sessions_status_updated_at", "ix_sessions_created_at_id")),
+    Migration("0002", "backfill session_services", backfill_session_services, online=True),
+    Migration("0003", "lead score columns",
+              add_columns("sessions", "interest_weighted_sum", "interest_weight_total", "score_anchor_at",
+                          "mood_weights", "bot_message_count", "bot_low_count", "bot_high_count",
+                          "last_bot_interest", "last_bot_at", "lead_interest", "lead_mood")),
+    Migration("0004", "backfill lead scores", backfill_lead_scores, online=True),
+    Migration("0005", "hot query path indexes",
+              create_indexes("ix_sessions_approved_created_at", "ix_sessions_approved_updated_at",
+                             "ix_sessions_interest_created_at", "ix_messages_session_id_timestamp",
+                             "ix_customer_groupcode_lower", "ix_customer_company")),
+    Migration("0006", "enrichment job priority", add_columns("enrichment_jobs", "priority")),
+    Migration("0007", "enrichment job claim index", create_indexes("ix_enrichment_jobs_claim")),
+    Migration("0008", "customer company key", add_columns("customer", "company_key")),
+    Migration("0009", "customer company key index", create_indexes("ix_customer_company_key")),
+    Migration("0010", "backfill customer company keys", fill_company_keys, online=True),
+]
+
+# what the running backfill is doing, for GET /api/admin/migrations
+progress: Dict[str, Any] = {}
+
+
+async def applied_versions() -> set:
+    async with AsyncSessionLocal() as db:
+        return set((await db.execute(select(SchemaMigration.version))).scalars().all())
+
+
+async def _record(migration: Migration, started: float) -> None:
+    async with AsyncSessionLocal() as db:
+        db.add(SchemaMigration(version=migration.version, name=migration.name,
+                               duration_ms=int((time.perf_counter() - started) * 1000)))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # another worker process applied it concurrently; every step is idempotent
+            await db.rollback()
+
+
+async def _run_online(migration: Migration) -> None:
+    started = time.perf_counter()
+    progress.clear()
+    progress.update(version=migration.version, name=migration.name, done=0, total=None, started_at=time.time())
+    last_print = [0.0]
+
+    async def report(done: int, total: int) -> None:
+        progress.update(done=done, total=total)
+        now = time.perf_counter()
+        if now - last_print[0] >= 5 or done >= total:
+            last_print[0] = now
+            print(f"Migration {migration.version} ({migration.name}): {done}/{total}")
+        await asyncio.sleep(BACKFILL_PAUSE)
+
+    await migration.upgrade(progress=report)
+    await _record(migration, started)
+    progress.clear()
+
+
+async def run_online_migrations(pending: Optional[List[Migration]] = None) -> None:
+    if pending is None:
+        done = await applied_versions()
+        pending = [m for m in MIGRATIONS if m.online and m.version not in done]
+    for migration in pending:
+        for attempt in range(1, BACKFILL_ATTEMPTS + 1):
+            try:
+                await _run_online(migration)
+                break
+            except asyncio.CancelledError:
+                print(f"Migration {migration.version} interrupted; it resumes on the next start")
+                raise
+            except Exception as e:
+                # e.g. a chunk lost a write race; backfills are idempotent, so just go again
+                progress.update(error=str(e))
+                print(f"Migration {migration.version} ({migration.name}) attempt {attempt} failed: {e}")
+                await asyncio.sleep(BACKFILL_RETRY_DELAY * attempt)
+        else:
+            # later backfills may depend on this one; retry everything on the next start
+            return
+
+
+async def run_migrations(background: bool = True) -> Optional[asyncio.Task]:
+    """Create new tables, apply pending schema migrations, then start the pending backfills.
+
+    With ``background`` the backfills run as a task (returned so shutdown can cancel it);
+    otherwise they run to completion before returning.
+    """
+    await init_db()
+    done = await applied_versions()
+    pending = [m for m in MIGRATIONS if m.version not in done]
+    for migration in (m for m in pending if not m.online):
+        started = time.perf_counter()
+        async with writer_engine.begin() as conn:
+            await conn.run_sync(migration.upgrade)
+        await _record(migration, started)
+        print(f"Applied migration {migration.version} ({migration.name})")
+
+    online = [m for m in pending if m.online]
+    if not online:
+        return None
+    if background:
+        return asyncio.create_task(run_online_migrations(online))
+    await run_online_migrations(online)
+    return None
+
+
+async def migration_status() -> Dict[str, Any]:
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(SchemaMigration).order_by(SchemaMigration.version))).scalars().all()
+    applied = {r.version: r for r in rows}
+    return {
+        "migrations": [
+            {
+                "version": m.version,
+                "name": m.name,
+                "kind": "online" if m.online else "schema",
+                "applied_at": applied[m.version].applied_at if m.version in applied else None,
+                "duration_ms": applied[m.version].duration_ms if m.version in applied else None,
+            }
+            for m in MIGRATIONS
+        ],
+        "running": dict(progress) or None,
+    }
+
+
+def init(app):
+    @app.get("/api/admin/migrations")
+    async def get_migrations():
+        return await migration_status()
+
+
+async def _cli(command: str) -> None:
+    if command == "upgrade":
+        await run_migrations(background=False)
+    await init_db()
+    for m in (await migration_status())["migrations"]:
+        state = f"applied {m['applied_at']}" if m["applied_at"] else "pending"
+        print(f"{m['version']}  {m['kind']:6}  {m['name']:40}  {state}")
+    await engine.dispose()
+    await writer_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations.")
+    parser.add_argument("command", choices=["status", "upgrade"], nargs="?", default="status")
+    asyncio.run(_cli(parser.parse_args().command))
@@ -13,6 +13,7 @@ from Config import UPLOAD_DIR
 from Schemas import GenerateRequest, ProjectCreateSchema, ProjectDetailSchema, ProjectListSchema, ProjectStatusUpdate, ServiceTemplateSchema, TaskFileSchema
 from database import CompanyDetails, Project, ProjectTask, ServiceTemplate, Session as SessionModel, SessionPhase, TaskFile, TemplateTask, get_db 
 from ClientModel import MODEL_NAME, client
+from RateLimit import limiter
 
 
 
@@ -32,11 +33,12 @@ async def _call_model_with_retries(prompt: str, max_tokens: int = 700, attempts:
     last_exc = None
     for attempt in range(1, attempts + 1):
         try:
-            resp = await client.responses.create(
-                model=MODEL_NAME,
-                input=prompt,
-                temperature=0.0,
-            )
+            async with limiter("openai"):
+                resp = await client.responses.create(
+                    model=MODEL_NAME,
+                    input=prompt,
+                    temperature=0.0,
+                )
             
 
             raw_text = getattr(resp, "output_text", None) or getattr(resp, "text", None)
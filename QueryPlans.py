@@ -0,0 +1,271 @@
+import argparse
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import and_, create_engine, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import Select
+from EnrichmentJobs import enrichment_pool
+from LeadExport import export_select
+from LeadProjection import apply_lead_filters, detail_select, paginate, projected_select
+from CustomerSearch import _SQLITE_DDL as _CUSTOMER_SEARCH_DDL, build_matches, company_search_subquery
+from LeadSearch import _SQLITE_DDL, search_subquery
+from SessionUtils import active_session_clause
+from database import Base, CustomerBase, EnrichmentJob, ExportJob, Message as MessageModel, Session as SessionModel, SessionPhase
+
+# Query-plan regression check for the hot read paths. Every statement below is built the
+# way the endpoints build it (or mirrors it where the query is inline in a handler) and is
+# run through SQLite's EXPLAIN QUERY PLAN; a plain "SCAN <table>" (no index) fails the run.
+# An index walk ("SCAN t USING [COVERING] INDEX ...") fails too, unless the statement has a
+# LIMIT and an ORDER BY the index serves (no "USE TEMP B-TREE FOR ORDER BY"), so the walk
+# follows the requested order and stops at the LIMIT. Statements that knowingly read a
+# whole table list it in allow_scan with the reason.
+#
+#   python QueryPlans.py                # fresh schema from the models (what init_db creates)
+#   python QueryPlans.py --db chatbot.db   # an existing database, e.g. after ANALYZE
+#   python QueryPlans.py -v             # print every plan
+_FULL_SCAN = re.compile(r"\bSCAN (\w+)\b(?! USING)")
+_INDEX_SCAN = re.compile(r"\bSCAN (\w+) USING (?:COVERING )?INDEX\b")
+
+_WEEK_AGO = datetime(2026, 1, 1) - timedelta(days=7)
+_IDS = ["a", "b", "c"]
+
+# name -> (statement builder, tables allowed to be scanned and why)
+HOT_STATEMENTS: Dict[str, Tuple[Callable[[], Select], Dict[str, str]]] = {}
+
+
+def hot(name: str, allow_scan: Optional[Dict[str, str]] = None):
+    def register(build: Callable[[], Select]) -> Callable[[], Select]:
+        HOT_STATEMENTS[name] = (build, allow_scan or {})
+        return build
+    return register
+
+
+@hot("session list page")
+def _session_page():
+    stmt, _ = apply_lead_filters(projected_select(), None, None, False, False)
+    return paginate(stmt, 3, 20, None)
+
+
+@hot("session list keyset page")
+def _session_keyset_page():
+    stmt, _ = apply_lead_filters(projected_select(), None, None, False, False)
+    return paginate(stmt, 1, 20, (datetime(2026, 1, 1), "x"))
+
+
+@hot("session list undated keyset page")
+def _session_undated_page():
+    stmt, _ = apply_lead_filters(projected_select(), None, None, False, False)
+    return paginate(stmt, 1, 20, (None, "x"))
+
+
+@hot("active session list page")
+def _active_page():
+    stmt, _ = apply_lead_filters(projected_select(), None, None, False, True)
+    return paginate(stmt, 1, 20, None)
+
+
+@hot("approved lead list page")
+def _approved_page():
+    stmt, _ = apply_lead_filters(projected_select(), None, None, True, False)
+    return paginate(stmt, 1, 20, None)
+
+
+@hot("lead list by interest")
+def _interest_page():
+    stmt, _ = apply_lead_filters(projected_select(), None, "high", True, False)
+    return paginate(stmt, 1, 20, None)
+
+
+@hot("lead full-text search page")
+def _fts_page():
+    hits = search_subquery("acme")
+    stmt, _ = apply_lead_filters(projected_select(), None, None, True, False)
+    stmt = stmt.join(hits, hits.c.session_id == SessionModel.id)
+    return paginate(stmt, 1, 20, None, hits.c.rank)
+
+
+@hot("lead search page (ILIKE fallback)", allow_scan={
+    "sessions": "ILIKE '%q%' cannot use an index; only runs when FTS5 is unavailable",
+})
+def _search_page():
+    stmt, rank = apply_lead_filters(projected_select(), "acme", None, True, False)
+    return paginate(stmt, 1, 20, None, rank)
+
+
+@hot("lead list count")
+def _list_count():
+    stmt, _ = apply_lead_filters(projected_select(), None, None, True, False)
+    return select(func.count()).select_from(stmt.order_by(None).subquery())
+
+
+@hot("lead detail")
+def _detail():
+    return detail_select("x")
+
+
+@hot("export batch")
+def _export_batch():
+    stmt, _ = apply_lead_filters(export_select(), None, None, True, False)
+    return stmt.order_by(SessionModel.id).where(SessionModel.id > "x").limit(5000)
+
+
+@hot("last message per session")
+def _last_messages():
+    latest = (
+        select(func.max(MessageModel.id).label("id"))
+        .where(MessageModel.session_id.in_(_IDS))
+        .group_by(MessageModel.session_id)
+        .subquery()
+    )
+    return select(MessageModel.session_id, MessageModel.content).join(latest, MessageModel.id == latest.c.id)
+
+
+@hot("session history")
+def _history():
+    return select(MessageModel).where(MessageModel.session_id == "x").order_by(MessageModel.timestamp.asc())
+
+
+@hot("inactivity sweep")
+def _sweep():
+    return select(SessionModel.id).where(
+        SessionModel.status == "active", SessionModel.updated_at < datetime(2026, 1, 1)
+    )
+
+
+@hot("dashboard active chats")
+def _dashboard_active():
+    return select(func.count(SessionModel.id)).where(active_session_clause())
+
+
+@hot("dashboard weekly high interest")
+def _dashboard_high():
+    return select(func.count(SessionModel.id)).where(
+        and_(SessionModel.created_at >= _WEEK_AGO, SessionModel.interest == "high")
+    )
+
+
+@hot("dashboard weekly messages")
+def _dashboard_messages():
+    return (
+        select(MessageModel.session_id, MessageModel.role, MessageModel.timestamp)
+        .where(MessageModel.session_id.in_(select(SessionModel.id).where(SessionModel.created_at >= _WEEK_AGO)))
+        .order_by(MessageModel.session_id, MessageModel.timestamp)
+    )
+
+
+@hot("dashboard session durations")
+def _dashboard_durations():
+    week = select(SessionModel.id).where(SessionModel.created_at >= _WEEK_AGO)
+    return (
+        select(MessageModel.session_id, SessionModel.username, SessionPhase.q1_company,
+               func.max(MessageModel.timestamp), func.min(MessageModel.timestamp))
+        .join(SessionModel, SessionModel.id == MessageModel.session_id)
+        .join(SessionPhase, SessionPhase.session_id == SessionModel.id, isouter=True)
+        .where(MessageModel.session_id.in_(week))
+        .group_by(MessageModel.session_id, SessionModel.username, SessionPhase.q1_company)
+    )
+
+
+@hot("dashboard hot leads")
+def _dashboard_hot():
+    return select(SessionModel.id).where(SessionModel.approved == True).order_by(SessionModel.updated_at.desc()).limit(7)
+
+
+@hot("customer by groupcode")
+def _customer_groupcode():
+    return select(CustomerBase).where(func.lower(CustomerBase.groupcode) == "abc123")
+
+
+@hot("customer by company key")
+def _customer_company_key():
+    return select(CustomerBase.id, CustomerBase.company_key).where(CustomerBase.company_key == "acme trading").limit(100)
+
+
+@hot("customer by company (trigram index)")
+def _customer_company():
+    hits = company_search_subquery(build_matches("acme trading", "sqlite")[1], ranked=True)
+    return select(hits.c.customer_id, hits.c.company_key)
+
+
+@hot("enrichment job claim")
+def _enrichment_claim():
+    return (
+        select(EnrichmentJob.id)
+        .where(enrichment_pool._claimable(datetime(2026, 1, 1)))
+        .order_by(EnrichmentJob.priority.desc(), EnrichmentJob.next_run_at)
+        .limit(4)
+    )
+
+
+@hot("export jobs by parameters")
+def _export_jobs():
+    return select(ExportJob).where(ExportJob.params_key == "k", ExportJob.status == "completed")
+
+
+def _explain(conn, stmt: Select) -> List[str]:
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    args = tuple(
+        v.isoformat(" ") if isinstance(v, datetime) else v
+        for v in (params[k] for k in compiled.positiontup)
+    )
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", args).all()
+    return [row[-1] for row in rows]
+
+
+def _scanned(stmt: Select, plan: List[str], tables: set) -> List[str]:
+    """Tables the plan reads end to end: plain SCANs, and index walks a LIMIT does not cut short."""
+    stops_early = (
+        getattr(stmt, "_limit_clause", None) is not None
+        and bool(getattr(stmt, "_order_by_clauses", ()))
+        and not any(line.startswith("USE TEMP B-TREE FOR ORDER BY") for line in plan)
+    )
+    scanned = []
+    for line in plan:
+        m = _FULL_SCAN.search(line) or (None if stops_early else _INDEX_SCAN.search(line))
+        if m and m.group(1) in tables:
+            scanned.append(m.group(1))
+    return scanned
+
+
+def check_plans(url: str = "sqlite://", create: bool = True, verbose: bool = False) -> List[str]:
+    """EXPLAIN every hot statement; returns the failures (empty when no table is fully scanned)."""
+    engine = create_engine(url)
+    failures = []
+    tables = set(Base.metadata.tables) | {"lead_search_docs"}
+    with engine.begin() as conn:
+        if create:
+            Base.metadata.create_all(conn)
+            for ddl in _SQLITE_DDL + _CUSTOMER_SEARCH_DDL:
+                conn.exec_driver_sql(ddl)
+        for name, (build, allow_scan) in HOT_STATEMENTS.items():
+            stmt = build()
+            try:
+                plan = _explain(conn, stmt)
+            except OperationalError as e:  # e.g. a table the database has not been migrated to yet
+                print(f"FAIL {name}  ({e.orig})")
+                failures.append(name)
+                continue
+            # materialized subqueries / FTS virtual tables show up as SCAN too; only tables count
+            bad = [t for t in _scanned(stmt, plan, tables) if t not in allow_scan]
+            status = "FAIL" if bad else "ok"
+            print(f"{status:4} {name}" + (f"  (full scan: {', '.join(bad)})" if bad else ""))
+            if verbose or bad:
+                for line in plan:
+                    print(f"       {line}")
+            if bad:
+                failures.append(name)
+    engine.dispose()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot query plan contains a full table scan.")
+    parser.add_argument("--db", help="existing SQLite file to check instead of a fresh schema")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    failed = check_plans(f"sqlite:///{args.db}" if args.db else "sqlite://", create=not args.db, verbose=args.verbose)
+    print(f"{len(HOT_STATEMENTS) - len(failed)}/{len(HOT_STATEMENTS)} plans without full scans")
+    sys.exit(1 if failed else 0)
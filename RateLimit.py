@@ -0,0 +1,205 @@
+import asyncio
+import os
+import struct
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from Config import RATE_LIMIT_STATE_DIR, RATE_LIMITS
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows; limits are then per process
+    fcntl = None
+
+# One limiter per outbound provider, shared by every caller of that provider's quota.
+#
+# Rate: a token bucket kept as a single "theoretical arrival time" (GCRA). acquire()
+# reserves the next free slot synchronously - no await between reading and advancing
+# the schedule - and only then sleeps until its slot, so no lock is ever held while
+# waiting and callers are served strictly in arrival order.
+#
+# Concurrency: an asyncio.Semaphore taken after the rate wait and held for the call, so
+# waiting for a rate slot never occupies a concurrency slot.
+#
+# With RATE_LIMIT_STATE_DIR set, the schedule lives in <dir>/<provider>.tat and is
+# advanced under flock, so all worker processes on the host draw from one bucket.
+# Concurrency caps stay per process.
+#
+#   async with limiter("perplexity"):
+#       await client.chat.completions.create(...)
+WAIT_SAMPLES = 1000  # recent waits kept per provider for the percentiles
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} rate limit reached; retry in {retry_after:.2f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class _FileSchedule:
+    """The bucket's arrival time in a small file shared by processes on this host."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def reserve(self, now: float, interval: float, burst: int, max_wait: Optional[float]) -> Tuple[float, bool]:
+        # flock + an 8 byte read/write: microseconds, so it is done inline on the loop
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            raw = os.pread(self.fd, 8, 0)
+            tat = struct.unpack("d", raw)[0] if len(raw) == 8 else 0.0
+            wait, tat = _reserve(tat, now, interval, burst)
+            admitted = max_wait is None or wait <= max_wait
+            if admitted:
+                os.pwrite(self.fd, struct.pack("d", tat), 0)
+            return wait, admitted
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+def _reserve(tat: float, now: float, interval: float, burst: int) -> Tuple[float, float]:
+    """GCRA step: (seconds until the next slot, arrival time once it is taken)."""
+    tat = max(tat, now)
+    return max(0.0, tat - (burst - 1) * interval - now), tat + interval
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, rpm: float, burst: int, concurrency: int, state_dir: Optional[str] = None):
+        self.name = name
+        self.interval = 60.0 / rpm
+        self.burst = max(1, burst)
+        self.concurrency = concurrency
+        self.slots = asyncio.Semaphore(concurrency)
+        # time.time() rather than monotonic: the file schedule is compared across processes
+        self.tat = 0.0
+        self.schedule = _FileSchedule(os.path.join(state_dir, f"{name}.tat")) if state_dir and fcntl else None
+        self.waits: deque = deque(maxlen=WAIT_SAMPLES)
+        self.metrics = {"acquired": 0, "delayed": 0, "rejected": 0, "cancelled": 0, "wait_seconds": 0.0}
+        self.waiting = 0
+        self.in_flight = 0
+
+    def _reserve(self, max_wait: Optional[float]) -> Tuple[float, bool]:
+        now = time.time()
+        if self.schedule is not None:
+            return self.schedule.reserve(now, self.interval, self.burst, max_wait)
+        wait, tat = _reserve(self.tat, now, self.interval, self.burst)
+        admitted = max_wait is None or wait <= max_wait
+        if admitted:
+            self.tat = tat
+        return wait, admitted
+
+    async def acquire(self, max_wait: Optional[float] = None) -> float:
+        """Wait for a rate slot then a concurrency slot; returns the seconds spent waiting.
+
+        Raises RateLimitExceeded instead of queueing when the rate slot is further than
+        ``max_wait`` seconds away. Pair every acquire() with release().
+        """
+        started = time.perf_counter()
+        wait, admitted = self._reserve(max_wait)
+        if not admitted:
+            self.metrics["rejected"] += 1
+            raise RateLimitExceeded(self.name, wait)
+        self.waiting += 1
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.slots.acquire()
+        except asyncio.CancelledError:
+            self.metrics["cancelled"] += 1
+            raise
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - started
+        self.in_flight += 1
+        self.metrics["acquired"] += 1
+        self.metrics["wait_seconds"] += waited
+        if waited > 0.001:
+            self.metrics["delayed"] += 1
+        self.waits.append(waited)
+        return waited
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.slots.release()
+
+    @asynccontextmanager
+    async def __call__(self, max_wait: Optional[float] = None) -> AsyncIterator[float]:
+        waited = await self.acquire(max_wait)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    # ``async with limiter(name):`` without a max_wait
+    async def __aenter__(self) -> float:
+        return await self.acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+
+        def pct(p: float) -> Optional[float]:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 4) if waits else None
+
+        return {
+            "rpm": round(60.0 / self.interval, 2),
+            "burst": self.burst,
+            "concurrency": self.concurrency,
+            "shared": self.schedule is not None,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **self.metrics,
+            "wait_seconds": round(self.metrics["wait_seconds"], 3),
+            "wait_p50": pct(0.5),
+            "wait_p95": pct(0.95),
+            "wait_max": round(waits[-1], 4) if waits else None,
+        }
+
+
+limiters: Dict[str, ProviderLimiter] = {
+    name: ProviderLimiter(name, rpm, burst, concurrency, RATE_LIMIT_STATE_DIR)
+    for name, (rpm, burst, concurrency) in RATE_LIMITS.items()
+}
+
+
+def limiter(provider: str) -> ProviderLimiter:
+    return limiters[provider]
+
+
+def init(app):
+    @app.get("/api/ratelimit/stats")
+    async def rate_limit_stats() -> Dict[str, Any]:
+        return {name: l.stats() for name, l in limiters.items()}
+
+
+async def _benchmark(callers: int, rpm: float, burst: int, concurrency: int) -> None:
+    lim = ProviderLimiter("bench", rpm, burst, concurrency)
+    order = []
+
+    async def call(i: int) -> None:
+        async with lim():
+            order.append(i)
+            await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(callers)))
+    elapsed = time.perf_counter() - started
+    print(f"{callers} calls in {elapsed:.2f}s (expected >= {max(0, callers - burst) * 60 / rpm:.2f}s)")
+    print(f"served in arrival order: {order == sorted(order)}")
+    print(lim.stats())
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Exercise one limiter with concurrent callers.")
+    parser.add_argument("--callers", type=int, default=50)
+    parser.add_argument("--rpm", type=float, default=600)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(_benchmark(args.callers, args.rpm, args.burst, args.concurrency))
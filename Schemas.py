@@ -54,6 +54,14 @@ class ProjectDetailSchema(ProjectSchema):
     notes: Optional[str]
     tasks: List[ProjectTaskSchema] = []
 
+class ExportJobRequest(BaseModel):
+    format: str = "csv"
+    gzip: bool = False
+    q: Optional[str] = None
+    interest: Optional[str] = None
+    approved: bool = True
+    active: bool = False
+
 class ProjectStatusUpdate(BaseModel):
     status: str
 
@@ -203,4 +211,7 @@ class VerifyPayload(BaseModel):
     email: str = ""
     lead_role: str = ""
     company: str = ""
+
+class VerifyBatchPayload(BaseModel):
+    session_ids: List[str] = Field(..., min_length=1)
     
\ No newline at end of file
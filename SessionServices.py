@@ -0,0 +1,112 @@
+import re
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select, or_, exists, func
+from KnowledgeBase import cfg
+from database import AsyncSessionLocal, SessionPhase, SessionService
+
+# split on commas that are not inside parentheses, so
+# "Business Setup in other GCC (UAE, Qatar, etc.)" stays a single service
+_SPLIT_RE = re.compile(r",(?![^()]*\))")
+_CATEGORY_BLOCK_RE = re.compile(r'"([^"]+)"\s*:\s*options\s*\[(.*?)\]', re.S)
+_QUOTED_RE = re.compile(r'"([^"]+)"')
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def split_csv(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    seen = []
+    for part in _SPLIT_RE.split(value):
+        part = part.strip()
+        if part and part not in seen:
+            seen.append(part)
+    return seen
+
+
+@lru_cache(maxsize=4)
+def _parse_sub_services(raw: str) -> Dict[str, str]:
+    """Map each sub service to its main category from the insight config text."""
+    mapping: Dict[str, str] = {}
+    for match in _CATEGORY_BLOCK_RE.finditer(raw or ""):
+        category = match.group(1).strip()
+        for service in _QUOTED_RE.findall(match.group(2)):
+            mapping.setdefault(service.strip().lower(), category)
+    return mapping
+
+
+def service_rows(categories: Optional[str], services: Optional[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    cats = split_csv(categories)
+    servs = split_csv(services)
+    raw = cfg.get("sub_services", "")
+    service_to_cat = _parse_sub_services(raw if isinstance(raw, str) else str(raw))
+
+    rows: List[Tuple[Optional[str], Optional[str]]] = []
+    used_cats = set()
+    for service in servs:
+        category = service_to_cat.get(service.lower())
+        if category is None and len(cats) == 1:
+            category = cats[0]
+        if category:
+            used_cats.add(category)
+        rows.append((category, service))
+    for category in cats:
+        if category not in used_cats:
+            rows.append((category, None))
+    return rows
+
+
+def sync_session_services(session_obj) -> None:
+    """Rebuild ``session_obj.services`` from the phase CSV fields.
+
+    ``services`` must already be loaded (selectinload) on the passed object.
+    """
+    phase = session_obj.phase_info
+    wanted = service_rows(
+        phase.q3_categories if phase else None,
+        phase.q4_services if phase else None,
+    )
+    current = [(s.category, s.service) for s in session_obj.services]
+    if current == wanted:
+        return
+    session_obj.services = [
+        SessionService(session_id=session_obj.id, category=c, service=s) for c, s in wanted
+    ]
+
+
+async def backfill_session_services(batch_size: int = BACKFILL_BATCH_SIZE,
+                                    progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> int:
+    """Populate session_services for phase rows written before the table existed.
+
+    Commits per batch; ``progress(done, total)`` is awaited after each one.
+    """
+    has_rows = exists().where(SessionService.session_id == SessionPhase.session_id)
+    pending = (or_(SessionPhase.q3_categories.isnot(None), SessionPhase.q4_services.isnot(None)), ~has_rows)
+    inserted = 0
+    done = 0
+    last_id = 0
+    async with AsyncSessionLocal() as db:
+        total = (await db.execute(select(func.count(SessionPhase.id)).where(*pending))).scalar() or 0
+        while True:
+            stmt = (
+                select(SessionPhase.id, SessionPhase.session_id, SessionPhase.q3_categories, SessionPhase.q4_services)
+                .where(SessionPhase.id > last_id, *pending)
+                .order_by(SessionPhase.id)
+                .limit(batch_size)
+            )
+            rows = (await db.execute(stmt)).all()
+            if not rows:
+                break
+            for phase_id, session_id, categories, services in rows:
+                for category, service in service_rows(categories, services):
+                    db.add(SessionService(session_id=session_id, category=category, service=service))
+                    inserted += 1
+                last_id = phase_id
+            await db.commit()
+            done += len(rows)
+            if progress is not None:
+                await progress(done, max(total, done))
+    if inserted:
+        print(f"Backfilled {inserted} session_services rows")
+    return inserted
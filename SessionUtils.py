@@ -1,4 +1,8 @@
+from datetime import datetime
 from typing import Any
+from sqlalchemy import and_
+from Config import INACTIVITY_THRESHOLD
+from database import Session as SessionModel
 
 _CHILD_RELS = ("phase_info", "company_details", "verification_details", "research_details")
 
@@ -18,3 +22,15 @@ def set_field(obj: Any, name: str, value: Any) -> None:
             setattr(rel_obj, name, value)
             return
     setattr(obj, name, value)
+
+
+def active_session_clause():
+    """``status == 'active'`` that also excludes sessions the sweeper has not reached yet."""
+    threshold_time = datetime.utcnow() - INACTIVITY_THRESHOLD
+    return and_(SessionModel.status == "active", SessionModel.updated_at >= threshold_time)
+
+def effective_status(status: str | None, updated_at: datetime | None) -> str | None:
+    if status == "active" and updated_at is not None:
+        if updated_at.replace(tzinfo=None) < datetime.utcnow() - INACTIVITY_THRESHOLD:
+            return "inactive"
+    return status
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+# Request coalescing for upstream lookups. The first caller for a key starts the call as a
+# task; identical calls arriving while it is in flight await the same task instead of
+# paying for another Perplexity / OpenAI request. The key is the caller's normalized cache
+# key, and the wrapped function should fill the cache before returning, so a caller that
+# arrives just after the flight lands hits the cache instead.
+#
+# The task is shielded: a caller that disconnects does not cancel the call for the others.
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls: Dict[str, asyncio.Task] = {}
+        self.metrics = {"calls": 0, "coalesced": 0, "errors": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self.calls.get(key)
+        if task is not None:
+            self.metrics["coalesced"] += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(fn())
+        self.calls[key] = task
+        self.metrics["calls"] += 1
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # retrieve the exception even when every waiter has gone away
+        if not task.cancelled() and task.exception() is not None:
+            self.metrics["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.metrics["calls"] + self.metrics["coalesced"]
+        return {
+            **self.metrics,
+            "in_flight": len(self.calls),
+            "coalesced_rate": round(self.metrics["coalesced"] / total, 4) if total else None,
+        }
+
+
+flights: Dict[str, SingleFlight] = {}
+
+
+def flight(name: str) -> SingleFlight:
+    if name not in flights:
+        flights[name] = SingleFlight(name)
+    return flights[name]
+
+
+def init(app):
+    @app.get("/api/singleflight/stats")
+    async def single_flight_stats() -> Dict[str, Any]:
+        return {name: f.stats() for name, f in flights.items()}
@@ -6,7 +6,11 @@ from fastapi import Query, HTTPException
 import httpx
 import logging
 
-from Config import CACHE_TTL, MAX_OUTBOUND_CONCURRENCY, RATE_LIMIT_PER_SECOND, TOKEN_BUCKET_CAPACITY
+from Config import CACHE_TTL, EMAIL_VERIFY_MAX_WAIT
+from RateLimit import RateLimitExceeded, limiter
+from HttpClients import http_clients
+from SingleFlight import flight
+from EnrichmentCache import NS_EMAIL, enrichment_cache
 
 logger = logging.getLogger("verify")
 logger.setLevel(logging.DEBUG)
@@ -14,59 +18,21 @@ logger.setLevel(logging.DEBUG)
 UPSTREAM = "https://rapid-email-verifier.fly.dev/api/validate"
 
 
-outbound_semaphore = asyncio.Semaphore(MAX_OUTBOUND_CONCURRENCY)
-
-_cache_lock = asyncio.Lock()
-_cache: dict[str, tuple[dict, float]] = {}  
-
-_token_lock = asyncio.Lock()
-_tokens = TOKEN_BUCKET_CAPACITY
-_last_refill = time.monotonic()
-
-httpx_client: Optional[httpx.AsyncClient] = None
 
 
 
 async def get_cached(email: str) -> Optional[dict]:
-    async with _cache_lock:
-        row = _cache.get(email)
-        if not row:
-            return None
-        data, expires_at = row
-        if time.time() > expires_at:
-            # expired
-            del _cache[email]
-            return None
-        return data
+    return await enrichment_cache.get(NS_EMAIL, email)
 
 async def set_cache(email: str, data: dict, ttl: int = CACHE_TTL):
-    async with _cache_lock:
-        _cache[email] = (data, time.time() + ttl)
-
-async def allow_request() -> bool:
-    global _tokens, _last_refill
-    async with _token_lock:
-        now = time.monotonic()
-        elapsed = now - _last_refill
-        if elapsed > 0:
-            # refill
-            refill_amount = elapsed * RATE_LIMIT_PER_SECOND
-            _tokens = min(TOKEN_BUCKET_CAPACITY, _tokens + refill_amount)
-            _last_refill = now
-        if _tokens >= 1:
-            _tokens -= 1
-            return True
-        return False
-
-
-
+    await enrichment_cache.set(NS_EMAIL, email, data, ttl)
 
 async def fetch_upstream(email: str):
     max_retries = 2
     backoff = 0.25
     for attempt in range(1, max_retries + 1):
         try:
-            resp = await httpx_client.get(UPSTREAM, params={"email": email})
+            resp = await http_clients.get("email").get(UPSTREAM, params={"email": email})
         except Exception as exc:
             logger.exception("HTTP request to upstream failed on attempt %s: %s", attempt, exc)
             if attempt == max_retries:
@@ -91,6 +57,16 @@ async def fetch_upstream(email: str):
             raise HTTPException(status_code=502, detail="Invalid JSON from upstream")
     raise HTTPException(status_code=502, detail="Upstream request failed after retries")
 
+
+async def _verify_uncached(email: str) -> dict:
+    async with limiter("email")(max_wait=EMAIL_VERIFY_MAX_WAIT):
+        data = await fetch_upstream(email)
+    await set_cache(email, data)
+    return data
+
+
+email_flight = flight("verify_email")
+
 def init(app):
     @app.get("/verify/email")
     async def verify(email: str = Query(..., min_length=3)):
@@ -99,16 +75,12 @@ def init(app):
         cached = await get_cached(email)
         if cached is not None:
             return cached
-        if not await allow_request():
-            raise HTTPException(status_code=429, detail="Rate limit reached. Try again later.")
-
-        async with outbound_semaphore:
-            try:
-                data = await fetch_upstream(email)
-            except httpx.HTTPStatusError as e:
-                raise HTTPException(status_code=502, detail=f"Upstream error: {str(e)}")
-            except Exception as e:
-                raise HTTPException(status_code=502, detail=f"Upstream request failed: {str(e)}")
-
-        await set_cache(email, data)
-        return data
+        try:
+            return await email_flight.do(email, lambda: _verify_uncached(email))
+        except RateLimitExceeded as e:
+            raise HTTPException(status_code=429, detail="Rate limit reached. Try again later.",
+                                headers={"Retry-After": str(max(1, round(e.retry_after)))})
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(status_code=502, detail=f"Upstream error: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Upstream request failed: {str(e)}")
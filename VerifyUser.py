@@ -8,36 +8,40 @@ from typing import Dict, Any, Tuple, List
 import re
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
-import aiohttp
 from functools import lru_cache
 import json
 import asyncio
 import re
-from typing import Any, Dict, List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Tuple
 from fastapi import Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import selectinload
 from dotenv import load_dotenv
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from Schemas import VerifyPayload
+from Config import VERIFY_BATCH_CONCURRENCY, VERIFY_BATCH_MAX
+from Schemas import VerifyBatchPayload, VerifyPayload
 from SessionUtils import get_field, set_field
-from database import CompanyDetails, Session as SessionModel, VerificationDetails, get_db
+from database import AsyncSessionLocal, CompanyDetails, Session as SessionModel, VerificationDetails, get_db
+from LeadSearch import refresh_lead_index
+from LeadCache import TAG_SEARCH, invalidate_session, lead_cache, session_tag
+from RateLimit import limiter
+from HttpClients import http_clients
+from SingleFlight import flight
+from EnrichmentCache import NS_VERIFICATION, enrichment_cache
 from functools import lru_cache
-from cachetools import TTLCache  
 
 load_dotenv()
 
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-DEFAULT_CONCURRENT_LIMIT = 5
-DEFAULT_RPM = 60
-CACHE_TTL_SECONDS = 86400
 API_TIMEOUT = 30.0
 MAX_RETRIES = 3
 BASE_DELAY = 1.0
 MAX_DELAY = 10.0
 SEARCH_IMAGE_LIMIT = 3
+BATCH_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
 
 json_schema = {
     "name": "verification_response",
@@ -78,74 +82,19 @@ json_schema = {
 }
 
 
-class AsyncRateLimiter:
-    def __init__(self, concurrent_limit: int = DEFAULT_CONCURRENT_LIMIT, rpm: int = DEFAULT_RPM):
-        self.semaphore = asyncio.Semaphore(concurrent_limit)
-        self.rpm = rpm
-        self.tokens = rpm
-        self.last_refill = time.time()
-        self.lock = asyncio.Lock()
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        pass
-
-    async def acquire(self):
-        async with self.semaphore:
-            async with self.lock:
-                now = time.time()
-                elapsed = now - self.last_refill
-                self.tokens = min(self.rpm, self.tokens + (elapsed / 60) * self.rpm)
-                self.last_refill = now
-                
-                while self.tokens < 1:
-                    await asyncio.sleep(60 / self.rpm)
-                    now = time.time()
-                    elapsed = now - self.last_refill
-                    self.tokens = min(self.rpm, self.tokens + (elapsed / 60) * self.rpm)
-                    self.last_refill = now
-                
-                self.tokens -= 1
-
-
-@lru_cache(maxsize=1)
-def get_rate_limiter() -> AsyncRateLimiter:
-    """Lazy initialization with caching."""
-    concurrent = int(os.getenv("RATE_LIMIT_CONCURRENT", DEFAULT_CONCURRENT_LIMIT))
-    rpm = int(os.getenv("RATE_LIMIT_RPM", DEFAULT_RPM))
-    return AsyncRateLimiter(concurrent, rpm)
-
-
-class TTLCache:
-    def __init__(self, ttl_seconds: int = CACHE_TTL_SECONDS):
-        self.cache: Dict[str, Tuple[Any, float]] = {}
-        self.ttl = ttl_seconds
-
-    def get(self, key: str) -> Any | None:
-        if key not in self.cache:
-            return None
-        
-        value, timestamp = self.cache[key]
-        if time.time() - timestamp < self.ttl:
-            return value
-        
-        del self.cache[key]
-        return None
-
-    def set(self, key: str, value: Any) -> None:
-        self.cache[key] = (value, time.time())
-
-
 # Global instances
-ttl_cache = TTLCache()
+verify_flight = flight("verify_user")
 perplexity_client = AsyncOpenAI(
     api_key=os.getenv("PERPLEXITY_API_KEY"),
-    base_url="https://api.perplexity.ai"
+    base_url="https://api.perplexity.ai",
+    http_client=http_clients.get("perplexity"),
 )
 
 
+class VerificationFailed(Exception):
+    """The provider call failed or returned no usable JSON; nothing is cached or saved."""
+
+
 def get_cache_key(inputs: Dict[str, str]) -> str:
     """Generate MD5 hash from sorted input dict."""
     key_str = ''.join(f"{k}:{v}" for k, v in sorted(inputs.items()))
@@ -223,18 +172,11 @@ async def fetch_images(company: str, username: str) -> List[str]:
         "num": SEARCH_IMAGE_LIMIT,
     }
     
-    limiter = get_rate_limiter()
-    await limiter.acquire()
-    
     async def fetch_coro():
-        connector = aiohttp.TCPConnector(limit=10)
-        timeout = aiohttp.ClientTimeout(total=API_TIMEOUT)
-        
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            async with session.get("https://www.searchapi.io/api/v1/search", params=params) as resp:
-                resp.raise_for_status()
-                data = await resp.json(content_type=None)
-                return extract_image_urls(data)
+        async with limiter("searchapi"):
+            resp = await http_clients.get("searchapi").get("/api/v1/search", params=params, timeout=API_TIMEOUT)
+        resp.raise_for_status()
+        return extract_image_urls(resp.json())
     
     try:
         return await retry_on_failure(fetch_coro, max_retries=MAX_RETRIES)
@@ -245,31 +187,29 @@ async def fetch_images(company: str, username: str) -> List[str]:
 
 async def get_verification(company: str, role: str, username: str, email: str, 
                           display_username: str) -> Tuple[str, List[str]]:
-    """Call Perplexity API for user verification."""
+    """Call Perplexity API for user verification; raises VerificationFailed when it gives no answer."""
     user_prompt = f"""Verify if the user (name: "{display_username}", role: "{role}") is an employee in the given role at "{company}".
 Search reliable sources like LinkedIn profiles, company websites, directories, or official pages for evidence matching the name, role, company.
 Output EXACTLY one strict JSON object—no extra text, markdown, or explanations."""
 
-    limiter = get_rate_limiter()
-    await limiter.acquire()
-    
     async def api_coro():
-        return await asyncio.wait_for(
-            perplexity_client.chat.completions.create(
-                model="sonar",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that responds with valid JSON matching the provided schema. Include search-based evidence in the 'evidence' field."
-                    },
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.1,
-                max_tokens=500,
-                response_format={"type": "json_schema", "json_schema": json_schema},
-            ),
-            timeout=API_TIMEOUT
-        )
+        async with limiter("perplexity"):
+            return await asyncio.wait_for(
+                perplexity_client.chat.completions.create(
+                    model="sonar",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are a helpful assistant that responds with valid JSON matching the provided schema. Include search-based evidence in the 'evidence' field."
+                        },
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.1,
+                    max_tokens=500,
+                    response_format={"type": "json_schema", "json_schema": json_schema},
+                ),
+                timeout=API_TIMEOUT
+            )
     
     try:
         response = await retry_on_failure(api_coro, max_retries=MAX_RETRIES)
@@ -286,30 +226,21 @@ Output EXACTLY one strict JSON object—no extra text, markdown, or explanations
         
     except (asyncio.TimeoutError, json.JSONDecodeError, ValueError, Exception) as e:
         print(f"Verification error: {str(e)}")
-        
-        fallback_response = {
-            "verified": False,
-            "confidence": 0,
-            "details": {
-                "name": display_username,
-                "role": role,
-                "username": username,
-                "email": email,
-                "company": company,
-                "evidence": f"Verification failed: {str(e)}"
-            }
-        }
-        return json.dumps(fallback_response), []
+        raise VerificationFailed(f"Verification failed: {str(e)}") from e
 
 
 async def verify_user(company: str, role: str, username: str, email: str) -> Tuple[str, List[str], List[str]]:
     inputs = normalize_inputs(company, role, username, email)
     cache_key = get_cache_key(inputs)
     
-    cached_result = ttl_cache.get(cache_key)
+    cached_result = await enrichment_cache.get(NS_VERIFICATION, cache_key)
     if cached_result:
-        return cached_result
-    
+        llm_output, sources, images = cached_result
+        return llm_output, sources, images
+    return await verify_flight.do(cache_key, lambda: _verify_uncached(inputs, cache_key))
+
+
+async def _verify_uncached(inputs: Dict[str, str], cache_key: str) -> Tuple[str, List[str], List[str]]:
     display_username = inputs["username"]
     if not inputs["username"] or len(inputs["username"]) < 2:
         display_username = extract_name_from_email(inputs["email"])
@@ -320,17 +251,144 @@ async def verify_user(company: str, role: str, username: str, email: str) -> Tup
     )
     images_task = asyncio.create_task(fetch_images(inputs["company"], display_username))
     
-    llm_output, sources = await verification_task
+    try:
+        llm_output, sources = await verification_task
+    except VerificationFailed:
+        images_task.cancel()
+        raise
     images = await images_task
     
     result = (llm_output, sources, images)
-    ttl_cache.set(cache_key, result)
+    await enrichment_cache.set(NS_VERIFICATION, cache_key, result)
     
     return result
 
 
-    
-    
+
+def _sessions_select(session_ids: List[str]):
+    return (
+        select(SessionModel)
+        .options(
+            selectinload(SessionModel.phase_info),
+            selectinload(SessionModel.company_details),
+            selectinload(SessionModel.verification_details),
+        )
+        .where(SessionModel.id.in_(session_ids))
+    )
+
+
+def apply_verification(db_session: SessionModel, result: Dict[str, Any], sources: List[str], images: List[str]) -> None:
+    """Copy a verification result onto a session loaded with its detail relations."""
+    if getattr(db_session, "verification_details", None) is None:
+        db_session.verification_details = VerificationDetails(session_id=db_session.id)
+    if getattr(db_session, "company_details", None) is None:
+        db_session.company_details = CompanyDetails(session_id=db_session.id)
+
+    set_field(db_session, "verified", "true" if result.get("verified") else "false")
+    if result.get("verified") and not get_field(db_session, "username"):
+        set_field(db_session, "username", result.get("details", {}).get("name", ""))
+    set_field(db_session, "confidence", result.get("confidence"))
+    set_field(db_session, "evidence", result.get("details", {}).get("evidence", ""))
+    set_field(db_session, "v_sources", json.dumps(sources))
+    set_field(db_session, "c_images", json.dumps(images))
+
+
+async def verify_batch(session_ids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Verify many leads, yielding one result per session as it completes, then a summary.
+
+    Sessions with the same normalized (company, role, name, email) share one verification.
+    At most VERIFY_BATCH_CONCURRENCY run at a time, each still going through the provider
+    limiters, cache and single-flight of verify_user. Results are written in one
+    transaction once every verification has finished.
+    """
+    ids = list(dict.fromkeys(session_ids))
+    async with AsyncSessionLocal() as db:
+        sessions = {s.id: s for s in (await db.execute(_sessions_select(ids))).scalars()}
+
+    groups: Dict[str, List[str]] = {}
+    lead_inputs: Dict[str, Tuple[str, str, str, str]] = {}
+    for session_id in ids:
+        s = sessions.get(session_id)
+        if s is None:
+            yield {"id": session_id, "status": "error", "detail": "Session not found"}
+            continue
+        inputs = tuple(get_field(s, f) or "" for f in ("q1_company", "q2_role", "username", "q1_email"))
+        if not inputs[0].strip():
+            yield {"id": session_id, "status": "skipped", "detail": "No company to verify"}
+            continue
+        key = get_cache_key(normalize_inputs(*inputs))
+        groups.setdefault(key, []).append(session_id)
+        lead_inputs[key] = inputs
+
+    slots = asyncio.Semaphore(VERIFY_BATCH_CONCURRENCY)
+
+    async def run(key: str):
+        async with slots:
+            try:
+                result_str, sources, images = await verify_user(*lead_inputs[key])
+                return key, json.loads(result_str), sources, images, None
+            except json.JSONDecodeError:
+                return key, None, None, None, "Invalid JSON returned"
+            except Exception as e:
+                return key, None, None, None, str(e) or type(e).__name__
+
+    updates: Dict[str, Tuple[Dict[str, Any], List[str], List[str]]] = {}
+    tasks = [asyncio.create_task(run(key)) for key in groups]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            key, result, sources, images, error = await next_done
+            for session_id in groups[key]:
+                if error is not None:
+                    yield {"id": session_id, "status": "error", "detail": error}
+                    continue
+                updates[session_id] = (result, sources, images)
+                yield {
+                    "id": session_id,
+                    "status": "success",
+                    "verified": bool(result.get("verified")),
+                    "confidence": result.get("confidence"),
+                    "evidence": result.get("details", {}).get("evidence", ""),
+                    "sources": sources,
+                }
+    finally:
+        # client went away: stop waiting (shared calls still finish and fill the cache)
+        for task in tasks:
+            task.cancel()
+
+    summary = {"status": "done", "requested": len(ids), "verifications": len(groups), "succeeded": len(updates)}
+    try:
+        summary["saved"] = await _save_batch(updates)
+    except Exception as e:
+        print(f"Batch verification save failed: {e}")
+        summary.update(status="error", detail="Could not save verification results", saved=0)
+    yield summary
+
+
+async def _save_batch(updates: Dict[str, Tuple[Dict[str, Any], List[str], List[str]]]) -> int:
+    if not updates:
+        return 0
+    async with AsyncSessionLocal() as db:
+        try:
+            sessions = (await db.execute(_sessions_select(list(updates)))).scalars().all()
+            for s in sessions:
+                apply_verification(s, *updates[s.id])
+            await db.flush()
+            for s in sessions:
+                await refresh_lead_index(db, s.id)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    await lead_cache.invalidate(TAG_SEARCH, *(session_tag(s.id) for s in sessions))
+    return len(sessions)
+
+
+async def _encode_stream(items: AsyncIterator[Dict[str, Any]], fmt: str) -> AsyncIterator[bytes]:
+    async for item in items:
+        line = json.dumps(item, default=str)
+        yield (f"data: {line}\n\n" if fmt == "sse" else line + "\n").encode()
+
+
 def init(app):
     @app.post("/api/verify/")
     async def main_verify_user(payload: VerifyPayload, db: AsyncSession = Depends(get_db)):
@@ -339,7 +397,10 @@ def init(app):
         username = payload.name
         email = payload.email
 
-        result_str, sources, images = await verify_user(company, role, username, email)
+        try:
+            result_str, sources, images = await verify_user(company, role, username, email)
+        except VerificationFailed as e:
+            raise HTTPException(status_code=502, detail=str(e))
 
         try:
             result = json.loads(result_str)
@@ -359,29 +420,12 @@ def init(app):
         if not db_session:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        if getattr(db_session, "verification_details", None) is None:
-            vd = VerificationDetails(session_id=db_session.id)
-            db_session.verification_details = vd
-
-        if getattr(db_session, "company_details", None) is None:
-            cd = CompanyDetails(session_id=db_session.id)
-            db_session.company_details = cd
-
-        set_field(db_session, "verified", "true" if result.get("verified") else "false")
-
-        existing_username = get_field(db_session, "username")
-        if result.get("verified") and not existing_username:
-            set_field(db_session, "username", result.get("details", {}).get("name", ""))
-
-        set_field(db_session, "confidence", result.get("confidence"))
-        set_field(db_session, "evidence", result.get("details", {}).get("evidence", ""))
-
-        set_field(db_session, "v_sources", json.dumps(sources))
-
-        set_field(db_session, "c_images", json.dumps(images))
+        apply_verification(db_session, result, sources, images)
 
         # persist
+        await refresh_lead_index(db, db_session.id)
         await db.commit()
+        await invalidate_session(db_session.id, TAG_SEARCH)
         await db.refresh(db_session)
 
         # read values back using get_field (works for old or new layout)
@@ -399,4 +443,17 @@ def init(app):
                 "evidence": updated_evidence,
                 "sources": updated_sources,
             }
-        }
\ No newline at end of file
+        }
+
+    @app.post("/api/verify/batch")
+    async def verify_user_batch(payload: VerifyBatchPayload, format: str = "ndjson"):
+        """Verify many leads; streams one JSON result per lead (NDJSON, or SSE with format=sse)."""
+        if format not in BATCH_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported stream format: {format}")
+        if len(payload.session_ids) > VERIFY_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"At most {VERIFY_BATCH_MAX} sessions per batch")
+        return StreamingResponse(
+            _encode_stream(verify_batch(payload.session_ids), format),
+            media_type=BATCH_FORMATS[format],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
@@ -1,23 +1,98 @@
 import os
+import re
 from datetime import datetime
+from functools import partial
 import uuid
 from sqlalchemy.ext.asyncio import (create_async_engine, async_sessionmaker, AsyncAttrs)
-from sqlalchemy import (Boolean, Column, String, Integer, Text, DateTime, ForeignKey)
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import (Boolean, Column, String, Integer, Float, Text, DateTime, ForeignKey, Index, event)
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, Session as SyncSession
 from sqlalchemy.sql import func
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.ext.asyncio import AsyncSession
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///chatbot.db")  
 
-
-engine = create_async_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-    echo=False,  #  for debugging
-    future=True,  # for 2.0+ style
-    pool_reset_on_return=None,
-)
+# SQLite profile: WAL lets readers run next to the writer, and all writes go through one
+# connection whose pool is the write queue, so concurrent chat / enrichment / admin writes
+# wait their turn instead of failing with "database is locked". Reads use their own pool.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # durable at checkpoints; safe with WAL
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000")),  # other processes' writes
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KIB", "65536")),  # negative = KiB per connection
+    "mmap_size": int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+# readers can reach the legacy engine's ceiling (10 + 20 overflow): an admin request holds
+# its connection for the whole handler, LLM calls included
+SQLITE_READER_POOL_SIZE = int(os.getenv("SQLITE_READER_POOL_SIZE", "10"))
+SQLITE_READER_MAX_OVERFLOW = int(os.getenv("SQLITE_READER_MAX_OVERFLOW", "20"))
+SQLITE_WRITER_TIMEOUT = 60  # seconds a write may wait for the writer connection
+
+_WRITE_SQL = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.I)
+
+
+def _set_pragmas(pragmas, dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def make_engines(url: str, pragmas=SQLITE_PRAGMAS, reader_pool_size: int = SQLITE_READER_POOL_SIZE,
+                 reader_max_overflow: int = SQLITE_READER_MAX_OVERFLOW):
+    """``(engine, writer_engine)``; the same engine twice for servers and in-memory SQLite."""
+    if not url.startswith("sqlite") or ":memory:" in url or url.rstrip("/").endswith(":"):
+        shared = create_async_engine(
+            url,
+            pool_pre_ping=True,
+            pool_size=10,
+            max_overflow=20,
+            echo=False,  #  for debugging
+            future=True,  # for 2.0+ style
+            pool_reset_on_return=None,
+        )
+        return shared, shared
+    reader = create_async_engine(url, pool_size=reader_pool_size, max_overflow=reader_max_overflow, future=True)
+    writer = create_async_engine(url, pool_size=1, max_overflow=0, pool_timeout=SQLITE_WRITER_TIMEOUT, future=True)
+    for e in (reader, writer):
+        event.listen(e.sync_engine, "connect", partial(_set_pragmas, pragmas))
+    return reader, writer
+
+
+class RoutingSession(SyncSession):
+    """Reads use the reader pool; flushes, DML and the rest of that transaction use the writer."""
+    reader = None
+    writer = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("writing") or self._flushing or _is_write(clause):
+            # stay on the writer until commit / rollback so reads see the pending writes
+            self.info["writing"] = True
+            return self.writer
+        return self.reader
+
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, UpdateBase):
+        return True
+    return isinstance(clause, TextClause) and bool(_WRITE_SQL.match(clause.text))
+
+
+def _end_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("writing", None)
+
+
+def session_class(reader, writer):
+    if reader is writer:
+        return SyncSession
+    cls = type("RoutingSession", (RoutingSession,), {"reader": reader.sync_engine, "writer": writer.sync_engine})
+    event.listen(cls, "after_transaction_end", _end_write)
+    return cls
+
+
+engine, writer_engine = make_engines(DATABASE_URL)
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
@@ -25,6 +100,16 @@ class Base(AsyncAttrs, DeclarativeBase):
 
 class Session(Base):  
     __tablename__ = "sessions"
+    __table_args__ = (
+        # backs the inactivity sweep: WHERE status='active' AND updated_at < ?
+        Index("ix_sessions_status_updated_at", "status", "updated_at"),
+        # keyset pagination order for the session / lead lists
+        Index("ix_sessions_created_at_id", "created_at", "id"),
+        # approved lead list / hot leads, and the interest filter / dashboard counts
+        Index("ix_sessions_approved_created_at", "approved", "created_at"),
+        Index("ix_sessions_approved_updated_at", "approved", "updated_at"),
+        Index("ix_sessions_interest_created_at", "interest", "created_at"),
+    )
     id: Mapped[str] = mapped_column(String, primary_key=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
@@ -40,6 +125,19 @@ class Session(Base):
     mobile: Mapped[str | None] = mapped_column(String(50))
     approved: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
+    # decayed interest / mood, maintained per message by LeadScoring.apply_message_score
+    interest_weighted_sum: Mapped[float] = mapped_column(Float, default=0.0, server_default="0", nullable=False)
+    interest_weight_total: Mapped[float] = mapped_column(Float, default=0.0, server_default="0", nullable=False)
+    score_anchor_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    mood_weights: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON {mood: weight}
+    bot_message_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    bot_low_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    bot_high_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    last_bot_interest: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    last_bot_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    lead_interest: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    lead_mood: Mapped[str | None] = mapped_column(String(16), nullable=True)
+
     phase_info: Mapped["SessionPhase"] = relationship(
         "SessionPhase", back_populates="session", uselist=False, cascade="all, delete-orphan"
     )
@@ -62,6 +160,12 @@ class Session(Base):
         cascade="all, delete-orphan",
         order_by="Message.timestamp"
     )
+    services: Mapped[list["SessionService"]] = relationship(
+        "SessionService",
+        back_populates="session",
+        cascade="all, delete-orphan",
+        order_by="SessionService.id"
+    )
 
 class SessionPhase(Base):  
     __tablename__ = "session_phase"
@@ -83,6 +187,17 @@ class SessionPhase(Base):
     routing: Mapped[str] = mapped_column(String(32), default="none", nullable=False)
     session: Mapped["Session"] = relationship("Session", back_populates="phase_info")
 
+class SessionService(Base):
+    __tablename__ = "session_services"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(
+        String, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    # one row per selected service; categories without a chosen service keep service NULL
+    category: Mapped[str | None] = mapped_column(String(255), index=True)
+    service: Mapped[str | None] = mapped_column(String(255), index=True)
+    session: Mapped["Session"] = relationship("Session", back_populates="services")
+
 class CompanyDetails(Base):  
     __tablename__ = "company_details"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -110,8 +225,76 @@ class VerificationDetails(Base):
     session: Mapped["Session"] = relationship("Session", back_populates="verification_details")
 
 
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # queued -> running -> completed | failed; completed artifacts are replaced by newer ones
+    status: Mapped[str] = mapped_column(String(16), default="queued", nullable=False, index=True)
+    format: Mapped[str] = mapped_column(String(16), nullable=False)
+    gzip: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    filters: Mapped[str] = mapped_column(Text, nullable=False)  # JSON of the lead list filters
+    params_key: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    data_version: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    total_rows: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    rows_written: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    bytes_written: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    cursor: Mapped[str | None] = mapped_column(String, nullable=True)  # last exported session id
+    file_path: Mapped[str | None] = mapped_column(String, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class EnrichmentJob(Base):
+    __tablename__ = "enrichment_jobs"
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # one job per session; queued -> running -> completed | failed (queued again between retries);
+    # a queued job is cancelled when its session goes inactive
+    session_id: Mapped[str] = mapped_column(
+        String, ForeignKey("sessions.id", ondelete="CASCADE"), unique=True, nullable=False
+    )
+    query: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(String(16), default="queued", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    # from the lead's interest; higher runs first
+    priority: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class CompanyEntity(Base):
+    """Research about one company, shared by every lead from its email domain or with its name."""
+    __tablename__ = "company_entities"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    domain: Mapped[str | None] = mapped_column(String(255), unique=True, nullable=True)
+    name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    name_key: Mapped[str | None] = mapped_column(String(255), index=True, nullable=True)  # CompanyEntities.normalize_company
+    c_info: Mapped[str] = mapped_column(Text, nullable=False)
+    c_data: Mapped[str | None] = mapped_column(Text, nullable=True)
+    c_sources: Mapped[str | None] = mapped_column(Text, nullable=True)
+    source: Mapped[str] = mapped_column(String(32), nullable=False)  # enrichment | deep_research
+    hits: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    version: Mapped[str] = mapped_column(String(32), primary_key=True)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    duration_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
 class Message(Base):  
     __tablename__ = "messages"
+    __table_args__ = (
+        # per-session history in order, last message per session, per-session durations
+        Index("ix_messages_session_id_timestamp", "session_id", "timestamp"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     session_id: Mapped[str] = mapped_column(String, ForeignKey("sessions.id"), nullable=False)
     role: Mapped[str] = mapped_column(String, nullable=False)
@@ -126,6 +309,8 @@ class CustomerBase(Base):
     id: Mapped[str] = mapped_column(String, primary_key=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     company: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # CompanyEntities.normalize_company(company), filled by CustomerSearch.fill_company_keys
+    company_key: Mapped[str | None] = mapped_column(Text, nullable=True)
     groupcode: Mapped[str | None] = mapped_column(Text, nullable=True)
     email: Mapped[str | None] = mapped_column(Text, nullable=True)
     role: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -137,6 +322,21 @@ class CustomerBase(Base):
     username: Mapped[str | None] = mapped_column(Text, nullable=True)
     mobile: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+class CustomerVersion(Base):
+    """One row bumped by triggers (CustomerSearch) whenever a customer is edited or deleted."""
+    __tablename__ = "customer_version"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+# FindUser matches groupcodes case-insensitively (WHERE lower(groupcode) = ?); company backs
+# exact / prefix company lookups, company_key short-name prefixes and the missing-key sync
+# (fuzzy matches use the CustomerSearch trigram index)
+Index("ix_customer_groupcode_lower", func.lower(CustomerBase.groupcode))
+Index("ix_customer_company", CustomerBase.company)
+Index("ix_customer_company_key", CustomerBase.company_key)
+# matches the claim order: due queued jobs, highest priority first
+Index("ix_enrichment_jobs_claim", EnrichmentJob.status, EnrichmentJob.priority.desc(), EnrichmentJob.next_run_at)
+
 class Consultant(Base):
     __tablename__ = "consultants"
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -258,6 +458,7 @@ class Project(Base):
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
+    sync_session_class=session_class(engine, writer_engine),
     autoflush=False,
     autocommit=False,
     expire_on_commit=False,
@@ -266,7 +467,8 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 async def init_db():
-    async with engine.begin() as conn:
+    # new tables only; changes to existing tables go through Migrations.run_migrations
+    async with writer_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     print("Database initialized successfully!")
 
@@ -277,3 +479,91 @@ async def get_db():
     finally:
         await db.close()
         
+
+
+async def _benchmark(seconds: float = 10.0, writers: int = 20, readers: int = 20) -> None:
+    """Mixed chat-like writes and list reads against the legacy engine and the SQLite profile."""
+    import asyncio
+    import random
+    import shutil
+    import tempfile
+    import time
+    from sqlalchemy import select
+
+    async def run(label: str, tuned: bool) -> None:
+        tmp = tempfile.mkdtemp()
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        if tuned:
+            reader, writer = make_engines(url)
+        else:
+            reader = writer = create_async_engine(url, pool_size=10, max_overflow=20)
+        maker = async_sessionmaker(bind=reader, sync_session_class=session_class(reader, writer),
+                                   expire_on_commit=False, autoflush=False)
+        async with writer.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        ids = [str(uuid.uuid4()) for _ in range(2000)]
+        async with maker() as db:
+            db.add_all(Session(id=i, status="active") for i in ids)
+            db.add_all(Message(session_id=random.choice(ids), role="user", content="seed") for _ in range(20000))
+            await db.commit()
+
+        stats = {"writes": 0, "reads": 0, "errors": 0, "write_lat": [], "read_lat": []}
+        deadline = time.perf_counter() + seconds
+
+        async def chat_writer():
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    async with maker() as db:
+                        sess = await db.get(Session, random.choice(ids))
+                        await asyncio.sleep(0.002)  # the bot / enrichment work between read and write
+                        db.add(Message(session_id=sess.id, role="bot", content="reply", interest="medium"))
+                        sess.updated_at = datetime.utcnow()
+                        await db.commit()
+                    stats["writes"] += 1
+                    stats["write_lat"].append(time.perf_counter() - t0)
+                except Exception:
+                    stats["errors"] += 1
+
+        async def list_reader():
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    async with maker() as db:
+                        page = (await db.execute(
+                            select(Session.id).order_by(Session.created_at.desc(), Session.id.desc()).limit(20)
+                        )).scalars().all()
+                        await db.execute(
+                            select(Message.session_id, func.max(Message.id))
+                            .where(Message.session_id.in_(page)).group_by(Message.session_id)
+                        )
+                    stats["reads"] += 1
+                    stats["read_lat"].append(time.perf_counter() - t0)
+                except Exception:
+                    stats["errors"] += 1
+
+        await asyncio.gather(*[chat_writer() for _ in range(writers)], *[list_reader() for _ in range(readers)])
+        for e in {reader, writer}:
+            await e.dispose()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+        def p95(values):
+            return sorted(values)[int(len(values) * 0.95)] * 1000 if values else float("nan")
+        print(f"{label:8} writes {stats['writes'] / seconds:7.1f}/s  reads {stats['reads'] / seconds:7.1f}/s  "
+              f"errors {stats['errors']:4}  p95 write {p95(stats['write_lat']):7.1f}ms  "
+              f"p95 read {p95(stats['read_lat']):7.1f}ms")
+
+    await run("legacy", tuned=False)
+    await run("tuned", tuned=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="SQLite concurrency benchmark: legacy engine vs tuned profile.")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(_benchmark(args.seconds, args.writers, args.readers))
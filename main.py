@@ -1,12 +1,21 @@
 import os
+import asyncio
 from fastapi import Depends, FastAPI, Request
-import httpx
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from Config import  HTTPX_MAX_CONNECTIONS, UPLOAD_DIR, UPSTREAM_TIMEOUT
-from database import get_db, init_db 
+from Config import UPLOAD_DIR
+from database import get_db
 from KnowledgeBase import cfg
-import VerifyEmail, Projectworkspace, ManageConsultant, Insights, BotResponse, VerifyUser, SessionAndLeadView, DeepResearch,DashboardAndAnalyticsView
+from LeadSearch import ensure_search_index
+from CustomerSearch import ensure_customer_search
+from Migrations import run_migrations
+from LeadCache import lead_cache
+from ExportJobs import export_pool
+from EnrichmentJobs import enrichment_pool
+from EnrichmentCache import enrichment_cache
+from HttpClients import http_clients
+from CustomerIndex import customer_index
+import VerifyEmail, Projectworkspace, ManageConsultant, Insights, BotResponse, VerifyUser, SessionAndLeadView, DeepResearch,DashboardAndAnalyticsView, ExportJobs, Migrations, RateLimit, SingleFlight, EnrichmentCache, HttpClients, EnrichmentJobs, CompanyEntities, CustomerIndex
 
 os.makedirs("data", exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -26,27 +35,49 @@ VerifyUser.init(app)
 SessionAndLeadView.init(app)
 DeepResearch.init(app)
 DashboardAndAnalyticsView.init(app)
+ExportJobs.init(app)
+Migrations.init(app)
+RateLimit.init(app)
+SingleFlight.init(app)
+EnrichmentCache.init(app)
+HttpClients.init(app)
+EnrichmentJobs.init(app)
+CompanyEntities.init(app)
+CustomerIndex.init(app)
 
 @app.api_route("/health", methods=["GET", "HEAD"])
 async def health_check():
     return {"status": "ok"}
 
+inactivity_sweeper: asyncio.Task | None = None
+migration_task: asyncio.Task | None = None
+
 @app.on_event("startup")
 async def startup():
-    await init_db()
-    limits = httpx.Limits(max_connections=HTTPX_MAX_CONNECTIONS,
-                          max_keepalive_connections=HTTPX_MAX_CONNECTIONS)
-    VerifyEmail.httpx_client = httpx.AsyncClient(
-        timeout=httpx.Timeout(UPSTREAM_TIMEOUT),
-        limits=limits
-    )
+    global inactivity_sweeper, migration_task
+    migration_task = await run_migrations()
+    await ensure_search_index()
+    await ensure_customer_search()
+    inactivity_sweeper = asyncio.create_task(SessionAndLeadView.run_inactivity_sweeper())
+    await export_pool.start()
+    await enrichment_pool.start()
+    http_clients.start()
+    customer_index.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
     cfg.stop()
-    if VerifyEmail.httpx_client:
-        await VerifyEmail.httpx_client.aclose()
+    if inactivity_sweeper:
+        inactivity_sweeper.cancel()
+    if migration_task:
+        migration_task.cancel()
+    await export_pool.stop()
+    await enrichment_pool.stop()
+    await customer_index.stop()
+    await http_clients.close()
+    await lead_cache.close()
+    await enrichment_cache.close()
 
 @app.get("/")
 async def home(request: Request):
@@ -114,32 +114,7 @@ async function fetchLeads(page = 1, q = currentQuery, interest = currentInterest
                         </td>
                         <td class="px-6 py-4 whitespace-nowrap text-gray-500 dark:text-gray-300">${session.date_str || '-'}</td>
                         <td class="px-6 py-4 whitespace-nowrap">
-                            <button class="text-xs inline-flex items-center gap-2 px-4 py-2 bg-white border border-gray-200 rounded hover:shadow-sm" onclick="openSession(
-                            '${session.id}',
-                            'view',
-                            '${escapeJs(session.name)}',
-                            '${escapeJs(session.lead_email)}',
-                            '${escapeJs(session.usr_phone)}',
-                            '${escapeJs(session.lead_company)}',
-                            '${escapeJs(session.mood)}',
-                            '${escapeJs(session.verified)}',
-                            '${escapeJs(session.confidence)}',
-                            '${escapeJs(session.evidence)}',
-                            '${escapeJs(session.sources)}',
-                            '${escapeJs(session.interest)}',
-                            '${escapeJs(session.lead_email_domain || '')}',
-                            '${escapeJs(session.lead_role || '')}',
-                            '${escapeJs(session.lead_categories || '')}',
-                            '${escapeJs(session.lead_services || '')}',
-                            '${escapeJs(session.lead_activity || '')}',
-                            '${escapeJs(session.lead_timeline || '')}',
-                            '${escapeJs(session.lead_budget || '')}',
-                            '${escapeJs(session.c_sources)}',
-                            '${escapeJs(session.c_images)}',
-                            '${escapeJs(session.c_info)}',
-                            '${escapeJs(session.c_data)}',
-                            '${session.approved}'
-                            )">
+                            <button class="text-xs inline-flex items-center gap-2 px-4 py-2 bg-white border border-gray-200 rounded hover:shadow-sm" onclick="openSessionById('${session.id}', 'view', 'leads')">
                             <svg class="w-5 h-5" viewBox="0 0 24 24" fill="none"><path d="M15 12a3 3 0 11-6 0 3 3 0 016 0zM2.458 12C3.732 7.943 7.523 5 12 5s8.268 2.943 9.542 7c-1.274 4.057-5.065 7-9.542 7S3.732 16.057 2.458 12z" stroke="currentColor" stroke-width="1.6" stroke-linecap="round" stroke-linejoin="round"/></svg>
                             View
                             </button>
@@ -208,62 +183,52 @@ exportBtn.addEventListener('click', async () => {
     `;
     exportBtn.disabled = true;
 
-    console.log('[Export] Starting CSV export...');
-    console.log('[Export] Query params:', { 
-        q: currentQuery, 
-        interest: currentInterest, 
-        format: 'csv' 
+    console.log('[Export] Submitting export job...', {
+        q: currentQuery,
+        interest: currentInterest,
+        format: 'csv'
     });
 
     try {
-        const params = new URLSearchParams({
-            q: currentQuery || '',
-            interest: currentInterest || '',
-            format: 'csv'
-        });
-
-        const url = `/api/leads/?${params}`;
-        console.log('[Export] Fetching from:', url);
-
-        const response = await fetch(url, {
-            method: 'GET',
-            headers: {
-                'Accept': 'text/csv',
-            },
+        // Full exports run as a background job: submit, poll until done, then download
+        const submit = await fetch('/api/exports', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                q: currentQuery || null,
+                interest: currentInterest || null,
+                format: 'csv'
+            }),
         });
-
-        console.log('[Export] Response status:', response.status);
-
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        if (!submit.ok) {
+            throw new Error(`HTTP ${submit.status}: ${submit.statusText}`);
         }
-
-        // Get filename from Content-Disposition if available, otherwise fallback
-        const contentDisposition = response.headers.get('Content-Disposition');
-        let filename = 'leads.csv';
-        if (contentDisposition && contentDisposition.includes('filename=')) {
-            const match = contentDisposition.match(/filename="?([^"]+)"?/);
-            if (match) filename = match[1];
+        let job = await submit.json();
+        console.log('[Export] Job:', job.id, job.reused ? '(reused)' : '');
+
+        while (job.status === 'queued' || job.status === 'running') {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const poll = await fetch(`/api/exports/${job.id}`);
+            if (!poll.ok) {
+                throw new Error(`HTTP ${poll.status}: ${poll.statusText}`);
+            }
+            job = await poll.json();
+            if (job.progress !== null) {
+                exportBtn.querySelector('span').textContent = `Exporting... ${Math.round(job.progress * 100)}%`;
+            }
+        }
+        if (job.status !== 'completed') {
+            throw new Error(job.error || `Export ${job.status}`);
         }
-        console.log('[Export] Suggested filename:', filename);
-
-        const blob = await response.blob();
-        console.log('[Export] Blob received:', blob);
 
-        // Create download link and trigger it
-        const downloadUrl = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
-        a.href = downloadUrl;
-        a.download = filename;
+        a.href = job.download_url;
         document.body.appendChild(a);
         a.click();
-
-        // Cleanup
-        window.URL.revokeObjectURL(downloadUrl);
         document.body.removeChild(a);
 
-        console.log('[Export] CSV download triggered successfully!');
-        
+        console.log('[Export] Download triggered:', job.rows_written, 'rows');
+
         // Show success state briefly
         exportBtn.innerHTML = '<span>Exported</span>';
         setTimeout(() => {
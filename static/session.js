@@ -76,63 +76,13 @@ async function loadSessions(page = currentPage) {
             return;
         }
         let rows = sessions.map(session => {
-            let actions = `<button class="text-xs inline-flex items-center gap-2 px-4 py-2 bg-white border border-gray-200 rounded hover:shadow-sm" onclick="openSession(
-            '${session.id}',
-            'view',
-            '${escapeJs(session.name)}',
-            '${escapeJs(session.lead_email)}',
-            '${escapeJs(session.usr_phone)}',
-            '${escapeJs(session.lead_company)}',
-            '${escapeJs(session.mood)}',
-            '${escapeJs(session.verified)}',
-            '${escapeJs(session.confidence)}',
-            '${escapeJs(session.evidence)}',
-            '${escapeJs(session.sources)}',
-            '${escapeJs(session.interest)}',
-            '${escapeJs(session.lead_email_domain || '')}',
-            '${escapeJs(session.lead_role || '')}',
-            '${escapeJs(session.lead_categories || '')}',
-            '${escapeJs(session.lead_services || '')}',
-            '${escapeJs(session.lead_activity || '')}',
-            '${escapeJs(session.lead_timeline || '')}',
-            '${escapeJs(session.lead_budget || '')}',
-            '${escapeJs(session.c_sources)}',
-            '${escapeJs(session.c_images)}',
-            '${escapeJs(session.c_info)}',
-            '${escapeJs(session.c_data)}',
-            '${session.approved}'
-            )">
+            let actions = `<button class="text-xs inline-flex items-center gap-2 px-4 py-2 bg-white border border-gray-200 rounded hover:shadow-sm" onclick="openSessionById('${session.id}', 'view', 'sessions')">
             <svg class="w-5 h-5" viewBox="0 0 24 24" fill="none"><path d="M15 12a3 3 0 11-6 0 3 3 0 016 0zM2.458 12C3.732 7.943 7.523 5 12 5s8.268 2.943 9.542 7c-1.274 4.057-5.065 7-9.542 7S3.732 16.057 2.458 12z" stroke="currentColor" stroke-width="1.6" stroke-linecap="round" stroke-linejoin="round"/></svg>
             View
             </button>`;
         
             if (session.status === 'active') {
-            actions += ` <button class="text-xs inline-flex items-center gap-2 px-4 py-2 bg-gray-800 text-white rounded hover:bg-gray-800/90" onclick="openSession(
-                '${session.id}',
-                'control',
-                '${escapeJs(session.name)}',
-                '${escapeJs(session.lead_email)}',
-                '${escapeJs(session.usr_phone)}',
-                '${escapeJs(session.lead_company)}',
-                '${escapeJs(session.mood)}',
-                '${escapeJs(session.verified)}',
-                '${escapeJs(session.confidence)}',
-                '${escapeJs(session.evidence)}',
-                '${escapeJs(session.sources)}',
-                '${escapeJs(session.interest)}',
-                '${escapeJs(session.lead_email_domain || '')}',
-                '${escapeJs(session.lead_role || '')}',
-                '${escapeJs(session.lead_categories || '')}',
-                '${escapeJs(session.lead_services || '')}',
-                '${escapeJs(session.lead_activity || '')}',
-                '${escapeJs(session.lead_timeline || '')}',
-                '${escapeJs(session.lead_budget || '')}',
-                '${escapeJs(session.c_sources)}',
-                '${escapeJs(session.c_images)}',
-                '${escapeJs(session.c_info)}',
-                '${escapeJs(session.c_data)}',
-                '${session.approved}'
-            )">
+            actions += ` <button class="text-xs inline-flex items-center gap-2 px-4 py-2 bg-gray-800 text-white rounded hover:bg-gray-800/90" onclick="openSessionById('${session.id}', 'control', 'sessions')">
                 <svg class="w-5 h-5" viewBox="0 0 24 24" fill="white"><path d="M9 7v10l7-5-7-5z" stroke="none" /></svg>
                 Control
             </button>`;
@@ -287,6 +237,29 @@ async function approveSession(id) {
 }
 
 
+// Background company research for the open lead (queued once the chat knows its company)
+async function loadEnrichmentStatus(sessionId) {
+    const el = document.getElementById('enrichmentStatus');
+    if (!el || !sessionId) return;
+    const resp = await fetch(`/api/enrichment-jobs/session/${sessionId}`);
+    if (!resp.ok) return;
+    const job = await resp.json();
+    if (job.status === 'completed') return;
+    let text = `Company research ${job.status}`;
+    if (job.attempts) text += ` (attempt ${job.attempts} of ${job.max_attempts})`;
+    if (job.error) text += ` - ${escapeHtml(job.error)}`;
+    el.innerHTML = text + (['failed', 'cancelled'].includes(job.status)
+        ? ` <button class="ml-1 underline text-slate-700" onclick="retryEnrichment('${job.id}', '${sessionId}')">Retry</button>`
+        : '');
+    el.classList.remove('hidden');
+}
+
+async function retryEnrichment(jobId, sessionId) {
+    const resp = await fetch(`/api/enrichment-jobs/${jobId}/retry`, { method: 'POST' });
+    showPopup(resp.ok ? 'Company research queued again' : 'Could not queue company research', resp.ok ? 'success' : 'error');
+    loadEnrichmentStatus(sessionId);
+}
+
 function markdownToHtml(text) {
     if (!text) return '';
     text = text.replace(/^######\s+(.*)$/gm, '<h6>$1</h6>')
@@ -487,6 +460,7 @@ const getDisplayName = (url) => {
             
         </div>
         ${ResearchInfoHtml}
+        <div id="enrichmentStatus" class="mt-2 text-xs text-slate-500 hidden"></div>
         ${ConsultationHtml}
         </div>
     </div>
@@ -826,6 +800,7 @@ const getDisplayName = (url) => {
     `;
 
     document.getElementById('userDetailsSection').innerHTML = userInfoHtml;
+    if (!(c_info && c_info.trim())) loadEnrichmentStatus(id);
 
    
     function setupResearchModal() {
@@ -1114,6 +1089,11 @@ function openDeepResearchModal() {
                             <label for="researchAdditionalInfo" class="block text-sm font-medium text-gray-700 mb-2">Additional Info</label>
                             <textarea id="researchAdditionalInfo" name="additional_info" rows="3" class="w-full px-3 py-2.5 border border-gray-200 rounded-[.7rem] focus:outline-none   transition-all resize-none" placeholder="Any extra details or context for the research..."></textarea>
                         </div>
+                        <label class="flex items-center gap-2 text-sm text-gray-700 cursor-pointer">
+                            <input type="checkbox" id="researchRefresh" name="refresh"
+                                class="h-4 w-4 accent-gray-800 text-gray-800 focus:ring-gray-800 border-gray-300 rounded-md">
+                            Refresh research (don't reuse an earlier report on this company)
+                        </label>
                     </div>
                     <div class="flex justify-end gap-3 pt-4">
                         <button type="button" id="cancelDeepResearch" class="px-4 py-2.5 text-sm font-medium text-gray-700 bg-gray-100 hover:bg-gray-200 rounded-full transition-colors">Cancel</button>
@@ -1150,7 +1130,8 @@ function openDeepResearchModal() {
             email: formData.get('email'),
             company: formData.get('company'),
             email_domain: formData.get('email_domain'),
-            additional_info: formData.get('additional_info')
+            additional_info: formData.get('additional_info'),
+            refresh: formData.get('refresh') === 'on'
         };
         closeDeepResearchModal();
         showPopup('You will be notified upon research completion');
@@ -1180,7 +1161,8 @@ function openDeepResearchModal() {
             </div>
         `;
         try {
-            const response = await fetch('/api/deep-research', {
+            const researchUrl = researchData.refresh ? '/api/deep-research?refresh_if_older_than=0' : '/api/deep-research';
+            const response = await fetch(researchUrl, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -1357,6 +1339,24 @@ async function handleVerification() {
 let availableTemplates = [];
 let currentCustomTasks = [];
 
+// list rows only carry the lean columns; pull the full record (research, evidence, sources) on open
+async function openSessionById(id, mode, view = 'leads') {
+    try {
+        const response = await fetch(`/api/leads/${encodeURIComponent(id)}?view=${view}`);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const s = await response.json();
+        await openSession(
+            s.id, mode, s.name, s.lead_email, s.usr_phone, s.lead_company, s.mood,
+            s.verified, s.confidence, s.evidence, s.sources, s.interest,
+            s.lead_email_domain || '', s.lead_role || '', s.lead_categories || '', s.lead_services || '',
+            s.lead_activity || '', s.lead_timeline || '', s.lead_budget || '',
+            s.c_sources, s.c_images, s.c_info, s.c_data, s.approved
+        );
+    } catch (error) {
+        console.error('Error loading session details:', error);
+    }
+}
+
 async function openSession(id, mode, name, email, phone, company, mood, verified, confidence, evidence, sources, interest, lead_email_domain, lead_role, lead_categories, lead_services, lead_activity, lead_timeline, lead_budget, c_sources, c_images, c_info, c_data, approved) {
     if (currentWs) {
         reconnectAttempts = maxReconnectAttempts;